@@ -6,7 +6,8 @@ from .auth import (
 )
 from .transactions import (
     add_transaction, get_recent_transactions, get_transaction_details,
-    update_transaction, delete_transaction, search_transactions_for_management
+    update_transaction, delete_transaction, search_transactions_for_management,
+    open_transactions_export
 )
 from .debts import (
     add_debt, add_reminder, get_open_debts, get_open_debts_export,
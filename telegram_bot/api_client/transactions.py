@@ -104,4 +104,32 @@ def search_transactions_for_management(params, user_id):
         log.error(f"API Error searching transactions for management: {e}")
         if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 403:
             raise PremiumFeatureException("Premium required")
-        return []
\ No newline at end of file
+        return []
+
+@ensure_auth
+def open_transactions_export(user_id, start_date=None, end_date=None, fmt='csv'):
+    """
+    Opens a streamed /transactions/export response; the caller must close it.
+    Returns None when the range has no transactions.
+    """
+    params = {'format': fmt}
+    if start_date and end_date:
+        params.update({'start_date': start_date, 'end_date': end_date})
+    try:
+        res = requests.get(
+            f"{BASE_URL}/transactions/export",
+            params=params,
+            headers=_get_headers(user_id),
+            timeout=DEFAULT_TIMEOUT,
+            stream=True
+        )
+        res.raise_for_status()
+        if res.status_code == 204:
+            res.close()
+            return None
+        return res
+    except requests.exceptions.RequestException as e:
+        if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 401:
+            raise e
+        log.error(f"API Error opening transaction export: {e}")
+        return None
@@ -1,6 +1,7 @@
 # telegram_bot/handlers/analytics.py
 
 import os
+import asyncio
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from telegram import Update
@@ -15,7 +16,8 @@ from .helpers import (
     _create_expense_pie_chart,
     _format_habits_message,
     _create_spending_line_chart,
-    _create_csv_from_transactions
+    _create_csv_from_transactions,
+    ExportTooLarge
 )
 from utils.i18n import t
 from api_client import PremiumFeatureException, UpstreamUnavailable
@@ -222,24 +224,25 @@ async def download_report_csv(update: Update, context: ContextTypes.DEFAULT_TYPE
     try:
         _, s_str, e_str = query.data.split(':')
 
-        # Use search API to get raw data
-        txs = api_client.search_transactions_for_management(
-            {'start_date': s_str, 'end_date': e_str},
-            context.user_data['jwt']
-        )
+        # Open and download the server-side CSV export in worker threads so a
+        # large export never blocks the event loop
+        export = await asyncio.to_thread(api_client.open_transactions_export, context.user_data['jwt'], s_str, e_str)
 
-        if not txs:
+        if export is None:
             await query.message.reply_text(t("search.no_results", context))
             return
 
-        csv_file = _create_csv_from_transactions(txs)
-        fname = f"report_{s_str}_to_{e_str}.csv"
-
-        await context.bot.send_document(
-            chat_id=update.effective_chat.id,
-            document=csv_file,
-            filename=fname,
-            caption=f"Transaction Export: {s_str} to {e_str}"
-        )
+        document = await _create_csv_from_transactions(export)
+        try:
+            await context.bot.send_document(
+                chat_id=update.effective_chat.id,
+                document=document,
+                filename=f"report_{s_str}_to_{e_str}.csv",
+                caption=f"Transaction Export: {s_str} to {e_str}"
+            )
+        finally:
+            document.close()
+    except ExportTooLarge:
+        await query.message.reply_text(t("search.export_too_large", context))
     except Exception as e:
         await query.message.reply_text(t("common.error_generic", context, error=str(e)))
\ No newline at end of file
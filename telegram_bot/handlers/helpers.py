@@ -3,6 +3,8 @@
 import io
 import csv
 import html
+import asyncio
+import tempfile
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
@@ -361,23 +363,42 @@ def _create_debt_concentration_bar(data):
 
 # --- CSV Exports ---
 
-def _create_csv_from_transactions(data):
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Date", "Type", "Amount", "Currency", "Category", "Description", "ID"])
-
-    for tx in data:
-        dt = datetime.fromisoformat(tx['timestamp']).astimezone(PHNOM_PENH_TZ)
-        writer.writerow([
-            dt.strftime('%Y-%m-%d %H:%M:%S'),
-            tx.get('type'), tx.get('amount'), tx.get('currency'),
-            tx.get('categoryId'), tx.get('description', ''), tx.get('_id')
-        ])
-
-    buf = io.BytesIO()
-    buf.write(output.getvalue().encode('utf-8'))
-    buf.seek(0)
-    return buf
+# Telegram rejects bot uploads over 50 MB.
+MAX_EXPORT_BYTES = 50 * 1024 * 1024
+# Exports up to this size stay in memory; larger ones spill to a temp file.
+EXPORT_SPOOL_BYTES = 1024 * 1024
+
+
+class ExportTooLarge(Exception):
+    """The export exceeds what Telegram accepts as a document."""
+
+
+def _spool_export(export_response):
+    """Copies a streamed export into a temp file, closing the response. Blocking; run it in a thread."""
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    try:
+        size = 0
+        for chunk in export_response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > MAX_EXPORT_BYTES:
+                raise ExportTooLarge()
+            spool.write(chunk)
+        spool.seek(0)
+        return spool
+    except BaseException:
+        spool.close()
+        raise
+    finally:
+        export_response.close()
+
+
+async def _create_csv_from_transactions(export_response):
+    """
+    Downloads a streamed /transactions/export CSV response off the event loop
+    and returns it as a seekable file for send_document; the caller closes it.
+    Raises ExportTooLarge past MAX_EXPORT_BYTES.
+    """
+    return await asyncio.to_thread(_spool_export, export_response)
 
 
 def _create_csv_from_debts(data):
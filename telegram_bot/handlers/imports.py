@@ -4,6 +4,7 @@ import html
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from telegram.ext import ContextTypes
 from decorators import authenticate_user
+from utils.i18n import t
 from api_client.imports import upload_bank_statement
 
 log = logging.getLogger(__name__)
@@ -73,6 +74,7 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         # 4. Generate Web App UI Response
         session_id = result.get('session_id')
         count = result.get('transaction_count', 0)
+        duplicates = result.get('duplicate_count', 0)
         safe_filename = html.escape(document.file_name)
 
         # Construct the deep link to the specific Next.js import review page
@@ -83,10 +85,12 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
+        duplicate_note = t("imports.duplicate_note", context, count=duplicates) if duplicates else ""
         await status_msg.edit_text(
             f"✅ <b>Statement Parsed Successfully!</b>\n\n"
-            f"Found <b>{count}</b> transactions in <code>{safe_filename}</code>.\n\n"
-            f"Click the button below to review your transactions and remove any duplicates before importing.",
+            f"Found <b>{count}</b> transactions in <code>{safe_filename}</code>.\n"
+            f"{duplicate_note}\n"
+            f"Click the button below to review your transactions before importing.",
             parse_mode='HTML',
             reply_markup=reply_markup
         )
@@ -1,16 +1,22 @@
 # web_service/app/__init__.py
 
-import certifi
+from datetime import datetime
+from zoneinfo import ZoneInfo
 from flask import Flask, jsonify, current_app
 from flask_cors import CORS
-from pymongo import MongoClient
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from flasgger import Swagger
 
 from .config import Config
-from .services.scheduler import send_daily_reminder_job, run_scheduled_report
-from .utils.db import init_db_indexes
+from .services import fx
+from .utils import shared_cache
+from .services.scheduler import send_daily_reminder_job, run_scheduled_report, run_balance_reconciliation
+from .utils.db import init_db
+from .commands import register_commands
+
+PHNOM_PENH_TZ = ZoneInfo("Asia/Phnom_Penh")
 
 
 def get_db(app=None):
@@ -31,15 +37,15 @@ def create_app():
                 "http://localhost:3000"
             ],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization"],
+            "expose_headers": ["X-Next-Cursor"]
         }
     })
 
-    client = MongoClient(Config.MONGODB_URI, tls=True, tlsCAFile=certifi.where())
-    app.db = client[Config.DB_NAME]
-
-    # --- Performance: Initialize DB Indexes ---
-    init_db_indexes(app)
+    # --- Performance: Shared client, initialize DB Indexes ---
+    init_db(app)
+    fx.bind(app.db)
+    shared_cache.bind(app.db)
 
     scheduler = BackgroundScheduler(daemon=True, timezone='Asia/Phnom_Penh')
     scheduler.add_job(
@@ -76,6 +82,26 @@ def create_app():
         id='yearly_report',
         replace_existing=True,
     )
+    scheduler.add_job(
+        run_balance_reconciliation,
+        trigger=CronTrigger(hour=3, minute=0),
+        id='balance_reconciliation',
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        fx.refresh,
+        trigger=IntervalTrigger(minutes=Config.FX_REFRESH_MINUTES),
+        id='fx_refresh',
+        replace_existing=True,
+        next_run_time=datetime.now(PHNOM_PENH_TZ),
+    )
+    if shared_cache.enabled():
+        scheduler.add_job(
+            shared_cache.poll,
+            trigger=IntervalTrigger(seconds=Config.AUTH_EVENTS_POLL_SECONDS),
+            id='auth_events_poll',
+            replace_existing=True,
+        )
     scheduler.start()
     app.scheduler = scheduler
 
@@ -90,6 +116,7 @@ def create_app():
     from .reminders.routes import reminders_bp
     from .summary.routes import summary_bp
     from .imports.routes import imports_bp
+    from .metrics.routes import metrics_bp
 
     app.register_blueprint(imports_bp)
     app.register_blueprint(settings_bp)
@@ -101,5 +128,8 @@ def create_app():
     app.register_blueprint(payments_bp)
     app.register_blueprint(reminders_bp)
     app.register_blueprint(summary_bp)
+    app.register_blueprint(metrics_bp)
+
+    register_commands(app)
 
     return app
\ No newline at end of file
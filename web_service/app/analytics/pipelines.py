@@ -1,6 +1,9 @@
+import re
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
+from app.services.enrichment import tokenize
+
 PHNOM_PENH_TZ = ZoneInfo("Asia/Phnom_Penh")
 
 FINANCIAL_TRANSACTION_CATEGORIES = [
@@ -8,32 +11,109 @@ FINANCIAL_TRANSACTION_CATEGORIES = [
 ]
 
 
-def get_currency_conversion_stage(user_rate):
-    """Returns the $addFields stage for converting amounts to USD."""
+def _legacy_usd_expr(user_rate):
+    """On-the-fly conversion, only evaluated for rows written before amount_usd existed."""
     return {
-        '$addFields': {
-            'amount_in_usd': {
-                '$cond': {
-                    'if': {'$eq': ['$currency', 'USD']},
-                    'then': '$amount',
-                    'else': {
-                        '$divide': [
-                            '$amount',
-                            {
-                                '$cond': {
-                                    'if': {'$gt': [{'$ifNull': ['$exchangeRateAtTime', user_rate]}, 0]},
-                                    'then': {'$ifNull': ['$exchangeRateAtTime', user_rate]},
-                                    'else': user_rate
-                                }
-                            }
-                        ]
+        '$cond': {
+            'if': {'$eq': ['$currency', 'USD']},
+            'then': '$amount',
+            'else': {
+                '$divide': [
+                    '$amount',
+                    {
+                        '$cond': {
+                            'if': {'$gt': [{'$ifNull': ['$exchangeRateAtTime', user_rate]}, 0]},
+                            'then': {'$ifNull': ['$exchangeRateAtTime', user_rate]},
+                            'else': user_rate
+                        }
                     }
-                }
+                ]
             }
         }
     }
 
 
+def usd_amount_expr(user_rate):
+    """Stored amount_usd; $ifNull only falls through for rows not yet backfilled."""
+    return {'$ifNull': ['$amount_usd', _legacy_usd_expr(user_rate)]}
+
+
+def local_date_expr():
+    return {'$ifNull': ['$local_date', {'$dateToString': {'format': '%Y-%m-%d', 'date': '$timestamp',
+                                                          'timezone': 'Asia/Phnom_Penh'}}]}
+
+
+def local_month_expr():
+    return {'$ifNull': ['$local_month', {'$dateToString': {'format': '%Y-%m', 'date': '$timestamp',
+                                                           'timezone': 'Asia/Phnom_Penh'}}]}
+
+
+def _has_rate_expr():
+    return {'$or': [
+        {'$ne': [{'$type': '$amount_usd'}, 'missing']},
+        {'$eq': ['$currency', 'USD']},
+        {'$gt': [{'$ifNull': ['$exchangeRateAtTime', 0]}, 0]}
+    ]}
+
+
+def rated_usd_expr():
+    """USD value when it is known without a user rate (stored, USD, or own rate), else 0."""
+    return {'$ifNull': ['$amount_usd', {'$cond': [
+        _has_rate_expr(),
+        {'$cond': [{'$eq': ['$currency', 'USD']}, '$amount', {'$divide': ['$amount', '$exchangeRateAtTime']}]},
+        0
+    ]}]}
+
+
+def unrated_amount_expr():
+    """Native amount of legacy rows that still need the user's rate, else 0."""
+    return {'$cond': [_has_rate_expr(), 0, '$amount']}
+
+
+def get_currency_conversion_stage(user_rate):
+    """Returns the $addFields stage exposing the USD amount as amount_in_usd."""
+    return {'$addFields': {'amount_in_usd': usd_amount_expr(user_rate)}}
+
+
+def build_keyword_filter(keywords, logic='OR', substring=True):
+    """
+    Match clause for a keyword search. By default each keyword is an
+    unanchored, case-insensitive regex on description, so partial words match
+    ("coff" finds "Coffee"). With substring=False (keyword_match=word),
+    whole-word keywords become $all/$in on the indexed `tokens` array; rows
+    written before `tokens` existed (see `flask backfill-derived-fields`)
+    fall back to a word-boundary regex so they stay searchable. Keywords with
+    no word characters always use the substring regex.
+    """
+    token_sets, word_regexes, regexes = [], [], []
+    for keyword in keywords:
+        tokens = tokenize(keyword)
+        if substring or not tokens:
+            regexes.append({'description': re.compile(re.escape(keyword), re.IGNORECASE)})
+        else:
+            token_sets.append(tokens)
+            words = [{'description': re.compile(rf'\b{re.escape(t)}\b', re.IGNORECASE)} for t in tokens]
+            word_regexes.append(words[0] if len(words) == 1 else {'$and': words})
+
+    if logic.upper() == 'AND':
+        clauses = list(regexes)
+        if token_sets:
+            clauses.insert(0, {'$or': [
+                {'tokens': {'$all': list(dict.fromkeys(t for ts in token_sets for t in ts))}},
+                {'tokens': {'$exists': False}, '$and': word_regexes}
+            ]})
+        return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+    clauses = list(regexes)
+    singles = [ts[0] for ts in token_sets if len(ts) == 1]
+    if singles:
+        clauses.insert(0, {'tokens': {'$in': singles}})
+    clauses.extend({'tokens': {'$all': ts}} for ts in token_sets if len(ts) > 1)
+    if token_sets:
+        clauses.append({'tokens': {'$exists': False}, '$or': word_regexes})
+    return clauses[0] if len(clauses) == 1 else {'$or': clauses}
+
+
 def build_search_pipeline(match_stage):
     """Builds the pipeline for transaction search analytics."""
     return [
@@ -52,87 +132,77 @@ def build_search_pipeline(match_stage):
     ]
 
 
-def build_start_balance_pipeline(start_date_utc, user_match, user_rate):
-    """Calculates income and expenses prior to the start date."""
-    return [
-        {'$match': {'timestamp': {'$lt': start_date_utc}, **user_match}},
-        get_currency_conversion_stage(user_rate),
-        {'$group': {'_id': '$type', 'totalUSD': {'$sum': '$amount_in_usd'}}}
-    ]
-
-
 def build_faceted_report_pipeline(date_range_match, user_match, user_rate):
     """Combines multiple analytical views into a single $facet aggregation."""
-    conversion_stage = get_currency_conversion_stage(user_rate)
+    usd = usd_amount_expr(user_rate)
     base_match = {**date_range_match, **user_match}
 
     non_financial_match = {'type': 'expense', 'categoryId': {'$nin': FINANCIAL_TRANSACTION_CATEGORIES}}
 
     return [
         {'$match': base_match},
-        conversion_stage,
         {
             '$facet': {
                 'operational': [
                     {'$match': {'categoryId': {'$nin': FINANCIAL_TRANSACTION_CATEGORIES}}},
                     {'$group': {'_id': {'type': '$type', 'category': '$categoryId'},
-                                'total': {'$sum': '$amount_in_usd'}}},
+                                'total': {'$sum': usd}}},
                     {'$sort': {'total': -1}}
                 ],
                 'financial': [
                     {'$match': {'categoryId': {'$in': FINANCIAL_TRANSACTION_CATEGORIES}}},
-                    {'$group': {'_id': '$categoryId', 'total': {'$sum': '$amount_in_usd'}}}
+                    {'$group': {'_id': '$categoryId', 'total': {'$sum': usd}}}
                 ],
                 'total_flow': [
-                    {'$group': {'_id': '$type', 'totalUSD': {'$sum': '$amount_in_usd'}}}
+                    {'$group': {'_id': '$type', 'totalUSD': {'$sum': usd}}}
                 ],
                 'spending_over_time': [
                     {'$match': non_financial_match},
-                    {
-                        '$project': {
-                            'date': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$timestamp',
-                                                       'timezone': 'Asia/Phnom_Penh'}},
-                            'amount_in_usd': 1
-                        }
-                    },
-                    {'$group': {'_id': '$date', 'total_spent_usd': {'$sum': '$amount_in_usd'}}},
+                    {'$group': {'_id': local_date_expr(), 'total_spent_usd': {'$sum': usd}}},
                     {'$sort': {'_id': 1}},
                     {'$project': {'_id': 0, 'date': '$_id', 'total_spent_usd': 1}}
                 ],
                 'daily_stats': [
                     {'$match': non_financial_match},
-                    {
-                        '$group': {
-                            '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$timestamp',
-                                                      'timezone': 'Asia/Phnom_Penh'}},
-                            'total_spent_usd': {'$sum': '$amount_in_usd'}
-                        }
-                    },
+                    {'$group': {'_id': local_date_expr(), 'total_spent_usd': {'$sum': usd}}},
                     {'$sort': {'total_spent_usd': -1}}
                 ],
-                'top_expense': [
-                    {'$match': non_financial_match},
-                    {'$sort': {'amount_in_usd': -1}},
-                    {'$limit': 1},
-                    {
-                        '$project': {
-                            '_id': 0,
-                            'description': '$description',
-                            'category': '$categoryId',
-                            'amount_usd': '$amount_in_usd',
-                            'date': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$timestamp',
-                                                       'timezone': 'Asia/Phnom_Penh'}}
-                        }
-                    }
-                ]
+                'top_expense': _top_expense_stages(non_financial_match, user_rate)
             }
         }
     ]
 
 
+def _top_expense_stages(non_financial_match, user_rate):
+    return [
+        {'$match': non_financial_match},
+        get_currency_conversion_stage(user_rate),
+        {'$sort': {'amount_in_usd': -1}},
+        {'$limit': 1},
+        {
+            '$project': {
+                '_id': 0,
+                'description': '$description',
+                'category': '$categoryId',
+                'amount_usd': '$amount_in_usd',
+                'date': local_date_expr()
+            }
+        }
+    ]
+
+
+def build_top_expense_pipeline(date_range_match, user_match, user_rate):
+    """Standalone top_expense facet, used alongside the daily rollup report path."""
+    non_financial_match = {'type': 'expense', 'categoryId': {'$nin': FINANCIAL_TRANSACTION_CATEGORIES}}
+    return [
+        {'$match': {**date_range_match, **user_match, **non_financial_match}},
+        *_top_expense_stages(non_financial_match, user_rate)
+    ]
+
+
 def build_habits_pipeline(start_date_utc, end_date_utc, user_match, user_rate):
     """Pipelines for spending habits (Day of Week, Keywords)."""
-    conversion_stage = get_currency_conversion_stage(user_rate)
+    usd = usd_amount_expr(user_rate)
     match_base = {
         'timestamp': {'$gte': start_date_utc, '$lte': end_date_utc},
         'type': 'expense',
@@ -141,10 +211,9 @@ def build_habits_pipeline(start_date_utc, end_date_utc, user_match, user_rate):
 
     day_of_week = [
         {'$match': match_base},
-        conversion_stage,
         {'$group': {
             '_id': {'$dayOfWeek': {'date': '$timestamp', 'timezone': 'Asia/Phnom_Penh'}},
-            'totalAmount': {'$sum': '$amount_in_usd'}
+            'totalAmount': {'$sum': usd}
         }},
         {'$sort': {'_id': 1}},
         {'$project': {
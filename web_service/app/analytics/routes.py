@@ -1,13 +1,15 @@
-import re
 from datetime import datetime, timedelta, time
 from zoneinfo import ZoneInfo
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, g, current_app
 from bson import ObjectId
 
-from app.utils.db import get_db, settings_collection, transactions_collection
-from app.utils.currency import get_live_usd_to_khr_rate
+from app.utils.db import get_db, transactions_collection
 from app.utils.auth import auth_required
+from app.utils.cache import account_cached
+from app.utils.profile import current_profile
 from app.analytics import pipelines
+from app.services import checkpoints, keyword_stats, rollups
+from app.services.enrichment import category_key
 
 analytics_bp = Blueprint('analytics', __name__, url_prefix='/analytics')
 
@@ -23,23 +25,11 @@ def get_account_id():
 
 
 def _get_user_financial_base(account_id):
-    """Fetches user's initial balance in USD and their preferred rate."""
-    doc = settings_collection().find_one(
-        {'account_id': account_id},
-        {'settings.initial_balances': 1, 'settings.rate_preference': 1, 'settings.fixed_rate': 1}
-    )
-    if not doc:
+    """User's initial balance in USD and their preferred rate, from the request profile."""
+    profile = current_profile(account_id)
+    if profile is None:
         raise Exception("User settings not found")
-
-    settings = doc.get('settings', {})
-    initial = settings.get('initial_balances', {})
-
-    rate = get_live_usd_to_khr_rate()
-    if settings.get('rate_preference') == 'fixed':
-        rate = settings.get('fixed_rate', 4100.0)
-
-    initial_usd = initial.get('USD', 0) + (initial.get('KHR', 0) / rate)
-    return initial_usd, rate
+    return profile.initial_balance_usd(), profile.khr_rate
 
 
 def get_utc_range_for_period(period):
@@ -116,16 +106,14 @@ def search_transactions():
         match_stage['type'] = params['transaction_type']
 
     if params.get('categories'):
-        cats = [re.compile(f'^{re.escape(c.strip())}$', re.IGNORECASE) for c in params['categories']]
-        match_stage['categoryId'] = {'$in': cats}
+        match_stage['category_key'] = {'$in': [category_key(c) for c in params['categories']]}
 
     if params.get('keywords'):
-        keywords = params['keywords']
-        if params.get('keyword_logic', 'OR').upper() == 'AND':
-            match_stage['$and'] = [{'description': re.compile(k, re.IGNORECASE)} for k in keywords]
-        else:
-            regex_str = '|'.join([re.escape(k) for k in keywords])
-            match_stage['description'] = re.compile(regex_str, re.IGNORECASE)
+        match_stage.update(pipelines.build_keyword_filter(
+            params['keywords'],
+            params.get('keyword_logic', 'OR'),
+            substring=params.get('keyword_match', 'substring') != 'word'
+        ))
 
     results = list(transactions_collection().aggregate(pipelines.build_search_pipeline(match_stage)))
 
@@ -164,6 +152,7 @@ def search_transactions():
 
 @analytics_bp.route('/report/detailed', methods=['GET'])
 @auth_required(min_role="premium_user")
+@account_cached
 def get_detailed_report():
     try:
         account_id = get_account_id()
@@ -182,21 +171,22 @@ def get_detailed_report():
 
     user_match = {'account_id': account_id}
 
-    # 1. Start Balance
-    start_bal_res = list(transactions_collection().aggregate(
-        pipelines.build_start_balance_pipeline(start_utc, user_match, user_rate)
-    ))
-    start_inc = next((i['totalUSD'] for i in start_bal_res if i['_id'] == 'income'), 0)
-    start_exp = next((i['totalUSD'] for i in start_bal_res if i['_id'] == 'expense'), 0)
-    balance_at_start = initial_usd + start_inc - start_exp
+    # 1. Start Balance (nearest month-end checkpoint + short delta scan)
+    balance_at_start = initial_usd + checkpoints.opening_balance_usd(get_db(), account_id, start_utc, user_rate)
 
     # 2. Faceted Report
     date_match = {'timestamp': {'$gte': start_utc, '$lte': end_utc}}
-    facet_res = list(transactions_collection().aggregate(
-        pipelines.build_faceted_report_pipeline(date_match, user_match, user_rate)
-    ))
-
-    facets = facet_res[0] if facet_res else {}
+    if current_app.config.get('USE_DAILY_ROLLUPS'):
+        rows = rollups.fetch(get_db(), account_id, start_local, end_local)
+        facets = rollups.report_facets(rows, user_rate, pipelines.FINANCIAL_TRANSACTION_CATEGORIES)
+        facets['top_expense'] = list(transactions_collection().aggregate(
+            pipelines.build_top_expense_pipeline(date_match, user_match, user_rate)
+        ))
+    else:
+        facet_res = list(transactions_collection().aggregate(
+            pipelines.build_faceted_report_pipeline(date_match, user_match, user_rate)
+        ))
+        facets = facet_res[0] if facet_res else {}
 
     report = {
         "startDate": start_local.isoformat(),
@@ -251,6 +241,7 @@ def get_detailed_report():
 
 @analytics_bp.route('/habits', methods=['GET'])
 @auth_required(min_role="premium_user")
+@account_cached
 def get_spending_habits():
     try:
         account_id = get_account_id()
@@ -258,7 +249,7 @@ def get_spending_habits():
         return jsonify({'error': 'Invalid account_id format'}), 400
 
     try:
-        start_utc, end_utc, _, _ = parse_date_params(request.args)
+        start_utc, end_utc, start_local, end_local = parse_date_params(request.args)
     except ValueError:
         return jsonify({"error": "Invalid date format"}), 400
 
@@ -269,7 +260,18 @@ def get_spending_habits():
 
     day_pl, kw_pl = pipelines.build_habits_pipeline(start_utc, end_utc, {'account_id': account_id}, user_rate)
 
+    if current_app.config.get('USE_DAILY_ROLLUPS'):
+        rows = rollups.fetch(get_db(), account_id, start_local, end_local, type='expense')
+        by_day = rollups.day_of_week_totals(rows, user_rate)
+    else:
+        by_day = list(transactions_collection().aggregate(day_pl))
+
+    if current_app.config.get('USE_KEYWORD_STATS'):
+        by_keyword = keyword_stats.top_keywords(get_db(), account_id, start_local, end_local)
+    else:
+        by_keyword = list(transactions_collection().aggregate(kw_pl))
+
     return jsonify({
-        'byDayOfWeek': list(transactions_collection().aggregate(day_pl)),
-        'keywordsByCategory': list(transactions_collection().aggregate(kw_pl))
+        'byDayOfWeek': by_day,
+        'keywordsByCategory': by_keyword
     })
\ No newline at end of file
@@ -4,10 +4,12 @@ from app.models import User
 from app.utils.auth import auth_required, invalidate_token_cache, \
     invalidate_token_cache_by_account, login_required
 from app import get_db
+from app.utils import shared_cache
 from app.utils.db import settings_collection
 from app.config import Config
 import requests
 from requests.auth import HTTPBasicAuth
+from app.utils import http_client
 import os
 from bson import ObjectId
 import hmac
@@ -34,7 +36,7 @@ def send_telegram_alert(telegram_id, message):
             "text": message,
             "parse_mode": "Markdown"
         }
-        resp = requests.post(url, json=payload, timeout=5)
+        resp = http_client.post(http_client.TELEGRAM, url, json=payload, endpoint='sendMessage', timeout=5)
 
         if resp.status_code != 200:
             current_app.logger.error(f"❌ Telegram API Error {resp.status_code}: {resp.text}")
@@ -57,8 +59,10 @@ def login():
 
     try:
         # Call Bifrost API
-        response = requests.post(
+        response = http_client.post(
+            http_client.BIFROST,
             f"{Config.BIFROST_URL}/auth/api/login",
+            endpoint='login',
             json={
                 "client_id": Config.BIFROST_CLIENT_ID,
                 "email": email,
@@ -90,8 +94,10 @@ def register():
 
     # Trigger Bifrost OTP Flow
     try:
-        response = requests.post(
+        response = http_client.post(
+            http_client.BIFROST,
             f"{Config.BIFROST_URL}/auth/api/request-email-otp",
+            endpoint='request-email-otp',
             json={
                 "client_id": Config.BIFROST_CLIENT_ID,
                 "email": email
@@ -114,8 +120,10 @@ def verify_otp_and_login():
 
     try:
         # Call Bifrost API
-        response = requests.post(
+        response = http_client.post(
+            http_client.BIFROST,
             f"{Config.BIFROST_URL}/auth/api/verify-otp-login",
+            endpoint='verify-otp-login',
             json={
                 "client_id": Config.BIFROST_CLIENT_ID,
                 "code": code
@@ -145,8 +153,10 @@ def telegram_login():
     try:
         # Call Bifrost
         # FIX: Increased timeout from 10s to BIFROST_TIMEOUT (60s) to handle cold starts
-        response = requests.post(
+        response = http_client.post(
+            http_client.BIFROST,
             f"{Config.BIFROST_URL}/auth/api/telegram-login",
+            endpoint='telegram-login',
             json=payload,
             timeout=Config.BIFROST_TIMEOUT
         )
@@ -194,8 +204,10 @@ def link_account():
     client_secret = current_app.config.get("BIFROST_CLIENT_SECRET")
 
     try:
-        resp = requests.post(
+        resp = http_client.post(
+            http_client.BIFROST,
             target_url,
+            endpoint='link-account',
             json=payload,
             auth=HTTPBasicAuth(client_id, client_secret),
             timeout=Config.BIFROST_TIMEOUT
@@ -208,6 +220,8 @@ def link_account():
                         {'account_id': ObjectId(account_id)},
                         {'$set': {'email': data['email']}}
                     )
+                    if shared_cache.enabled():
+                        shared_cache.invalidate_profile(account_id)
                 except Exception as e:
                     current_app.logger.warning(f"Failed to update local email cache: {e}")
             return jsonify(resp.json()), 200
@@ -230,8 +244,10 @@ def initiate_telegram_link():
         client_id = current_app.config.get("BIFROST_CLIENT_ID")
         client_secret = current_app.config.get("BIFROST_CLIENT_SECRET")
 
-        resp = requests.post(
+        resp = http_client.post(
+            http_client.BIFROST,
             f"{bifrost_url}/internal/generate-link-token",
+            endpoint='generate-link-token',
             json={"account_id": g.account_id},
             auth=HTTPBasicAuth(client_id, client_secret),
             timeout=Config.BIFROST_TIMEOUT
@@ -267,8 +283,10 @@ def generate_link_command():
         client_secret = current_app.config.get("BIFROST_CLIENT_SECRET")
 
         # Reuse the generate-link-token endpoint from Bifrost
-        resp = requests.post(
+        resp = http_client.post(
+            http_client.BIFROST,
             f"{bifrost_url}/internal/generate-link-token",
+            endpoint='generate-link-token',
             json={"account_id": g.account_id},
             auth=HTTPBasicAuth(client_id, client_secret),
             timeout=Config.BIFROST_TIMEOUT
@@ -304,8 +322,10 @@ def complete_telegram_link():
     client_secret = current_app.config.get("BIFROST_CLIENT_SECRET")
 
     try:
-        resp = requests.post(
+        resp = http_client.post(
+            http_client.BIFROST,
             f"{bifrost_url}/internal/link-account",
+            endpoint='link-account',
             json={"link_token": token, "telegram_id": telegram_id},
             auth=HTTPBasicAuth(client_id, client_secret),
             timeout=Config.BIFROST_TIMEOUT
@@ -0,0 +1,221 @@
+# web_service/app/commands.py
+
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import click
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+
+from .config import Config
+from .parsers import benchmark
+from .services import checkpoints, fx, keyword_stats, rollups
+from .services.enrichment import derived_fields, enrich, to_local_date, write_time_rate
+from .utils.currency import get_user_fixed_rate
+from .utils import indexes
+from .utils.db import init_db_indexes
+
+
+def _account_ids(accounts):
+    return [ObjectId(a) for a in accounts] if accounts else None
+
+
+BENCH_CATEGORIES = ['Food', 'Transport', 'Shopping', 'Bills', 'Health', 'Entertainment', 'Coffee', 'Rent']
+
+
+def _time_query(collection, query, runs):
+    """Median wall time (ms) of a sorted, limited find plus the winning plan's keys/docs examined."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        list(collection.find(query).sort('timestamp', -1).limit(50))
+        samples.append((time.perf_counter() - start) * 1000)
+    stats = collection.find(query).sort('timestamp', -1).limit(50).explain()['executionStats']
+    return statistics.median(samples), stats['totalKeysExamined'], stats['totalDocsExamined']
+
+
+def register_commands(app):
+    """Registers maintenance commands on the `flask` CLI."""
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--account', 'accounts', multiple=True, help='Limit to these account IDs (repeatable).')
+    def rebuild_rollups_command(accounts):
+        """Backfills the daily_rollups collection from raw transactions."""
+        written, failed = rollups.rebuild(app.db, _account_ids(accounts))
+        click.echo(f"Wrote {written} daily rollup documents.")
+        if failed:
+            raise click.ClickException(f"{failed} rollup writes failed; stale rollups were kept. Re-run to retry.")
+
+    @app.cli.command('rebuild-keyword-stats')
+    @click.option('--account', 'accounts', multiple=True, help='Limit to these account IDs (repeatable).')
+    def rebuild_keyword_stats_command(accounts):
+        """Backfills the keyword_stats collection from raw expenses."""
+        written, failed = keyword_stats.rebuild(app.db, _account_ids(accounts))
+        click.echo(f"Wrote {written} keyword stats documents.")
+        if failed:
+            raise click.ClickException(f"{failed} keyword stats writes failed; stale stats were kept. Re-run to retry.")
+
+    @app.cli.command('backfill-derived-fields')
+    @click.option('--batch-size', default=1000, show_default=True, help='Updates per bulk write.')
+    def backfill_derived_fields_command(batch_size):
+        """Stores amount_usd, local dates, search tokens and category keys on transactions written before they existed."""
+        fixed_rates = {}
+        touched = set()
+        updated, ops = 0, []
+
+        cursor = app.db.transactions.find(
+            {'$or': [{f: {'$exists': False}} for f in ('amount_usd', 'tokens', 'category_key')],
+             'timestamp': {'$type': 'date'}},
+            {'account_id': 1, 'amount': 1, 'currency': 1, 'exchangeRateAtTime': 1, 'timestamp': 1,
+             'description': 1, 'categoryId': 1, 'amount_usd': 1}
+        )
+        for tx in cursor:
+            account_id = tx['account_id']
+            if account_id not in fixed_rates:
+                fixed_rates[account_id] = get_user_fixed_rate(account_id)
+            try:
+                # Rows without their own rate are converted at the historical rate of their day.
+                fallback_rate = (write_time_rate(tx) or fixed_rates[account_id]
+                                 or fx.rate_on(to_local_date(tx['timestamp'])))
+                fields = derived_fields(tx, fallback_rate)
+            except (TypeError, ValueError, ZeroDivisionError):
+                continue
+            ops.append(UpdateOne({'_id': tx['_id']}, {'$set': fields}))
+            touched.add(account_id)
+            if len(ops) >= batch_size:
+                updated += app.db.transactions.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            updated += app.db.transactions.bulk_write(ops, ordered=False).modified_count
+
+        # Checkpoints captured the old read-time conversion; let reports rebuild them.
+        if touched:
+            checkpoints.drop_all(app.db, touched)
+
+        click.echo(f"Backfilled {updated} transactions across {len(touched)} accounts.")
+        click.echo("Run `flask rebuild-rollups` to refresh the daily rollups.")
+
+    @app.cli.command('bench-category-filter')
+    @click.option('--mongo-uri', required=True, envvar='BENCH_MONGODB_URI',
+                  help='Scratch cluster to seed the benchmark on; must differ from MONGODB_URI.')
+    @click.option('--count', default=100_000, show_default=True, help='Transactions in the synthetic account.')
+    @click.option('--runs', default=20, show_default=True, help='Timed runs per query form.')
+    def bench_category_filter_command(mongo_uri, count, runs):
+        """Compares the regex categoryId filter with the exact category_key filter."""
+        if mongo_uri == Config.MONGODB_URI:
+            raise click.ClickException("Refusing to seed benchmark data on the application cluster.")
+
+        client = MongoClient(mongo_uri)
+        bench_db = client[f"{Config.DB_NAME}_bench"]
+        try:
+            bench_db.transactions.drop()
+            init_db_indexes(bench_db, force=True)
+
+            account_id = ObjectId()
+            now = datetime.now(timezone.utc)
+            rng = random.Random(42)
+            batch = []
+            for i in range(count):
+                batch.append(enrich({
+                    'account_id': account_id,
+                    'type': 'expense',
+                    'amount': round(rng.uniform(1, 50), 2),
+                    'currency': 'USD',
+                    'categoryId': rng.choice(BENCH_CATEGORIES),
+                    'description': f"bench {i}",
+                    'timestamp': now - timedelta(minutes=i)
+                }, 4100.0))
+                if len(batch) >= 5000:
+                    bench_db.transactions.insert_many(batch)
+                    batch = []
+            if batch:
+                bench_db.transactions.insert_many(batch)
+
+            wanted = ['coffee', 'RENT']
+            forms = {
+                'regex categoryId': {'account_id': account_id, 'categoryId': {
+                    '$in': [re.compile(f'^{re.escape(c)}$', re.IGNORECASE) for c in wanted]}},
+                'exact category_key': {'account_id': account_id, 'category_key': {'$in': [c.lower() for c in wanted]}}
+            }
+            for name, query in forms.items():
+                ms, keys, docs = _time_query(bench_db.transactions, query, runs)
+                click.echo(f"{name:<20} median {ms:8.2f} ms   keys examined {keys:>7}   docs examined {docs:>7}")
+        finally:
+            client.drop_database(bench_db.name)
+            client.close()
+
+    @app.cli.command('bench-parsers')
+    @click.option('--rows', 'sizes', multiple=True, type=int, default=benchmark.SIZES, show_default=True,
+                  help='Statement sizes to generate; repeatable.')
+    @click.option('--bank', 'banks', multiple=True, type=click.Choice(benchmark.BANKS),
+                  default=benchmark.BANKS, show_default=True)
+    @click.option('--format', 'formats', multiple=True, type=click.Choice(benchmark.FORMATS),
+                  default=benchmark.FORMATS, show_default=True)
+    @click.option('--runs', default=3, show_default=True, help='Timed parses per case; the median is reported.')
+    @click.option('--workdir', type=click.Path(file_okay=False), default=None,
+                  help='Keep generated statements here and reuse them on later runs.')
+    def bench_parsers_command(sizes, banks, formats, runs, workdir):
+        """Reports rows/sec and peak RSS of the statement parsers on generated ABA/ACLEDA files."""
+        def report(r):
+            click.echo(f"{r['bank']:<7} {r['format']:<5} {r['rows']:>7} rows ({r['file_mb']:6.2f} MB)   "
+                       f"{r['rows_per_sec']:>10,.0f} rows/s   peak RSS +{r['peak_rss_mb']:7.1f} MB")
+            if r['parsed'] != r['rows']:
+                click.echo(f"  warning: parsed {r['parsed']} of {r['rows']} rows")
+
+        if workdir:
+            os.makedirs(workdir, exist_ok=True)
+            benchmark.run(workdir, banks, formats, sizes, runs, report)
+            return
+        with tempfile.TemporaryDirectory(prefix='bench-parsers-') as tmp:
+            benchmark.run(tmp, banks, formats, sizes, runs, report)
+
+    @app.cli.command('load-fx-rates')
+    @click.argument('csv_file', type=click.File('r', encoding='utf-8'))
+    def load_fx_rates_command(csv_file):
+        """Bulk-loads historical USD->KHR rates (`date,rate` rows) into fx_rates."""
+        try:
+            written = fx.load_csv(app.db, csv_file.read())
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Loaded {written} daily rates.")
+
+    @app.cli.command('diff-indexes')
+    def diff_indexes_command():
+        """Compares live indexes with the spec in utils/indexes.py; exits 1 on any difference."""
+        report = indexes.diff(app.db)
+        if not report:
+            click.echo("Live indexes match the spec.")
+            return
+        for coll, d in report.items():
+            click.echo(f"{coll}:")
+            for idx in d['missing']:
+                click.echo(f"  missing  {idx}")
+            for idx in d['changed']:
+                click.echo(f"  changed  {idx['name']}: live {idx['live']} != spec {idx['spec']}")
+            for name in d['extra']:
+                click.echo(f"  extra    {name}")
+        raise SystemExit(1)
+
+    @app.cli.command('sync-indexes')
+    def sync_indexes_command():
+        """Creates every spec'd index now, ignoring the stored fingerprint."""
+        init_db_indexes(app.db, force=True)
+        result = indexes.status()
+        if result['state'] != 'synced':
+            raise click.ClickException(f"Index sync failed: {result['failed']}")
+        click.echo(f"Indexes synced (fingerprint {indexes.fingerprint()[:12]}).")
+
+    @app.cli.command('index-usage')
+    def index_usage_command():
+        """Lists $indexStats access counts per index since the last server restart, least used first."""
+        for coll, rows in indexes.usage(app.db).items():
+            click.echo(f"{coll}:")
+            for row in rows:
+                flag = '' if row['in_spec'] else '  (not in spec)'
+                since = row['since'].strftime('%Y-%m-%d %H:%M')
+                click.echo(f"  {row['ops']:>10} ops since {since}  {row['name']}{flag}")
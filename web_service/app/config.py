@@ -13,6 +13,25 @@ class Config:
     MONGODB_URI = os.getenv("MONGODB_URI")
     DB_NAME = os.getenv("DB_NAME", "expTracker").strip()
 
+    # MongoDB client: one per process (utils/db.get_client), shared by routes
+    # and scheduled jobs. Compressors the server or driver lacks are skipped.
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+    MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib").strip()
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+
+    # Command profiler (/internal/metrics/db): durations are kept for the last
+    # DB_PROFILER_WINDOW commands per (endpoint, command, collection); commands
+    # slower than DB_SLOW_MS are logged and explained at most once per key
+    # every DB_EXPLAIN_INTERVAL seconds.
+    DB_PROFILER_ENABLED = os.getenv("DB_PROFILER_ENABLED", "true").strip().lower() == "true"
+    DB_PROFILER_WINDOW = int(os.getenv("DB_PROFILER_WINDOW", "500"))
+    DB_SLOW_MS = int(os.getenv("DB_SLOW_MS", "200"))
+    DB_EXPLAIN_INTERVAL = int(os.getenv("DB_EXPLAIN_INTERVAL", "300"))
+
     # 3rd Party
     EXCHANGERATE_API_KEY = os.getenv("EXCHANGERATE_API_KEY", "").strip()
     TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN", "").strip()
@@ -24,9 +43,57 @@ class Config:
     BIFROST_CLIENT_ID = os.getenv("BIFROST_CLIENT_ID", "").strip()
     BIFROST_CLIENT_SECRET = os.getenv("BIFROST_CLIENT_SECRET", "").strip()
     BIFROST_WEBHOOK_SECRET = os.environ.get('BIFROST_WEBHOOK_SECRET')
+    # Local JWT verification: set BIFROST_JWT_SECRET (HS256) or BIFROST_JWKS_URL
+    # (RS256/ES256 public keys) to skip the validate-token round trip.
+    BIFROST_JWT_SECRET = os.getenv("BIFROST_JWT_SECRET", "").strip()
+    BIFROST_JWKS_URL = os.getenv("BIFROST_JWKS_URL", "").strip()
+    BIFROST_JWT_AUDIENCE = os.getenv("BIFROST_JWT_AUDIENCE", "").strip()
+    BIFROST_JWT_ISSUER = os.getenv("BIFROST_JWT_ISSUER", "").strip()
+
+    # Analytics
+    # Enable only after backfilling with `flask rebuild-rollups`.
+    USE_DAILY_ROLLUPS = os.getenv("USE_DAILY_ROLLUPS", "false").strip().lower() == "true"
+    # Enable only after backfilling with `flask rebuild-keyword-stats`.
+    USE_KEYWORD_STATS = os.getenv("USE_KEYWORD_STATS", "false").strip().lower() == "true"
+
+    # Exchange Rate: refreshed in the background every FX_REFRESH_MINUTES;
+    # a rate older than FX_STALE_AFTER seconds also triggers a refresh on read.
+    FX_REFRESH_MINUTES = int(os.getenv("FX_REFRESH_MINUTES", "45"))
+    FX_STALE_AFTER = int(os.getenv("FX_STALE_AFTER", "3600"))
+
+    # Response Cache (summary, reports, habits, debt analysis)
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").strip().lower() == "true"
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+    # Auth token cache
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+    TOKEN_NEGATIVE_TTL = int(os.getenv("TOKEN_NEGATIVE_TTL", "30"))
+
+    # Cross-worker auth cache: "mongo" shares validated tokens through the
+    # auth_cache collection, caches settings profiles per worker for
+    # PROFILE_CACHE_TTL seconds, and broadcasts webhook invalidations through
+    # auth_events, polled every AUTH_EVENTS_POLL_SECONDS. "none" keeps every
+    # worker's caches private.
+    SHARED_AUTH_CACHE = os.getenv("SHARED_AUTH_CACHE", "none").strip().lower()
+    PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "30"))
+    AUTH_EVENTS_POLL_SECONDS = int(os.getenv("AUTH_EVENTS_POLL_SECONDS", "2"))
 
     # Timeouts
     BIFROST_TIMEOUT = 60
+    # Total budget for token validation across retries. Defaults to the same 60s
+    # as the other Bifrost calls: a cold-starting Bifrost can take most of it, and
+    # giving up sooner turns a slow start into 401s and breaker trips.
+    BIFROST_VALIDATE_TIMEOUT = int(os.getenv("BIFROST_VALIDATE_TIMEOUT", str(BIFROST_TIMEOUT)))
+
+    # Outbound HTTP (utils/http_client.py): pooled connections per upstream,
+    # bounded retries, and a circuit breaker that opens after
+    # HTTP_BREAKER_FAILURES consecutive failures for HTTP_BREAKER_COOLDOWN seconds.
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+    HTTP_BREAKER_FAILURES = int(os.getenv("HTTP_BREAKER_FAILURES", "5"))
+    HTTP_BREAKER_COOLDOWN = int(os.getenv("HTTP_BREAKER_COOLDOWN", "30"))
     ROLE_LEVELS = {
         'user': 1,
         'premium_user': 2,
@@ -5,9 +5,12 @@ import re
 from zoneinfo import ZoneInfo
 from pymongo import UpdateOne
 
-from app.utils.db import get_db, settings_collection, debts_collection, transactions_collection
-from app.utils.currency import get_live_usd_to_khr_rate
+from app.utils.db import get_db, debts_collection, transactions_collection
+from app.utils.currency import get_user_khr_rate
 from app.utils.auth import auth_required
+from app.utils.cache import account_cached, bumps_data_version
+from app.services import ledger
+from app.services.enrichment import enrich
 
 debts_bp = Blueprint('debts', __name__, url_prefix='/debts')
 UTC_TZ = ZoneInfo("UTC")
@@ -40,23 +43,9 @@ def serialize_debt(doc):
     return doc
 
 
-def get_user_khr_rate(account_id):
-    """Fetches the user's preferred KHR rate (fixed or live)."""
-    doc = settings_collection().find_one(
-        {'account_id': account_id},
-        {'settings.rate_preference': 1, 'settings.fixed_rate': 1}
-    )
-    if doc and 'settings' in doc:
-        settings = doc['settings']
-        if settings.get('rate_preference') == 'fixed':
-            rate = float(settings.get('fixed_rate', 4100.0))
-            if rate > 0:
-                return rate
-    return get_live_usd_to_khr_rate()
-
-
 @debts_bp.route('/', methods=['POST'])
 @auth_required(min_role="premium_user")
+@bumps_data_version
 def add_debt():
     try:
         account_id = get_account_id()
@@ -90,8 +79,10 @@ def add_debt():
         tx_data.update({'type': 'expense', 'categoryId': 'Loan Lent'})
     else:
         tx_data.update({'type': 'income', 'categoryId': 'Loan Received'})
+    enrich(tx_data, get_user_khr_rate(account_id))
 
     tx_id = transactions_collection().insert_one(tx_data).inserted_id
+    ledger.record_inserted(get_db(), [tx_data])
 
     # Create debt record
     debt = {
@@ -231,6 +222,7 @@ def _get_debts_by_filter(person_name, additional_filters):
 
 @debts_bp.route('/person/<payment_currency>/repay', methods=['POST'])
 @auth_required(min_role="premium_user")
+@bumps_data_version
 def record_lump_sum_repayment(payment_currency):
     try:
         account_id = get_account_id()
@@ -257,6 +249,8 @@ def record_lump_sum_repayment(payment_currency):
         except ValueError:
             pass  # Fallback to now
 
+    rate = get_user_khr_rate(account_id)
+
     # 1. Find Debts to Repay
     query_base = {
         'person': re.compile(f'^{re.escape(person_name)}$', re.IGNORECASE),
@@ -279,7 +273,6 @@ def record_lump_sum_repayment(payment_currency):
             return jsonify({'error': f'No open {debt_type} debts found for {person_name}'}), 404
 
         debt_currency = alt_currency
-        rate = get_user_khr_rate(account_id)
 
         if payment_currency == 'KHR':  # Debt is USD
             converted_amount = payment_amount / rate
@@ -299,7 +292,7 @@ def record_lump_sum_repayment(payment_currency):
         cat = "Loan Interest" if debt_type == 'lent' else "Interest Expense"
         tx_type = "income" if debt_type == 'lent' else "expense"
 
-        transactions_collection().insert_one({
+        interest_tx = {
             "account_id": account_id,
             "type": tx_type,
             "amount": interest,
@@ -308,7 +301,10 @@ def record_lump_sum_repayment(payment_currency):
             "accountName": f"{debt_currency} Account",
             "description": f"Interest {'from' if debt_type == 'lent' else 'paid to'} {person_name}",
             "timestamp": timestamp
-        })
+        }
+        enrich(interest_tx, rate)
+        transactions_collection().insert_one(interest_tx)
+        ledger.record_inserted(get_db(), [interest_tx])
 
     # 3. Update Debts (Bulk)
     bulk_ops = []
@@ -338,7 +334,7 @@ def record_lump_sum_repayment(payment_currency):
     rep_cat = 'Debt Settled' if debt_type == 'lent' else 'Debt Repayment'
     rep_type = 'income' if debt_type == 'lent' else 'expense'
 
-    transactions_collection().insert_one({
+    repayment_tx = {
         "account_id": account_id,
         "type": rep_type,
         "amount": payment_amount,
@@ -347,7 +343,10 @@ def record_lump_sum_repayment(payment_currency):
         "accountName": f"{payment_currency} Account",
         "description": f"Repayment {'from' if debt_type == 'lent' else 'to'} {person_name}",
         "timestamp": timestamp
-    })
+    }
+    enrich(repayment_tx, rate)
+    transactions_collection().insert_one(repayment_tx)
+    ledger.record_inserted(get_db(), [repayment_tx])
 
     msg = f"✅ Repayment of {payment_amount:,.2f} {payment_currency} recorded."
     if interest > 0:
@@ -358,6 +357,7 @@ def record_lump_sum_repayment(payment_currency):
 
 @debts_bp.route('/<debt_id>/cancel', methods=['POST'])
 @auth_required(min_role="premium_user")
+@bumps_data_version
 def cancel_debt(debt_id):
     try:
         account_id = get_account_id()
@@ -371,7 +371,7 @@ def cancel_debt(debt_id):
             orig = transactions_collection().find_one({'_id': ObjectId(tx_id)})
             if orig:
                 reverse_type = 'income' if orig['type'] == 'expense' else 'expense'
-                transactions_collection().insert_one({
+                reversal_tx = {
                     "account_id": account_id,
                     "type": reverse_type,
                     "amount": orig['amount'],
@@ -380,7 +380,12 @@ def cancel_debt(debt_id):
                     "accountName": orig['accountName'],
                     "description": f"Reversal: {orig['description']}",
                     "timestamp": datetime.now(UTC_TZ)
-                })
+                }
+                if orig.get('exchangeRateAtTime'):
+                    reversal_tx['exchangeRateAtTime'] = orig['exchangeRateAtTime']
+                enrich(reversal_tx, get_user_khr_rate(account_id))
+                transactions_collection().insert_one(reversal_tx)
+                ledger.record_inserted(get_db(), [reversal_tx])
 
         debts_collection().update_one(
             {'_id': ObjectId(debt_id)},
@@ -393,6 +398,7 @@ def cancel_debt(debt_id):
 
 @debts_bp.route('/<debt_id>', methods=['PUT'])
 @auth_required(min_role="premium_user")
+@bumps_data_version
 def update_debt(debt_id):
     try:
         account_id = get_account_id()
@@ -420,6 +426,7 @@ def update_debt(debt_id):
 
 @debts_bp.route('/analysis', methods=['GET'])
 @auth_required(min_role="premium_user")
+@account_cached
 def get_debt_analysis():
     try:
         account_id = get_account_id()
@@ -1,14 +1,25 @@
 import uuid
 import logging
 from datetime import datetime, timezone
+from bson import ObjectId
 from flask import Blueprint, request, jsonify, g
 from pymongo.errors import BulkWriteError
 from app.utils.auth import auth_required
+from app.utils.cache import bumps_data_version
+from app.utils.currency import get_user_khr_rates_on
 from app.utils.db import get_db
-from app.parsers.bank_statements import parse_statement, UnsupportedBankError
+from app.utils.pagination import CURSOR_HEADER, page_size
+from app.parsers.bank_statements import iter_statement, UnsupportedBankError
+from app.services import ledger, pending_imports
+from app.services.import_duplicates import DUPLICATE_FIELD, DuplicateChecker
+from app.services.enrichment import enrich, to_local_date
 
 log = logging.getLogger(__name__)
 
+DEFAULT_REVIEW_PAGE_SIZE = 100
+# Approved rows are enriched and inserted this many at a time on confirm.
+CONFIRM_BATCH_SIZE = 500
+
 # FIX: Added url_prefix='/imports' so the routes mount correctly
 imports_bp = Blueprint('imports', __name__, url_prefix='/imports')
 
@@ -32,39 +43,37 @@ def upload_statement():
 
     db = get_db()
 
-    # Fetch user's registered bank names for self-transfer detection
-    user_settings = db.settings.find_one({"account_id": g.account_id}) or {}
-    bank_names = user_settings.get("settings", {}).get("bank_names", {})
+    # User's registered bank names for self-transfer detection
+    bank_names = g.profile.settings.get("bank_names", {})
 
-    try:
-        file_bytes = file.read()
-        parsed_transactions = parse_statement(file_bytes, file.filename, user_bank_names=bank_names)
+    # Generate a unique session ID for the Next.js review page
+    session_id = str(uuid.uuid4())
 
-        if not parsed_transactions:
+    try:
+        # Rows are parsed from the upload stream and stored in batches as they
+        # are produced, so memory does not grow with the statement's length.
+        # Each batch is checked against the ledger before it is stored.
+        parsed_transactions = iter_statement(file.stream, file.filename, user_bank_names=bank_names)
+        checker = DuplicateChecker(db, ObjectId(g.account_id))
+        count, duplicates = pending_imports.store(
+            db, session_id, g.account_id, file.filename, parsed_transactions, check=checker.mark)
+
+        if not count:
             return jsonify({"error": "No valid transactions found in the file."}), 400
 
-        # Generate a unique session ID for the Next.js review page
-        session_id = str(uuid.uuid4())
-
-        # Store in pending_imports collection
-        db.pending_imports.insert_one({
-            "session_id": session_id,
-            "account_id": g.account_id,
-            "filename": file.filename,
-            "transactions": parsed_transactions,
-            "created_at": datetime.now(timezone.utc)
-        })
-
         return jsonify({
             "message": "File parsed successfully.",
             "session_id": session_id,
-            "transaction_count": len(parsed_transactions)
+            "transaction_count": count,
+            "duplicate_count": duplicates
         }), 200
 
     except UnsupportedBankError as e:
         return jsonify({"error": str(e)}), 400
     except Exception as e:
         log.error(f"Error parsing uploaded file {file.filename} for account {g.account_id}: {str(e)}")
+        # Drop any rows already stored for the half-parsed file
+        pending_imports.discard(db, session_id)
         return jsonify({"error": "An error occurred while processing the file."}), 500
 
 
@@ -72,33 +81,50 @@ def upload_statement():
 @auth_required(min_role="user")
 def get_pending_import(session_id):
     """
-    Retrieves the parsed transactions for a given session ID so the frontend can display them.
+    Retrieves one page of the parsed transactions for a given session ID so the
+    frontend can display them. Pass `limit` and the previous page's
+    `next_cursor` (also sent as X-Next-Cursor) as `cursor` to continue.
     """
+    try:
+        size = page_size(request.args.get('limit'), DEFAULT_REVIEW_PAGE_SIZE)
+        after_seq = int(request.args.get('cursor', -1))
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+
     db = get_db()
-    session_data = db.pending_imports.find_one({"session_id": session_id, "account_id": g.account_id})
+    session_data = pending_imports.find_session(db, session_id, g.account_id)
 
     if not session_data:
         return jsonify({"error": "Import session not found or expired."}), 404
 
+    transactions, next_seq = pending_imports.page(db, session_data, after_seq, size)
+
     # Format dates to ISO strings for JSON serialization
-    transactions = session_data.get('transactions', [])
     for txn in transactions:
         if isinstance(txn.get('date'), datetime):
             txn['date'] = txn['date'].isoformat()
 
-    return jsonify({
+    response = jsonify({
         "session_id": session_data["session_id"],
         "filename": session_data.get("filename", "Unknown"),
-        "transactions": transactions
-    }), 200
+        "transaction_count": session_data.get("row_count", len(session_data.get("transactions", []))),
+        "duplicate_count": session_data.get("duplicate_count", 0),
+        "transactions": transactions,
+        "next_cursor": str(next_seq) if next_seq is not None else None
+    })
+    if next_seq is not None:
+        response.headers[CURSOR_HEADER] = str(next_seq)
+    return response, 200
 
 
 @imports_bp.route('/<session_id>/confirm', methods=['POST'])
 @auth_required(min_role="user")
+@bumps_data_version
 def confirm_import(session_id):
     """
     Receives a list of approved bank_reference_ids from the frontend,
     inserts the matching transactions into the main DB, and deletes the session.
+    Rows flagged as duplicates at upload are skipped even if approved.
     """
     data = request.get_json()
     if not data or 'approved_reference_ids' not in data:
@@ -107,45 +133,70 @@ def confirm_import(session_id):
     approved_ids = set(data['approved_reference_ids'])
     db = get_db()
 
-    session_data = db.pending_imports.find_one({"session_id": session_id, "account_id": g.account_id})
+    session_data = pending_imports.find_session(db, session_id, g.account_id)
     if not session_data:
         return jsonify({"error": "Import session not found or expired."}), 404
 
-    transactions_to_insert = []
-    for txn in session_data.get('transactions', []):
-        if txn.get('bank_reference_id') in approved_ids:
-            # Ensure standard transaction fields are populated
-            txn['account_id'] = g.account_id
-            txn['status'] = 'completed'
-            txn['timestamp'] = txn['date']  # Use the parsed date as the timestamp
-            txn['created_at'] = datetime.now(timezone.utc)
-            del txn['date']  # Remove the temporary date key
-
-            transactions_to_insert.append(txn)
-
     inserted_count = 0
     duplicate_count = 0
-
-    if transactions_to_insert:
-        try:
-            # ordered=False allows Mongo to continue inserting the rest of the batch
-            # even if it hits a DuplicateKeyError on a specific document.
-            result = db.transactions.insert_many(transactions_to_insert, ordered=False)
-            inserted_count = len(result.inserted_ids)
-        except BulkWriteError as bwe:
-            # bwe.details contains information about which inserts succeeded and which failed
-            inserted_count = bwe.details.get('nInserted', 0)
-            # Count how many failed specifically due to duplicate key (code 11000)
-            duplicate_count = sum(1 for err in bwe.details.get('writeErrors', []) if err['code'] == 11000)
-
-            log.warning(
-                f"Imported {inserted_count} txns, but skipped {duplicate_count} duplicates for session {session_id}.")
+    batch = []
+    for txn in pending_imports.iter_rows(db, session_data):
+        if txn.get(DUPLICATE_FIELD):
+            duplicate_count += txn.get('bank_reference_id') in approved_ids
+            continue
+        if txn.get('bank_reference_id') in approved_ids:
+            batch.append(txn)
+            if len(batch) >= CONFIRM_BATCH_SIZE:
+                inserted, duplicates = _insert_batch(db, batch)
+                inserted_count, duplicate_count = inserted_count + inserted, duplicate_count + duplicates
+                batch = []
+    if batch:
+        inserted, duplicates = _insert_batch(db, batch)
+        inserted_count, duplicate_count = inserted_count + inserted, duplicate_count + duplicates
+
+    if duplicate_count:
+        log.warning(
+            f"Imported {inserted_count} txns, but skipped {duplicate_count} duplicates for session {session_id}.")
 
     # Clean up the temporary session
-    db.pending_imports.delete_one({"session_id": session_id})
+    pending_imports.discard(db, session_id)
 
     return jsonify({
         "message": "Import completed.",
         "inserted_count": inserted_count,
         "duplicate_skipped_count": duplicate_count
-    }), 200
\ No newline at end of file
+    }), 200
+
+
+def _insert_batch(db, transactions_to_insert):
+    """Enriches and inserts one batch of approved rows. Returns (inserted, duplicates)."""
+    for txn in transactions_to_insert:
+        # Ensure standard transaction fields are populated.
+        # account_id must be an ObjectId to match every other transaction query.
+        txn['account_id'] = ObjectId(g.account_id)
+        txn['status'] = 'completed'
+        txn['timestamp'] = txn.pop('date')  # Use the parsed date as the timestamp
+        txn['created_at'] = datetime.now(timezone.utc)
+
+    # Statement rows are usually backdated: convert each at the rate of its own day.
+    rates = get_user_khr_rates_on(ObjectId(g.account_id), [to_local_date(t['timestamp']) for t in transactions_to_insert])
+    for txn, rate in zip(transactions_to_insert, rates):
+        if txn.get('currency') == 'KHR' and not txn.get('exchangeRateAtTime'):
+            txn['exchangeRateAtTime'] = rate
+        enrich(txn, rate)
+
+    try:
+        # ordered=False allows Mongo to continue inserting the rest of the batch
+        # even if it hits a DuplicateKeyError on a specific document.
+        result = db.transactions.insert_many(transactions_to_insert, ordered=False)
+        ledger.record_inserted(db, transactions_to_insert)
+        return len(result.inserted_ids), 0
+    except BulkWriteError as bwe:
+        # bwe.details contains information about which inserts succeeded and which failed
+        inserted_count = bwe.details.get('nInserted', 0)
+        # Count how many failed specifically due to duplicate key (code 11000)
+        duplicate_count = sum(1 for err in bwe.details.get('writeErrors', []) if err['code'] == 11000)
+
+        failed = {err['index'] for err in bwe.details.get('writeErrors', [])}
+        ledger.record_inserted(db, [t for i, t in enumerate(transactions_to_insert) if i not in failed])
+        return inserted_count, duplicate_count
@@ -1,12 +1,11 @@
 import io
 import logging
-import requests
 import matplotlib.pyplot as plt
 from datetime import datetime, time, timedelta
 from zoneinfo import ZoneInfo
-from pymongo import MongoClient
-import certifi
 from app.config import Config
+from app.utils import http_client
+from app.utils.db import get_database
 from app.utils.currency import get_live_usd_to_khr_rate
 
 log = logging.getLogger(__name__)
@@ -19,7 +18,7 @@ def send_telegram_message(chat_id, text, token, parse_mode='HTML'):
     url = f"https://api.telegram.org/bot{token}/sendMessage"
     payload = {'chat_id': chat_id, 'text': text, 'parse_mode': parse_mode}
     try:
-        response = requests.post(url, json=payload, timeout=20)
+        response = http_client.post(http_client.TELEGRAM, url, json=payload, endpoint='sendMessage', timeout=20)
         response.raise_for_status()
     except Exception as e:
         log.warning(f"Failed to send message to {chat_id}: {e}")
@@ -31,7 +30,7 @@ def send_telegram_photo(chat_id, photo_bytes, token, caption=""):
     files = {'photo': ('report_chart.png', photo_bytes, 'image/png')}
     data = {'chat_id': chat_id, 'caption': caption}
     try:
-        response = requests.post(url, data=data, files=files, timeout=30)
+        response = http_client.post(http_client.TELEGRAM, url, data=data, files=files, endpoint='sendPhoto', timeout=30)
         response.raise_for_status()
     except Exception as e:
         log.warning(f"Failed to send photo to {chat_id}: {e}")
@@ -39,7 +38,8 @@ def send_telegram_photo(chat_id, photo_bytes, token, caption=""):
 
 def _get_user_specific_report_data(start_date_local, end_date_local, db, user_settings_doc):
     """Generates report data for a specific user context using shared pipelines."""
-    from app.analytics.pipelines import build_start_balance_pipeline, build_faceted_report_pipeline
+    from app.analytics.pipelines import build_faceted_report_pipeline
+    from app.services.checkpoints import opening_balance_usd
     account_id = user_settings_doc['account_id']
     settings = user_settings_doc.get('settings', {})
 
@@ -61,10 +61,7 @@ def _get_user_specific_report_data(start_date_local, end_date_local, db, user_se
     user_match = {'account_id': account_id}
 
     # Balance Calculation
-    start_bal_data = list(db.transactions.aggregate(build_start_balance_pipeline(start_utc, user_match, user_rate)))
-    start_inc = next((i['totalUSD'] for i in start_bal_data if i['_id'] == 'income'), 0)
-    start_exp = next((i['totalUSD'] for i in start_bal_data if i['_id'] == 'expense'), 0)
-    balance_start = initial_usd + start_inc - start_exp
+    balance_start = initial_usd + opening_balance_usd(db, account_id, start_utc, user_rate)
 
     # Operational Data
     date_match = {'timestamp': {'$gte': start_utc, '$lte': end_utc}}
@@ -141,12 +138,7 @@ def _create_chart(data, start_date, end_date):
 
 
 def run_scheduled_report(period):
-    try:
-        client = MongoClient(Config.MONGODB_URI, tls=True, tlsCAFile=certifi.where())
-        db = client[Config.DB_NAME]
-    except Exception as e:
-        log.error(f"Scheduled job DB connection failed: {e}")
-        return
+    db = get_database()
 
     try:
         users = list(db.settings.find({"settings.notification_chat_ids.report": {"$ne": None}}))
@@ -173,14 +165,11 @@ def run_scheduled_report(period):
                     log.error(f"Report failed for user {user.get('account_id')}: {e}")
     except Exception as e:
         log.error(f"Report generation failed: {e}")
-    finally:
-        client.close()
 
 
 def send_daily_reminder_job():
     try:
-        client = MongoClient(Config.MONGODB_URI, tls=True, tlsCAFile=certifi.where())
-        db = client[Config.DB_NAME]
+        db = get_database()
 
         now = datetime.now(PHNOM_PENH_TZ)
         today_utc = datetime.combine(now.date(), time.min, tzinfo=PHNOM_PENH_TZ).astimezone(UTC_TZ)
@@ -203,6 +192,4 @@ def send_daily_reminder_job():
                 log.error(f"Reminder failed for user {user.get('account_id')}: {e}")
 
     except Exception as e:
-        log.error(f"Daily reminder job failed: {e}")
-    finally:
-        client.close()
\ No newline at end of file
+        log.error(f"Daily reminder job failed: {e}")
\ No newline at end of file
@@ -0,0 +1,56 @@
+from flask import Blueprint, jsonify
+
+from app.utils import http_client, indexes, shared_cache
+from app.utils.auth import auth_required, get_token_cache_stats
+from app.utils.cache import get_cache_stats
+from app.utils.db_metrics import COMMANDS, POOL
+from app.utils.profile import get_profile_stats
+from app.services import fx
+
+metrics_bp = Blueprint('metrics', __name__, url_prefix='/internal/metrics')
+
+
+@metrics_bp.route('/cache', methods=['GET'])
+@auth_required(min_role="admin")
+def get_response_cache_metrics():
+    """Hit/miss counters for the per-account response cache of this worker."""
+    return jsonify(get_cache_stats())
+
+
+@metrics_bp.route('/fx', methods=['GET'])
+@auth_required(min_role="admin")
+def get_fx_metrics():
+    """Age of this worker's live exchange rate and whether a refresh is in flight."""
+    return jsonify(fx.get_status())
+
+
+@metrics_bp.route('/profile', methods=['GET'])
+@auth_required(min_role="admin")
+def get_profile_metrics():
+    """Per-endpoint settings lookups served by the request profile vs. sent to Mongo."""
+    return jsonify(get_profile_stats())
+
+
+@metrics_bp.route('/auth', methods=['GET'])
+@auth_required(min_role="admin")
+def get_auth_metrics():
+    """Hit/miss/eviction counters for this worker's validated-token cache and the shared layer under it."""
+    return jsonify({**get_token_cache_stats(), 'shared': shared_cache.get_stats()})
+
+
+@metrics_bp.route('/http', methods=['GET'])
+@auth_required(min_role="admin")
+def get_http_metrics():
+    """Per-endpoint latency histograms and circuit breaker state for this worker's outbound calls."""
+    return jsonify(http_client.get_http_stats())
+
+
+@metrics_bp.route('/db', methods=['GET'])
+@auth_required(min_role="admin")
+def get_db_metrics():
+    """
+    Connection pool usage plus per (endpoint, command, collection) latency
+    percentiles and the slow-command log with query plans, for this worker,
+    and the outcome of its last index sync.
+    """
+    return jsonify({'pool': POOL.stats(), **COMMANDS.stats(), 'indexes': indexes.status()})
@@ -0,0 +1,49 @@
+# web_service/app/parsers/banks.py
+# Built-in bank statement formats. A new bank is one more spec here:
+#   signatures       lists of phrases; any list fully present in the leading rows identifies the bank
+#   header           {column index: label} identifying the column header row (case-insensitive substring)
+#   columns          field -> column index: date, description, money_in, money_out, currency_in, currency_out
+#   min_columns      shorter rows are skipped (defaults to the widest mapped column)
+#   date_formats     strptime formats tried in order
+#   reference        regex whose first group is the bank's reference ID
+#   reference_prefix prefix of the stored bank_reference_id ("ABA-<ref>")
+#   default_currency used when the row has no currency column or it is empty
+#   amount_override  regex with (currency, amount) groups taking precedence over the columns
+#   transfer_markers description phrases that, with the user's own name, mark a self-transfer
+# Registration order is detection priority, so specific signatures go before generic ones.
+
+from app.parsers.registry import register
+
+ACLEDA = {
+    'key': 'acleda',
+    'name': 'ACLEDA',
+    'signatures': [['ACLBKHPP'], ['ACLEDA', 'ACCOUNT STATEMENT']],
+    'header': {0: 'DATE', 1: 'DESCRIPTIONS'},
+    'columns': {'date': 0, 'description': 1, 'money_out': 2, 'money_in': 3},
+    'min_columns': 5,
+    'date_formats': ['%b %d, %Y'],
+    'reference': r'(?:Ref\.|Order ID\s*)([0-9]+)',
+    'reference_prefix': 'ACL',
+    # Column amounts are in the account's base currency; the description often
+    # holds the exact transaction currency (e.g., |USD 4.98|).
+    'default_currency': 'KHR',
+    'amount_override': r'\|(USD|KHR)\s+([0-9.]+)\|',
+    'transfer_markers': ['TRANSFERRED TO', 'PAYMENT FROM', 'PAID TO'],
+}
+
+ABA = {
+    'key': 'aba',
+    'name': 'ABA',
+    'signatures': [['ACCOUNT ACTIVITY'], ['MONEY IN']],
+    'header': {0: 'DATE', 1: 'TRANSACTION DETAILS'},
+    'columns': {'date': 0, 'description': 1, 'money_in': 2, 'currency_in': 3, 'money_out': 4, 'currency_out': 5},
+    'min_columns': 8,
+    'date_formats': ['%b %d, %Y'],
+    'reference': r'(?:REF#|HASH#)\s*([A-Z0-9]+)',
+    'reference_prefix': 'ABA',
+    'default_currency': 'USD',
+    'transfer_markers': ['TRANSFERRED TO', 'PAYMENT FROM'],
+}
+
+for spec in (ACLEDA, ABA):
+    register(spec)
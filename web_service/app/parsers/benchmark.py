@@ -0,0 +1,143 @@
+# web_service/app/parsers/benchmark.py
+# Throughput and memory benchmark for the bank statement parsers, run with
+# `flask bench-parsers`. Statements are generated deterministically (seeded),
+# written to a temporary directory once, and each (bank, format, size) case
+# is parsed in a fresh spawned process so its peak RSS is not polluted by
+# earlier cases or by generating the files.
+
+import csv
+import io
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import time
+from datetime import date, timedelta
+
+import openpyxl
+
+from app.parsers.bank_statements import iter_statement
+
+BANKS = ('aba', 'acleda')
+FORMATS = ('csv', 'xlsx')
+SIZES = (1_000, 10_000, 100_000)
+SEED = 42
+
+MERCHANTS = ['CAFE AMAZON', 'LUCKY SUPERMARKET', 'BROWN COFFEE', 'AEON MALL', 'GRAB TAXI',
+             'TOTAL ENERGIES', 'CHIP MONG', 'KFC', 'PIZZA COMPANY', 'SMART AXIATA']
+PEOPLE = ['SOK DARA', 'CHAN SOPHEAP', 'KEO VISAL', 'LIM SREYNICH', 'HENG BORA']
+
+
+def _dates(rng, rows):
+    """Oldest-first statement dates spread over roughly rows/20 days."""
+    day = date(2022, 1, 1)
+    for _ in range(rows):
+        if rng.random() < 0.05:
+            day += timedelta(days=1)
+        yield day.strftime('%b %d, %Y')
+
+
+def aba_rows(rows, seed=SEED):
+    """ABA 'Account Activity' export: title block, 8-column header, then one row per transaction."""
+    rng = random.Random(seed)
+    yield ['ABA Bank', '', '', '', '', '', '', '']
+    yield ['Account Activity', '', '', '', '', '', '', '']
+    yield ['Account Name: BENCH USER', '', '', '', '', '', '', '']
+    yield ['Date', 'Transaction Details', 'Money In', 'Ccy', 'Money Out', 'Ccy', 'Balance', 'Ccy']
+    balance = 5000.0
+    for day in _dates(rng, rows):
+        ccy = 'USD' if rng.random() < 0.8 else 'KHR'
+        amount = round(rng.uniform(0.5, 80) * (4100 if ccy == 'KHR' else 1), 2)
+        ref = f"{rng.getrandbits(40):010X}"
+        if rng.random() < 0.25:
+            desc = f"PAYMENT FROM {rng.choice(PEOPLE)} REF# {ref}"
+            money_in, money_out = f"{amount:,.2f}", ''
+            balance += amount
+        else:
+            if rng.random() < 0.3:
+                desc = f"TRANSFERRED TO {rng.choice(PEOPLE)} REF# {ref}"
+            else:
+                desc = f"PURCHASE AT {rng.choice(MERCHANTS)} PHNOM PENH KH HASH# {ref}"
+            money_in, money_out = '', f"{amount:,.2f}"
+            balance -= amount
+        yield [day, desc, money_in, ccy if money_in else '', money_out, ccy if money_out else '',
+               f"{balance:,.2f}", 'USD']
+
+
+def acleda_rows(rows, seed=SEED):
+    """ACLEDA statement: bank/SWIFT block, 5-column header, KHR amounts with |CCY amount| in descriptions."""
+    rng = random.Random(seed)
+    yield ['ACLEDA BANK PLC.', '', '', '', '']
+    yield ['SWIFT: ACLBKHPP', '', '', '', '']
+    yield ['ACCOUNT STATEMENT', '', '', '', '']
+    yield ['DATE', 'DESCRIPTIONS', 'CASH OUT', 'CASH IN', 'BALANCE']
+    balance = 20_000_000.0
+    for day in _dates(rng, rows):
+        usd = round(rng.uniform(0.5, 80), 2)
+        khr = round(usd * 4100)
+        ref = rng.randrange(10**9, 10**10)
+        if rng.random() < 0.25:
+            desc = f"PAYMENT FROM {rng.choice(PEOPLE)} Ref.{ref} |USD {usd}|"
+            cash_out, cash_in = '', f"{khr:,}"
+            balance += khr
+        else:
+            target = rng.choice(PEOPLE) if rng.random() < 0.3 else rng.choice(MERCHANTS)
+            desc = f"PAID TO {target} Order ID {ref} |USD {usd}|"
+            cash_out, cash_in = f"{khr:,}", ''
+            balance -= khr
+        yield [day, desc, cash_out, cash_in, f"{balance:,.0f}"]
+
+
+GENERATORS = {'aba': aba_rows, 'acleda': acleda_rows}
+
+
+def write_statement(path, bank, fmt, rows):
+    if fmt == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows(GENERATORS[bank](rows))
+        return
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet()
+    for row in GENERATORS[bank](rows):
+        sheet.append(row)
+    wb.save(path)
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_case(path, runs):
+    """Child-process body: (median rows/sec, rows parsed, peak RSS growth in MB while parsing)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    filename = os.path.basename(path)
+    baseline = _peak_rss_mb()
+    rates, parsed = [], 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        parsed = sum(1 for _ in iter_statement(io.BytesIO(data), filename))
+        rates.append(parsed / (time.perf_counter() - start))
+    return statistics.median(rates), parsed, _peak_rss_mb() - baseline
+
+
+def run(workdir, banks=BANKS, formats=FORMATS, sizes=SIZES, runs=3, report=print):
+    """Generates every statement into `workdir`, then benchmarks each case in its own process."""
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for bank in banks:
+        for fmt in formats:
+            for rows in sizes:
+                path = os.path.join(workdir, f"{bank}_{rows}.{fmt}")
+                if not os.path.exists(path):
+                    write_statement(path, bank, fmt, rows)
+                with ctx.Pool(1) as pool:
+                    rate, parsed, peak_mb = pool.apply(_run_case, (path, runs))
+                result = {'bank': bank, 'format': fmt, 'rows': rows, 'parsed': parsed,
+                          'rows_per_sec': rate, 'peak_rss_mb': peak_mb,
+                          'file_mb': os.path.getsize(path) / 2**20}
+                report(result)
+                results.append(result)
+    return results
@@ -0,0 +1,159 @@
+# web_service/app/parsers/registry.py
+# Registry of bank statement formats. Each bank is a plain spec dict (see
+# banks.py) declaring how to recognize its file, where its column header row
+# is, which column holds which field and how to pull a reference ID out of
+# the description. Detection compiles every registered signature phrase into
+# one lookahead regex, scans each leading row once, and picks the first format
+# (in registration order) whose signature is fully present.
+
+import re
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+REQUIRED_KEYS = ('key', 'name', 'signatures', 'header', 'columns', 'date_formats')
+REQUIRED_COLUMNS = ('date', 'description')
+
+
+class BankFormat:
+    """A compiled bank spec. Built by register(); parse() turns rows into normalized transactions."""
+
+    def __init__(self, spec):
+        missing = [k for k in REQUIRED_KEYS if k not in spec]
+        missing += [f"columns.{c}" for c in REQUIRED_COLUMNS if c not in spec.get('columns', {})]
+        if missing:
+            raise ValueError(f"Bank format {spec.get('key')!r} is missing {', '.join(missing)}")
+
+        self.key = spec['key']
+        self.name = spec['name']
+        # Alternatives of phrases; the format matches when every phrase of any one alternative is present.
+        self.signatures = [frozenset(p.upper() for p in alt) for alt in spec['signatures']]
+        self.header = {i: label.upper() for i, label in spec['header'].items()}
+        self.columns = dict(spec['columns'])
+        self.min_columns = spec.get('min_columns', max(self.columns.values()) + 1)
+        self.date_formats = tuple(spec['date_formats'])
+        self.reference = re.compile(spec['reference']) if spec.get('reference') else None
+        self.reference_prefix = spec.get('reference_prefix', self.name)
+        self.default_currency = spec.get('default_currency', 'USD')
+        # Optional pattern with (currency, amount) groups that overrides the column amount.
+        self.amount_override = re.compile(spec['amount_override']) if spec.get('amount_override') else None
+        self.transfer_markers = tuple(m.upper() for m in spec.get('transfer_markers', ()))
+
+    def phrases(self):
+        return set().union(*self.signatures)
+
+    def matches(self, found):
+        return any(alt <= found for alt in self.signatures)
+
+    def is_header(self, row):
+        return all(label in row[i].upper() for i, label in self.header.items())
+
+    def parse(self, rows, user_name=''):
+        """Yields one normalized transaction per data row after the header row."""
+        cols = self.columns
+        in_col, out_col = cols.get('money_in'), cols.get('money_out')
+        user_name = user_name.upper()
+        header_found = False
+
+        for row in rows:
+            if len(row) < self.min_columns:
+                continue
+
+            if not header_found:
+                header_found = self.is_header(row)
+                continue
+
+            date_str = row[cols['date']]
+            desc = row[cols['description']]
+            money_in = row[in_col].replace(',', '') if in_col is not None and row[in_col] else ""
+            money_out = row[out_col].replace(',', '') if out_col is not None and row[out_col] else ""
+
+            if not date_str or (not money_in and not money_out):
+                continue
+
+            dt = parse_date(date_str, self.date_formats)
+            if dt is None:
+                continue
+
+            ref_match = self.reference.search(desc) if self.reference else None
+            bank_ref = ref_match.group(1) if ref_match else None
+
+            if money_in:
+                amount, txn_type = float(money_in), "income"
+                currency = row[cols['currency_in']] if 'currency_in' in cols else ""
+            else:
+                amount, txn_type = float(money_out), "expense"
+                currency = row[cols['currency_out']] if 'currency_out' in cols else ""
+            currency = currency.upper() if currency else self.default_currency
+
+            if self.amount_override:
+                override = self.amount_override.search(desc)
+                if override:
+                    currency, amount = override.group(1), float(override.group(2))
+
+            # Self-Transfer Detection
+            if user_name:
+                desc_upper = desc.upper()
+                if user_name in desc_upper and any(m in desc_upper for m in self.transfer_markers):
+                    txn_type = "transfer"
+
+            yield {
+                "date": dt,
+                "amount": amount,
+                "currency": currency,
+                "type": txn_type,
+                "description": desc,
+                "bank_reference_id": f"{self.reference_prefix}-{bank_ref}" if bank_ref else None,
+                "source_bank": self.name
+            }
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value, formats):
+    """First format in `formats` that parses `value`, else None. Statements repeat dates, so results are cached."""
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+_FORMATS = []
+_MATCHER = None
+# Matched phrase -> every registered phrase it contains, since the regex reports only the longest.
+_IMPLIES = {}
+_LOCK = threading.Lock()
+
+
+def register(spec):
+    """Adds a bank format. Earlier registrations win when several signatures match."""
+    global _MATCHER, _IMPLIES
+    fmt = BankFormat(spec)
+    with _LOCK:
+        if any(f.key == fmt.key for f in _FORMATS):
+            raise ValueError(f"Bank format {fmt.key!r} is already registered")
+        _FORMATS.append(fmt)
+        # A zero-width lookahead tries every position, so partially overlapping phrases
+        # ("ACCOUNT STATEMENT", "STATEMENT DATE") are both found. At one position only the
+        # first alternative matches, so longest go first and _IMPLIES adds their prefixes.
+        phrases = sorted(set().union(*(f.phrases() for f in _FORMATS)), key=len, reverse=True)
+        _MATCHER = re.compile('(?=(' + '|'.join(re.escape(p) for p in phrases) + '))')
+        _IMPLIES = {p: {q for q in phrases if q in p} for p in phrases}
+    return fmt
+
+
+def formats():
+    return list(_FORMATS)
+
+
+def detect(rows):
+    """The registered format whose signature appears in `rows` (the leading rows of a file), or None."""
+    matcher, implies = _MATCHER, _IMPLIES
+    if matcher is None:
+        return None
+    found = set()
+    for row in rows:
+        for phrase in matcher.findall(" ".join(str(cell) for cell in row if cell).upper()):
+            found |= implies[phrase]
+    return next((f for f in _FORMATS if f.matches(found)), None)
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify, g, current_app
-import requests
 from requests.auth import HTTPBasicAuth
+from app.utils import http_client
 from app.utils.auth import auth_required
 
 payments_bp = Blueprint('payments', __name__, url_prefix='/payments')
@@ -49,7 +49,8 @@ def create_checkout_session():
 
     try:
         auth = HTTPBasicAuth(config["BIFROST_CLIENT_ID"], config["BIFROST_CLIENT_SECRET"])
-        response = requests.post(target_url, json=bifrost_payload, auth=auth, timeout=BIFROST_TIMEOUT)
+        response = http_client.post(http_client.BIFROST, target_url, json=bifrost_payload, auth=auth,
+                                    endpoint='create-intent', timeout=BIFROST_TIMEOUT)
 
         if response.status_code != 200:
             current_app.logger.error(f"Bifrost Payment Error: {response.text}")
@@ -83,7 +84,9 @@ def proxy_upload_proof():
         # Service Auth (Client Credentials)
         auth = HTTPBasicAuth(config["BIFROST_CLIENT_ID"], config["BIFROST_CLIENT_SECRET"])
 
-        response = requests.post(target_url, files=files, data=data, auth=auth, timeout=60)
+        # The uploaded file stream can only be read once, so this is never retried.
+        response = http_client.post(http_client.BIFROST, target_url, files=files, data=data, auth=auth,
+                                    endpoint='upload-proof', timeout=BIFROST_TIMEOUT, retries=0)
         return jsonify(response.json()), response.status_code
 
     except Exception as e:
@@ -0,0 +1,205 @@
+# web_service/app/services/checkpoints.py
+
+import copy
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from pymongo.errors import BulkWriteError
+
+from app.analytics import pipelines
+from app.services.enrichment import to_local_date
+
+log = logging.getLogger(__name__)
+PHNOM_PENH_TZ = ZoneInfo("Asia/Phnom_Penh")
+UTC_TZ = ZoneInfo("UTC")
+
+BALANCE_TYPES = ('income', 'expense')
+# Per-account counter bumped by every invalidate(); a checkpoint build that
+# sees it move discards what it wrote, since its aggregate may predate the write.
+EPOCHS = 'checkpoint_epochs'
+
+
+def _month_key(d):
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def _month_start_utc(year, month):
+    """UTC instant of local midnight on the first day of a month."""
+    return datetime(year, month, 1, tzinfo=PHNOM_PENH_TZ).astimezone(UTC_TZ)
+
+
+def _next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _as_utc(ts):
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+
+def _empty_totals():
+    return {
+        'native': {},
+        'usd': {t: 0.0 for t in BALANCE_TYPES},
+        'unrated': {t: 0.0 for t in BALANCE_TYPES}
+    }
+
+
+def _merge(into, other):
+    for cur, types in other['native'].items():
+        slot = into['native'].setdefault(cur, {})
+        for t_type, value in types.items():
+            slot[t_type] = slot.get(t_type, 0.0) + value
+    for part in ('usd', 'unrated'):
+        for t_type, value in other[part].items():
+            into[part][t_type] = into[part].get(t_type, 0.0) + value
+    return into
+
+
+def _aggregate_by_month(db, account_id, since_utc, until_utc):
+    """
+    Income/expense totals per local month for [since_utc, until_utc).
+    USD amounts are split into rated (stored amount_usd, USD or exchangeRateAtTime)
+    and unrated legacy native sums so the caller can apply the user's rate.
+    """
+    ts_match = {'$lt': until_utc}
+    if since_utc is not None:
+        ts_match['$gte'] = since_utc
+
+    months = defaultdict(_empty_totals)
+    for row in db.transactions.aggregate([
+        {'$match': {'account_id': account_id, 'type': {'$in': list(BALANCE_TYPES)}, 'timestamp': ts_match}},
+        {'$group': {
+            '_id': {
+                'month': pipelines.local_month_expr(),
+                'type': '$type',
+                'currency': '$currency'
+            },
+            'native': {'$sum': '$amount'},
+            'usd': {'$sum': pipelines.rated_usd_expr()},
+            'unrated': {'$sum': pipelines.unrated_amount_expr()}
+        }}
+    ]):
+        key = row['_id']
+        totals = months[key['month']]
+        if isinstance(key.get('currency'), str) and key['currency'].isalnum():
+            totals['native'].setdefault(key['currency'], {})[key['type']] = row['native']
+        totals['usd'][key['type']] += row['usd']
+        totals['unrated'][key['type']] += row['unrated']
+    return months
+
+
+def ensure_checkpoints(db, account_id, through_utc):
+    """
+    Makes sure a cumulative month-end checkpoint exists for every month that
+    ends on or before `through_utc` (a local month boundary) and returns the
+    running totals at that boundary.
+    """
+    epoch = _epoch(db, account_id)
+    latest = db.balance_checkpoints.find_one(
+        {'account_id': account_id, 'end_utc': {'$lte': through_utc}},
+        sort=[('end_utc', -1)]
+    )
+    if latest and _as_utc(latest['end_utc']) == through_utc:
+        return latest['totals']
+
+    since_utc = _as_utc(latest['end_utc']) if latest else None
+    by_month = _aggregate_by_month(db, account_id, since_utc, through_utc)
+    running = latest['totals'] if latest else _empty_totals()
+
+    if latest:
+        first = to_local_date(since_utc)
+    elif by_month:
+        first = datetime.strptime(min(by_month), '%Y-%m').date()
+    else:
+        return running  # No history before this boundary; nothing to persist
+
+    now = datetime.now(UTC_TZ)
+    docs = []
+    year, month = first.year, first.month
+    while _month_start_utc(year, month) < through_utc:
+        key = f"{year:04d}-{month:02d}"
+        if key in by_month:
+            running = _merge(running, by_month[key])
+        year, month = _next_month(year, month)
+        docs.append({
+            'account_id': account_id,
+            'month': key,
+            'end_utc': _month_start_utc(year, month),
+            'totals': copy.deepcopy(running),
+            'created_at': now
+        })
+
+    if docs:
+        try:
+            db.balance_checkpoints.insert_many(docs, ordered=False)
+        except BulkWriteError:
+            pass  # A concurrent report already wrote some of these months
+        if _epoch(db, account_id) != epoch:
+            # A backdated write was invalidated while this build was running; its
+            # checkpoints may miss it and nothing would ever correct them.
+            written = [d['_id'] for d in docs if '_id' in d]
+            db.balance_checkpoints.delete_many({'_id': {'$in': written}})
+    return running
+
+
+def _epoch(db, account_id):
+    doc = db[EPOCHS].find_one({'account_id': account_id}, {'epoch': 1})
+    return doc['epoch'] if doc else 0
+
+
+def opening_balance_usd(db, account_id, start_utc, user_rate):
+    """
+    Net income minus expense (USD) of everything before `start_utc`: the
+    nearest month-end checkpoint plus a delta scan of at most one month.
+    """
+    start_utc = _as_utc(start_utc)
+    now_local = datetime.now(PHNOM_PENH_TZ)
+    start_local = start_utc.astimezone(PHNOM_PENH_TZ)
+
+    # Never checkpoint the month in progress
+    boundary = min((start_local.year, start_local.month), (now_local.year, now_local.month))
+    through_utc = _month_start_utc(*boundary)
+
+    totals = _merge(_empty_totals(), ensure_checkpoints(db, account_id, through_utc))
+    if start_utc > through_utc:
+        for delta in _aggregate_by_month(db, account_id, through_utc, start_utc).values():
+            _merge(totals, delta)
+
+    usd = {t: totals['usd'].get(t, 0) + totals['unrated'].get(t, 0) / user_rate for t in BALANCE_TYPES}
+    return usd['income'] - usd['expense']
+
+
+def invalidate(db, txs):
+    """
+    Drops checkpoints from the month of the earliest written transaction
+    forward. Writes in the month in progress, which is never checkpointed,
+    cost nothing.
+    """
+    current = _month_key(datetime.now(PHNOM_PENH_TZ))
+    earliest = {}
+    for tx in txs:
+        if not tx or not tx.get('timestamp'):
+            continue
+        month = _month_key(to_local_date(tx['timestamp']))
+        if month >= current:
+            continue
+        account_id = tx['account_id']
+        if account_id not in earliest or month < earliest[account_id]:
+            earliest[account_id] = month
+
+    for account_id, month in earliest.items():
+        try:
+            # Bump before deleting: a build that read the old epoch either sees the
+            # bump and discards its checkpoints, or inserted them before this delete.
+            db[EPOCHS].update_one({'account_id': account_id}, {'$inc': {'epoch': 1}}, upsert=True)
+            db.balance_checkpoints.delete_many({'account_id': account_id, 'month': {'$gte': month}})
+        except Exception as e:
+            log.error(f"Checkpoint invalidation failed for {account_id}: {e}")
+
+
+def drop_all(db, account_ids):
+    """Drops every checkpoint of these accounts (e.g. after a backfill changed stored amounts)."""
+    for account_id in account_ids:
+        db[EPOCHS].update_one({'account_id': account_id}, {'$inc': {'epoch': 1}}, upsert=True)
+    db.balance_checkpoints.delete_many({'account_id': {'$in': list(account_ids)}})
@@ -0,0 +1,84 @@
+# web_service/app/services/enrichment.py
+
+import re
+import unicodedata
+from datetime import timezone
+from zoneinfo import ZoneInfo
+
+PHNOM_PENH_TZ = ZoneInfo("Asia/Phnom_Penh")
+
+DERIVED_FIELDS = ('amount_usd', 'local_date', 'local_week', 'local_month', 'tokens', 'category_key')
+
+# Khmer is written without spaces, so besides whitespace we split on Khmer
+# punctuation (khan, bariyoosan, camnuc pii kuuh, ...), the zero-width space
+# Khmer text uses as a word separator, and on every Khmer/non-Khmer boundary.
+_KHMER_RUN = r'[\u1780-\u17D3\u17DC-\u17DD\u19E0-\u19FF]+'
+_TOKEN_RE = re.compile(rf'{_KHMER_RUN}|[^\W_\u1780-\u17FF\u19E0-\u19FF]+')
+
+
+def to_local_date(ts):
+    """Phnom Penh calendar date of a stored timestamp (naive values are UTC)."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(PHNOM_PENH_TZ).date()
+
+
+def tokenize(text):
+    """
+    Normalized search tokens of a description: NFC, lowercased, punctuation
+    stripped, de-duplicated in order of first appearance.
+    """
+    if not isinstance(text, str):
+        return []
+    text = unicodedata.normalize('NFC', text).lower().replace('\u200b', ' ')
+    return list(dict.fromkeys(_TOKEN_RE.findall(text)))
+
+
+def category_key(category):
+    """Case-folded category name, so category filters can be exact index matches."""
+    if not isinstance(category, str):
+        return None
+    return unicodedata.normalize('NFC', category).strip().lower()
+
+
+def usd_amount(tx, fallback_rate):
+    """USD value of a transaction using its own rate, else the user's rate at write time."""
+    amount = float(tx.get('amount', 0))
+    if tx.get('currency') == 'USD':
+        return amount
+    rate = tx.get('exchangeRateAtTime')
+    if not rate or rate <= 0:
+        rate = fallback_rate
+    return amount / rate
+
+
+def write_time_rate(tx):
+    """The KHR rate a stored transaction was converted at, if it can be recovered."""
+    if tx.get('exchangeRateAtTime'):
+        return tx['exchangeRateAtTime']
+    if tx.get('amount_usd') and tx.get('amount'):
+        return tx['amount'] / tx['amount_usd']
+    return None
+
+
+def derived_fields(tx, fallback_rate):
+    """
+    Fields precomputed at write time so aggregations can $group on them
+    directly instead of converting currency and timezones per document.
+    """
+    local = to_local_date(tx['timestamp'])
+    iso_year, iso_week, _ = local.isocalendar()
+    return {
+        'amount_usd': usd_amount(tx, fallback_rate),
+        'local_date': local.isoformat(),
+        'local_week': f"{iso_year:04d}-W{iso_week:02d}",
+        'local_month': f"{local.year:04d}-{local.month:02d}",
+        'tokens': tokenize(tx.get('description')),
+        'category_key': category_key(tx.get('categoryId'))
+    }
+
+
+def enrich(tx, fallback_rate):
+    """Adds the derived fields to a transaction document in place."""
+    tx.update(derived_fields(tx, fallback_rate))
+    return tx
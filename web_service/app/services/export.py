@@ -0,0 +1,75 @@
+# web_service/app/services/export.py
+# Streams transactions out of a Mongo cursor as CSV or NDJSON chunks, so an
+# export's memory use does not grow with the account's history.
+
+import csv
+import io
+import json
+from datetime import timezone
+from zoneinfo import ZoneInfo
+
+PHNOM_PENH_TZ = ZoneInfo("Asia/Phnom_Penh")
+
+EXPORT_FIELDS = {'_id': 1, 'timestamp': 1, 'type': 1, 'amount': 1, 'currency': 1, 'categoryId': 1, 'description': 1}
+CSV_HEADER = ["Date", "Type", "Amount", "Currency", "Category", "Description", "ID"]
+CURSOR_BATCH_SIZE = 1000
+# Rows buffered per yielded chunk; keeps chunks a few KB instead of one per row.
+ROWS_PER_CHUNK = 500
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+
+def _local_time(ts):
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(PHNOM_PENH_TZ)
+
+
+def _csv_chunks(docs):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_HEADER)
+    for i, tx in enumerate(docs, 1):
+        writer.writerow([
+            _local_time(tx['timestamp']).strftime('%Y-%m-%d %H:%M:%S'),
+            tx.get('type'), tx.get('amount'), tx.get('currency'),
+            tx.get('categoryId'), tx.get('description', ''), str(tx['_id'])
+        ])
+        if i % ROWS_PER_CHUNK == 0:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def _ndjson_chunks(docs):
+    lines = []
+    for tx in docs:
+        lines.append(json.dumps({
+            **tx,
+            '_id': str(tx['_id']),
+            'timestamp': _local_time(tx['timestamp']).isoformat()
+        }, ensure_ascii=False))
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def open_cursor(collection, query):
+    """Newest-first cursor over only the exported fields, fetched in fixed-size batches."""
+    return (
+        collection.find(query, EXPORT_FIELDS)
+        .sort([('timestamp', -1), ('_id', -1)])
+        .batch_size(CURSOR_BATCH_SIZE)
+    )
+
+
+def stream(docs, fmt):
+    """Yields encoded chunks of `docs` (any iterable of transaction documents) in `fmt`."""
+    return _csv_chunks(docs) if fmt == 'csv' else _ndjson_chunks(docs)
@@ -0,0 +1,260 @@
+# web_service/app/services/fx.py
+# Live USD->KHR rate provider. Requests always get the last known good rate
+# from memory; refreshing happens off the request path (a scheduler job plus
+# a stale-while-revalidate thread), one refresh at a time. The last good rate
+# is persisted in Mongo so a cold worker can serve it without a network call.
+#
+# Every successful refresh is also recorded as that local day's rate in
+# fx_rates. Historical conversions look rates up by date with bisect over an
+# in-memory sorted copy of that collection.
+
+import csv
+import io
+import logging
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+import requests
+from pymongo import UpdateOne
+
+from app.config import Config
+from app.utils import http_client
+
+log = logging.getLogger(__name__)
+
+PHNOM_PENH_TZ = ZoneInfo("Asia/Phnom_Penh")
+
+DEFAULT_RATE = 4100.0
+RATE_DOC_ID = 'USD_KHR'
+API_TIMEOUT = 5
+# How long a worker trusts its in-memory copy of fx_rates before re-reading it.
+HISTORY_TTL = 600
+
+_STATE = {'rate': None, 'fetched_at': 0.0}
+_LOCK = threading.Lock()
+# Held for the duration of a refresh: at most one API call in flight per worker.
+_REFRESH_LOCK = threading.Lock()
+_BINDING = {'db': None}
+
+_HISTORY = {'dates': [], 'rates': [], 'loaded_at': 0.0}
+_HISTORY_LOCK = threading.Lock()
+
+
+def bind(db):
+    """Gives the provider its database so refreshes can run outside a request."""
+    _BINDING['db'] = db
+
+
+def _fetch_from_api():
+    api_key = Config.EXCHANGERATE_API_KEY
+    if not api_key:
+        log.warning("EXCHANGERATE_API_KEY not set. Using default rate of 4100.")
+        return None
+
+    url = f"https://v6.exchangerate-api.com/v6/{api_key}/latest/USD"
+    try:
+        response = http_client.get(http_client.EXCHANGE_RATE, url, endpoint='latest', timeout=API_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        if data.get('result') == 'success':
+            rate = data.get('conversion_rates', {}).get('KHR')
+            if rate:
+                log.info(f"Live rate fetched: 1 USD = {rate} KHR")
+                return float(rate)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log.error(f"Could not fetch exchange rate: {e}")
+    return None
+
+
+def _set(rate, fetched_at):
+    with _LOCK:
+        _STATE['rate'] = rate
+        _STATE['fetched_at'] = fetched_at
+
+
+def _load_persisted():
+    db = _BINDING['db']
+    if db is None:
+        return None
+    try:
+        doc = db.exchange_rates.find_one({'_id': RATE_DOC_ID})
+    except Exception as e:
+        log.error(f"Could not load persisted exchange rate: {e}")
+        return None
+    if not doc or not doc.get('rate'):
+        return None
+    fetched_at = doc['fetched_at'].replace(tzinfo=timezone.utc).timestamp()
+    _set(float(doc['rate']), fetched_at)
+    return doc['rate']
+
+
+def _persist(rate, fetched_at):
+    db = _BINDING['db']
+    if db is None:
+        return
+    try:
+        db.exchange_rates.update_one(
+            {'_id': RATE_DOC_ID},
+            {'$set': {'rate': rate, 'fetched_at': datetime.fromtimestamp(fetched_at, timezone.utc)}},
+            upsert=True
+        )
+    except Exception as e:
+        log.error(f"Could not persist exchange rate: {e}")
+
+
+def refresh():
+    """
+    Fetches a fresh rate unless another thread already is (single-flight).
+    On failure the previous rate stays in place. Returns True if a new rate was stored.
+    """
+    if not _REFRESH_LOCK.acquire(blocking=False):
+        return False
+    try:
+        rate = _fetch_from_api()
+        if rate is None:
+            return False
+        now = time.time()
+        _set(rate, now)
+        _persist(rate, now)
+        _record_daily(rate)
+        return True
+    finally:
+        _REFRESH_LOCK.release()
+
+
+def _refresh_in_background():
+    if not _REFRESH_LOCK.locked():
+        threading.Thread(target=refresh, name='fx-refresh', daemon=True).start()
+
+
+def current_rate():
+    """
+    The live USD->KHR rate. Serves from memory, then from the persisted copy;
+    only a worker with neither blocks on the API. Stale rates are returned
+    as-is while a background refresh runs.
+    """
+    with _LOCK:
+        rate, fetched_at = _STATE['rate'], _STATE['fetched_at']
+
+    if rate is None and _load_persisted() is not None:
+        with _LOCK:
+            rate, fetched_at = _STATE['rate'], _STATE['fetched_at']
+
+    if rate is None:
+        # Nothing known anywhere yet. Wait for whichever thread is fetching.
+        with _REFRESH_LOCK:
+            if _STATE['rate'] is None:
+                fetched = _fetch_from_api()
+                if fetched is not None:
+                    now = time.time()
+                    _set(fetched, now)
+                    _persist(fetched, now)
+                    _record_daily(fetched)
+        return _STATE['rate'] or DEFAULT_RATE
+
+    if time.time() - fetched_at > Config.FX_STALE_AFTER:
+        _refresh_in_background()
+    return rate
+
+
+def get_status():
+    with _LOCK:
+        rate, fetched_at = _STATE['rate'], _STATE['fetched_at']
+    return {
+        'rate': rate,
+        'age_seconds': round(time.time() - fetched_at, 1) if rate else None,
+        'refreshing': _REFRESH_LOCK.locked()
+    }
+
+
+# --- Historical rates (fx_rates: one USD->KHR rate per local day) ---
+
+def _local_today():
+    return datetime.now(PHNOM_PENH_TZ).date().isoformat()
+
+
+def _record_daily(rate, source='api'):
+    db = _BINDING['db']
+    if db is None:
+        return
+    try:
+        db.fx_rates.update_one(
+            {'date': _local_today()},
+            {'$set': {'rate': rate, 'source': source, 'updated_at': datetime.now(timezone.utc)}},
+            upsert=True
+        )
+    except Exception as e:
+        log.error(f"Could not record daily exchange rate: {e}")
+    _HISTORY['loaded_at'] = 0.0
+
+
+def _history():
+    """Sorted (dates, rates) from fx_rates, re-read at most every HISTORY_TTL seconds."""
+    db = _BINDING['db']
+    with _HISTORY_LOCK:
+        if db is not None and time.time() - _HISTORY['loaded_at'] > HISTORY_TTL:
+            try:
+                rows = list(db.fx_rates.find({}, {'_id': 0, 'date': 1, 'rate': 1}).sort('date', 1))
+                _HISTORY['dates'] = [r['date'] for r in rows]
+                _HISTORY['rates'] = [float(r['rate']) for r in rows]
+                _HISTORY['loaded_at'] = time.time()
+            except Exception as e:
+                log.error(f"Could not load exchange rate history: {e}")
+        return _HISTORY['dates'], _HISTORY['rates']
+
+
+def rates_on(local_dates):
+    """
+    USD->KHR rate for each local date (date objects or 'YYYY-MM-DD' strings):
+    that day's rate, else the nearest earlier day's, else the earliest known.
+    Today and later use the live rate.
+    """
+    dates, rates = _history()
+    today = _local_today()
+    live = None
+    out = []
+    for d in local_dates:
+        key = d.isoformat() if isinstance(d, date) else d
+        if key >= today or not dates:
+            live = live if live is not None else current_rate()
+            out.append(live)
+        else:
+            out.append(rates[max(bisect_right(dates, key) - 1, 0)])
+    return out
+
+
+def rate_on(local_date):
+    return rates_on([local_date])[0]
+
+
+def load_csv(db, text):
+    """
+    Bulk-loads historical rates from CSV text with `date,rate` columns
+    (header optional). Returns the number of days written; rejects the whole
+    file on the first malformed row.
+    """
+    ops = []
+    for line_no, row in enumerate(csv.reader(io.StringIO(text)), 1):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if line_no == 1 and row[0].strip().lower() == 'date':
+            continue
+        try:
+            day = date.fromisoformat(row[0].strip()).isoformat()
+            rate = float(row[1])
+        except (IndexError, ValueError):
+            raise ValueError(f"Line {line_no}: expected 'YYYY-MM-DD,rate', got {row!r}")
+        if rate <= 0:
+            raise ValueError(f"Line {line_no}: rate must be positive")
+        ops.append(UpdateOne(
+            {'date': day},
+            {'$set': {'rate': rate, 'source': 'csv', 'updated_at': datetime.now(timezone.utc)}},
+            upsert=True
+        ))
+
+    if ops:
+        db.fx_rates.bulk_write(ops, ordered=False)
+    _HISTORY['loaded_at'] = 0.0
+    return len(ops)
@@ -0,0 +1,76 @@
+# web_service/app/services/import_duplicates.py
+# Flags statement rows that are already in the ledger while they are being
+# stored for review, so neither the reviewer nor confirm has to wait for a
+# duplicate-key error. Each batch costs at most two indexed queries: an $in
+# on bank_reference_id, and for rows without a reference an $in on
+# content_hash, a fingerprint of (date, amount, currency, description)
+# written on every imported transaction.
+
+import hashlib
+import re
+import unicodedata
+
+DUPLICATE_FIELD = 'duplicate'
+REFERENCE = 'reference'
+CONTENT = 'content'
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def content_hash(txn):
+    """Fingerprint of a parsed row: day, amount to the cent, currency and normalized description."""
+    day = txn['date'].date().isoformat() if hasattr(txn.get('date'), 'date') else str(txn.get('date'))
+    desc = _WHITESPACE.sub(' ', unicodedata.normalize('NFC', txn.get('description') or '')).strip().casefold()
+    key = f"{day}|{float(txn.get('amount') or 0):.2f}|{(txn.get('currency') or '').upper()}|{desc}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class DuplicateChecker:
+    """
+    Marks duplicates batch by batch for one account (ObjectId). State carries
+    across batches so repeats within the same file are caught too.
+    """
+
+    def __init__(self, db, account_id):
+        self.db = db
+        self.account_id = account_id
+        self._seen_refs = set()
+        # content_hash -> matching ledger rows not yet claimed by an earlier row of this file
+        self._unclaimed = {}
+
+    def mark(self, batch):
+        """Sets content_hash on every row and `duplicate` on repeats. Returns how many were marked."""
+        refs = {t['bank_reference_id'] for t in batch if t.get('bank_reference_id')} - self._seen_refs
+        existing = set()
+        if refs:
+            existing = {doc['bank_reference_id'] for doc in self.db.transactions.find(
+                {'account_id': self.account_id, 'bank_reference_id': {'$in': list(refs)}},
+                {'bank_reference_id': 1, '_id': 0}
+            )}
+
+        for txn in batch:
+            txn['content_hash'] = content_hash(txn)
+        new_hashes = {t['content_hash'] for t in batch if not t.get('bank_reference_id')} - self._unclaimed.keys()
+        if new_hashes:
+            self._unclaimed.update(dict.fromkeys(new_hashes, 0))
+            for doc in self.db.transactions.aggregate([
+                {'$match': {'account_id': self.account_id, 'content_hash': {'$in': list(new_hashes)}}},
+                {'$group': {'_id': '$content_hash', 'n': {'$sum': 1}}}
+            ]):
+                self._unclaimed[doc['_id']] = doc['n']
+
+        marked = 0
+        for txn in batch:
+            ref = txn.get('bank_reference_id')
+            if ref:
+                if ref in existing or ref in self._seen_refs:
+                    txn[DUPLICATE_FIELD] = REFERENCE
+                    marked += 1
+                self._seen_refs.add(ref)
+            elif self._unclaimed.get(txn['content_hash']):
+                # Identical rows are legitimate (two coffees on one day), so each
+                # ledger match only accounts for one row of the file.
+                self._unclaimed[txn['content_hash']] -= 1
+                txn[DUPLICATE_FIELD] = CONTENT
+                marked += 1
+        return marked
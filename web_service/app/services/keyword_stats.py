@@ -0,0 +1,155 @@
+# web_service/app/services/keyword_stats.py
+
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from pymongo import UpdateOne
+
+from app.analytics import pipelines
+from app.services import snapshots
+from app.services.enrichment import to_local_date
+
+log = logging.getLogger(__name__)
+PHNOM_PENH_TZ = ZoneInfo("Asia/Phnom_Penh")
+UTC_TZ = ZoneInfo("UTC")
+
+STATS_KEY = ('account_id', 'month', 'category', 'keyword')
+TOP_K = 3
+
+
+def _keyword(tx):
+    """The habits keyword of an expense (its lowercased description), or None if it has none."""
+    if tx.get('type') != 'expense':
+        return None
+    description = tx.get('description')
+    if not isinstance(description, str) or not description:
+        return None
+    return description.lower()
+
+
+def _month(tx):
+    return tx.get('local_month') or to_local_date(tx['timestamp']).strftime('%Y-%m')
+
+
+def apply(db, txs, sign):
+    """$inc the keyword counters for inserted (sign=1) or removed (sign=-1) expenses."""
+    deltas = Counter()
+    for tx in txs:
+        if not tx or not tx.get('timestamp') or (keyword := _keyword(tx)) is None:
+            continue
+        deltas[(tx['account_id'], _month(tx), tx.get('categoryId'), keyword)] += sign
+    deltas = {key: inc for key, inc in deltas.items() if inc}
+    if not deltas:
+        return
+
+    ops = [
+        UpdateOne(dict(zip(STATS_KEY, key)), {'$inc': {'count': inc}}, upsert=True)
+        for key, inc in deltas.items()
+    ]
+    try:
+        db.keyword_stats.bulk_write(ops, ordered=False)
+        if sign < 0:
+            accounts = list({key[0] for key in deltas})
+            db.keyword_stats.delete_many({'account_id': {'$in': accounts}, 'count': {'$lte': 0}})
+    except Exception as e:
+        log.error(f"Keyword stats update failed: {e}")
+
+
+def rebuild(db, account_ids=None):
+    """
+    One-shot backfill: regenerates the keyword stats for the given accounts
+    (or all) from raw expenses, in place so concurrent writes keep landing.
+    Returns (docs written, writes failed).
+    """
+    match = {} if account_ids is None else {'account_id': {'$in': list(account_ids)}}
+
+    pipeline = [
+        {'$match': {**match, 'type': 'expense', 'timestamp': {'$type': 'date'},
+                    'description': {'$type': 'string', '$ne': ''}}},
+        {'$project': {'account_id': 1, 'categoryId': 1, 'description': 1, 'month': pipelines.local_month_expr()}}
+    ]
+
+    # Lowercasing happens here rather than with $toLower, which only folds ASCII.
+    counts = Counter()
+    for row in db.transactions.aggregate(pipeline, allowDiskUse=True):
+        counts[(row['account_id'], row['month'], row.get('categoryId'), row['description'].lower())] += 1
+
+    rows = ({**dict(zip(STATS_KEY, key)), 'count': count} for key, count in counts.items())
+    written, failed = snapshots.replace_all(db.keyword_stats, STATS_KEY, rows, match)
+
+    log.info(f"Keyword stats rebuilt: {written} docs, {failed} failed.")
+    return written, failed
+
+
+# --- Readers ---
+
+def _first_of_month(d):
+    return d.replace(day=1)
+
+
+def _next_month(d):
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _split_range(start_local, end_local):
+    """
+    Splits [start_local, end_local] into the whole months it covers
+    (as 'YYYY-MM' keys) and the leftover partial date windows at either end.
+    """
+    months, partial = [], []
+    cursor = start_local
+    while cursor <= end_local:
+        month_end = _next_month(cursor) - timedelta(days=1)
+        window_end = min(month_end, end_local)
+        if cursor == _first_of_month(cursor) and window_end == month_end:
+            months.append(cursor.strftime('%Y-%m'))
+        else:
+            partial.append((cursor, window_end))
+        cursor = window_end + timedelta(days=1)
+    return months, partial
+
+
+def _count_raw(db, account_id, start_local, end_local, counts):
+    """Adds keyword counts for a partial window straight from the transactions."""
+    start_utc = datetime.combine(start_local, time.min, tzinfo=PHNOM_PENH_TZ).astimezone(UTC_TZ)
+    end_utc = datetime.combine(end_local, time.max, tzinfo=PHNOM_PENH_TZ).astimezone(UTC_TZ)
+    for tx in db.transactions.find(
+        {'account_id': account_id, 'type': 'expense', 'timestamp': {'$gte': start_utc, '$lte': end_utc}},
+        {'_id': 0, 'type': 1, 'categoryId': 1, 'description': 1}
+    ):
+        if (keyword := _keyword(tx)) is not None:
+            counts[tx.get('categoryId')][keyword] += 1
+
+
+def top_keywords(db, account_id, start_local, end_local, k=TOP_K):
+    """
+    Top-k expense keywords per category between two local dates (inclusive),
+    in the same shape as the habits keywords pipeline. Whole months are read
+    from keyword_stats; partial months at either end are counted from raw rows.
+    """
+    if isinstance(start_local, datetime):
+        start_local = start_local.date()
+    if isinstance(end_local, datetime):
+        end_local = end_local.date()
+
+    months, partial = _split_range(start_local, end_local)
+    counts = defaultdict(Counter)
+
+    if months:
+        for doc in db.keyword_stats.find(
+            {'account_id': account_id, 'month': {'$in': months}},
+            {'_id': 0, 'category': 1, 'keyword': 1, 'count': 1}
+        ):
+            counts[doc.get('category')][doc['keyword']] += doc['count']
+    for window_start, window_end in partial:
+        _count_raw(db, account_id, window_start, window_end, counts)
+
+    return [
+        {
+            'category': category,
+            'topKeywords': [kw for kw, _ in sorted(kws.items(), key=lambda i: (-i[1], i[0]))[:k]]
+        }
+        for category, kws in counts.items()
+        if any(c > 0 for c in kws.values())
+    ]
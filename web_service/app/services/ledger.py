@@ -0,0 +1,197 @@
+# web_service/app/services/ledger.py
+# Write-side maintenance for views derived from transactions: the balance
+# ledger here, the daily rollups in services/rollups.py, the month-end
+# balance checkpoints in services/checkpoints.py and the keyword counters in
+# services/keyword_stats.py.
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from app.services import checkpoints, keyword_stats, rollups
+
+log = logging.getLogger(__name__)
+UTC_TZ = ZoneInfo("UTC")
+
+# Only these types move a balance; transfers and anything else are ignored.
+BALANCE_TYPES = ('income', 'expense')
+
+# Drift below this amount (in native currency units) is treated as float noise.
+DRIFT_TOLERANCE = 0.005
+
+# Transactions are stored before their $inc reaches the ledger. A recompute
+# waits this long before overwriting a ledger doc, and only overwrites it if
+# its `version` (bumped by every $inc) did not move meanwhile, so an
+# increment still in flight is never erased or counted twice.
+SETTLE_SECONDS = 2
+
+
+def _safe_key(value):
+    """Currency codes become field names, so reject anything Mongo would misinterpret."""
+    return isinstance(value, str) and value.isalnum()
+
+
+def _balance_deltas(txs, sign):
+    """Folds transactions into {account_id: {'totals.<CUR>.<type>': delta}}."""
+    deltas = defaultdict(lambda: defaultdict(float))
+    for tx in txs:
+        if not tx or tx.get('type') not in BALANCE_TYPES or not _safe_key(tx.get('currency')):
+            continue
+        try:
+            amount = float(tx.get('amount', 0))
+        except (TypeError, ValueError):
+            continue
+        deltas[tx['account_id']][f"totals.{tx['currency']}.{tx['type']}"] += sign * amount
+    return deltas
+
+
+def _apply(db, txs, sign):
+    deltas = _balance_deltas(txs, sign)
+    if not deltas:
+        return
+
+    now = datetime.now(UTC_TZ)
+    # upsert=False: an account without a ledger doc is seeded lazily from raw history
+    # on its next read, so we must not create a partial doc here.
+    ops = [
+        UpdateOne({'account_id': account_id}, {'$inc': {**inc, 'version': 1}, '$set': {'updated_at': now}})
+        for account_id, inc in deltas.items()
+    ]
+    try:
+        db.balances.bulk_write(ops, ordered=False)
+    except Exception as e:
+        # The transaction itself is already stored; the reconcile job will repair the drift.
+        log.error(f"Balance ledger update failed: {e}")
+
+
+def record_inserted(db, txs):
+    """Adds newly inserted transactions to every derived view."""
+    _apply(db, txs, 1)
+    rollups.apply(db, txs, 1)
+    keyword_stats.apply(db, txs, 1)
+    checkpoints.invalidate(db, txs)
+
+
+def record_deleted(db, txs):
+    """Removes deleted transactions from every derived view."""
+    _apply(db, txs, -1)
+    rollups.apply(db, txs, -1)
+    keyword_stats.apply(db, txs, -1)
+    checkpoints.invalidate(db, txs)
+
+
+def record_updated(db, before, after):
+    """Applies an edit as a reversal of the old document plus the new one."""
+    record_deleted(db, [before])
+    record_inserted(db, [after])
+
+
+def compute_totals(db, account_ids=None):
+    """Recomputes {account_id: {currency: {type: total}}} from raw transactions."""
+    match = {'type': {'$in': list(BALANCE_TYPES)}}
+    if account_ids is not None:
+        match['account_id'] = {'$in': list(account_ids)}
+
+    totals = defaultdict(lambda: defaultdict(dict))
+    for row in db.transactions.aggregate([
+        {'$match': match},
+        {'$group': {
+            '_id': {'account_id': '$account_id', 'currency': '$currency', 'type': '$type'},
+            'total': {'$sum': '$amount'}
+        }}
+    ]):
+        key = row['_id']
+        if _safe_key(key.get('currency')):
+            totals[key['account_id']][key['currency']][key['type']] = row['total']
+    return totals
+
+
+def get_balances(db, account_id):
+    """
+    Returns {currency: {'income': x, 'expense': y}} for one account.
+    Reads the materialized ledger doc; seeds it from raw history on first access.
+    """
+    doc = db.balances.find_one({'account_id': account_id}, {'totals': 1})
+    if doc is not None:
+        return doc.get('totals', {})
+
+    computed = compute_totals(db, [account_id]).get(account_id, {})
+    totals = {cur: dict(types) for cur, types in computed.items()}
+    try:
+        result = db.balances.update_one(
+            {'account_id': account_id},
+            {'$setOnInsert': {'totals': totals, 'version': 0, 'updated_at': datetime.now(UTC_TZ)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return totals  # A concurrent request seeded it first
+    if result.upserted_id is not None:
+        # A write that landed between the compute and the seed found no doc to
+        # $inc; re-check the fresh doc once in-flight writes have settled.
+        threading.Thread(target=reconcile_balances, args=(db, [account_id]),
+                         name='ledger-seed-verify', daemon=True).start()
+    return totals
+
+
+def _drift(stored, actual):
+    """Lists the (currency, type) totals that differ beyond tolerance."""
+    drift = []
+    for cur in set(stored) | set(actual):
+        for t_type in BALANCE_TYPES:
+            s = stored.get(cur, {}).get(t_type, 0)
+            a = actual.get(cur, {}).get(t_type, 0)
+            if abs(s - a) > DRIFT_TOLERANCE:
+                drift.append({'currency': cur, 'type': t_type, 'stored': s, 'actual': a})
+    return drift
+
+
+def reconcile_balances(db, account_ids=None):
+    """
+    Recomputes ledger docs from raw transactions and overwrites the ones that
+    drifted, guarded on their version so a concurrent $inc is never erased.
+    Accounts without a ledger doc are left to be seeded on first read.
+    Waits SETTLE_SECONDS before writing. Reports drifted accounts and those
+    skipped because they changed during the check.
+    """
+    # Versions are read before the recompute so any $inc after this point moves them.
+    query = {} if account_ids is None else {'account_id': {'$in': list(account_ids)}}
+    stored_by_account = {
+        d['account_id']: (d.get('totals', {}), d.get('version'))
+        for d in db.balances.find(query, {'account_id': 1, 'totals': 1, 'version': 1})
+    }
+    actual_by_account = compute_totals(db, account_ids)
+
+    report = {'checked': 0, 'drifted': [], 'skipped': 0}
+    ops = []
+
+    for account_id, (stored, version) in stored_by_account.items():
+        actual = {cur: dict(types) for cur, types in actual_by_account.get(account_id, {}).items()}
+        report['checked'] += 1
+
+        drift = _drift(stored, actual)
+        if not drift:
+            continue
+        report['drifted'].append({'account_id': str(account_id), 'drift': drift})
+        log.warning(f"Balance drift for account {account_id}: {drift}")
+
+        # version None also matches docs written before the field existed
+        ops.append(UpdateOne(
+            {'account_id': account_id, 'version': version},
+            {'$set': {'totals': actual, 'reconciled_at': datetime.now(UTC_TZ)}}
+        ))
+
+    if ops:
+        time.sleep(SETTLE_SECONDS)
+        matched = db.balances.bulk_write(ops, ordered=False).matched_count
+        report['skipped'] = len(ops) - matched
+        if report['skipped']:
+            log.info(f"Balance reconciliation: {report['skipped']} accounts changed during the check; "
+                     f"left for the next run.")
+
+    log.info(f"Balance reconciliation: checked {report['checked']}, drifted {len(report['drifted'])}.")
+    return report
@@ -0,0 +1,108 @@
+# web_service/app/services/pending_imports.py
+# Storage for parsed statements awaiting review. Each row is its own document
+# in pending_import_rows, keyed by (session_id, seq), and the session header
+# in pending_imports is written only after every row is stored. Both
+# collections expire through TTL indexes on created_at (see utils/indexes.py),
+# so abandoned sessions clean themselves up and no session is bound by the
+# 16MB document limit.
+
+from datetime import datetime, timezone
+from pymongo import ASCENDING
+
+ROWS = 'pending_import_rows'
+SESSIONS = 'pending_imports'
+# Sessions (and their rows) are deleted this long after upload.
+TTL_SECONDS = 24 * 60 * 60
+WRITE_BATCH_SIZE = 1000
+READ_BATCH_SIZE = 500
+# Bookkeeping fields on row documents that are not part of the parsed transaction.
+ROW_FIELDS = ('_id', 'session_id', 'account_id', 'seq', 'created_at')
+
+
+def store(db, session_id, account_id, filename, transactions, check=None):
+    """
+    Writes `transactions` (any iterable) as rows in batches of WRITE_BATCH_SIZE,
+    then the session header. `check(batch)`, if given, annotates each batch
+    before it is written and returns how many rows it marked as duplicates
+    (see import_duplicates.DuplicateChecker). Returns (rows, duplicates).
+    """
+    created_at = datetime.now(timezone.utc)
+    count, duplicates, batch = 0, 0, []
+
+    def flush(batch):
+        marked = check(batch) if check else 0
+        db[ROWS].insert_many(batch, ordered=False)
+        return marked
+
+    for txn in transactions:
+        batch.append({**txn, 'session_id': session_id, 'account_id': account_id,
+                      'seq': count, 'created_at': created_at})
+        count += 1
+        if len(batch) >= WRITE_BATCH_SIZE:
+            duplicates += flush(batch)
+            batch = []
+    if batch:
+        duplicates += flush(batch)
+    if count:
+        db[SESSIONS].insert_one({
+            'session_id': session_id,
+            'account_id': account_id,
+            'filename': filename,
+            'row_count': count,
+            'duplicate_count': duplicates,
+            'created_at': created_at
+        })
+    return count, duplicates
+
+
+def find_session(db, session_id, account_id):
+    return db[SESSIONS].find_one({'session_id': session_id, 'account_id': account_id})
+
+
+def _strip(row):
+    for field in ROW_FIELDS:
+        row.pop(field, None)
+    return row
+
+
+def page(db, session, after_seq, size):
+    """
+    Returns (rows, next_seq) for one page of a session in upload order. Reads
+    one extra row to know whether another page exists.
+    """
+    if 'transactions' in session:  # sessions stored before rows were split out
+        rows = session['transactions'][after_seq + 1:after_seq + 2 + size]
+        base = after_seq + 1
+        if len(rows) <= size:
+            return rows, None
+        return rows[:size], base + size - 1
+
+    docs = list(
+        db[ROWS].find({'session_id': session['session_id'], 'seq': {'$gt': after_seq}})
+        .sort('seq', ASCENDING)
+        .limit(size + 1)
+    )
+    if len(docs) <= size:
+        return [_strip(d) for d in docs], None
+    docs = docs[:size]
+    last_seq = docs[-1]['seq']
+    return [_strip(d) for d in docs], last_seq
+
+
+def iter_rows(db, session):
+    """Every row of a session in upload order, fetched READ_BATCH_SIZE at a time."""
+    if 'transactions' in session:
+        yield from session['transactions']
+        return
+    cursor = (
+        db[ROWS].find({'session_id': session['session_id']})
+        .sort('seq', ASCENDING)
+        .batch_size(READ_BATCH_SIZE)
+    )
+    for doc in cursor:
+        yield _strip(doc)
+
+
+def discard(db, session_id):
+    db[ROWS].delete_many({'session_id': session_id})
+    db[SESSIONS].delete_one({'session_id': session_id})
@@ -0,0 +1,190 @@
+# web_service/app/services/rollups.py
+
+import logging
+from collections import defaultdict
+from datetime import date
+from pymongo import UpdateOne
+
+from app.analytics import pipelines
+from app.services import snapshots
+from app.services.enrichment import to_local_date
+
+log = logging.getLogger(__name__)
+
+ROLLUP_KEY = ('account_id', 'date', 'type', 'categoryId', 'currency')
+
+# $dayOfWeek numbering (1 = Sunday), kept so rollup output matches the raw pipeline.
+DAY_NAMES = {1: 'Sunday', 2: 'Monday', 3: 'Tuesday', 4: 'Wednesday', 5: 'Thursday', 6: 'Friday', 7: 'Saturday'}
+
+
+def _usd_parts(tx):
+    """
+    Splits a transaction into (usd_sum, unrated_sum).
+    Legacy non-USD amounts without amount_usd or a stored rate stay in native
+    units so readers can apply the user's current rate.
+    """
+    amount = float(tx.get('amount', 0))
+    if tx.get('amount_usd') is not None:
+        return float(tx['amount_usd']), 0.0
+    if tx.get('currency') == 'USD':
+        return amount, 0.0
+    rate = tx.get('exchangeRateAtTime')
+    if rate and rate > 0:
+        return amount / rate, 0.0
+    return 0.0, amount
+
+
+def _rollup_deltas(txs, sign):
+    deltas = defaultdict(lambda: defaultdict(float))
+    for tx in txs:
+        if not tx or not tx.get('timestamp'):
+            continue
+        try:
+            usd, unrated = _usd_parts(tx)
+        except (TypeError, ValueError):
+            continue
+        local_date = tx.get('local_date') or to_local_date(tx['timestamp']).isoformat()
+        key = (tx['account_id'], local_date,
+               tx.get('type'), tx.get('categoryId'), tx.get('currency'))
+        inc = deltas[key]
+        inc['sum'] += sign * float(tx.get('amount', 0))
+        inc['usd_sum'] += sign * usd
+        inc['unrated_sum'] += sign * unrated
+        inc['count'] += sign
+    return deltas
+
+
+def apply(db, txs, sign):
+    """$inc the daily rollups for inserted (sign=1) or removed (sign=-1) transactions."""
+    deltas = _rollup_deltas(txs, sign)
+    if not deltas:
+        return
+
+    ops = [
+        UpdateOne(dict(zip(ROLLUP_KEY, key)), {'$inc': {**inc, 'count': int(inc['count'])}}, upsert=True)
+        for key, inc in deltas.items()
+    ]
+    try:
+        db.daily_rollups.bulk_write(ops, ordered=False)
+        if sign < 0:
+            accounts = list({key[0] for key in deltas})
+            db.daily_rollups.delete_many({'account_id': {'$in': accounts}, 'count': {'$lte': 0}})
+    except Exception as e:
+        log.error(f"Daily rollup update failed: {e}")
+
+
+def rebuild(db, account_ids=None):
+    """
+    One-shot backfill: regenerates the rollups for the given accounts (or all)
+    from raw transactions, in place so concurrent writes keep landing.
+    Returns (rollup docs written, writes failed).
+    """
+    match = {} if account_ids is None else {'account_id': {'$in': list(account_ids)}}
+
+    pipeline = [
+        {'$match': {**match, 'timestamp': {'$type': 'date'}}},
+        {'$group': {
+            '_id': {
+                'account_id': '$account_id',
+                'date': pipelines.local_date_expr(),
+                'type': '$type',
+                'categoryId': '$categoryId',
+                'currency': '$currency'
+            },
+            'sum': {'$sum': '$amount'},
+            'usd_sum': {'$sum': pipelines.rated_usd_expr()},
+            'unrated_sum': {'$sum': pipelines.unrated_amount_expr()},
+            'count': {'$sum': 1}
+        }}
+    ]
+
+    rows = ({**row.pop('_id'), **row} for row in db.transactions.aggregate(pipeline, allowDiskUse=True))
+    written, failed = snapshots.replace_all(db.daily_rollups, ROLLUP_KEY, rows, match)
+
+    log.info(f"Daily rollups rebuilt: {written} docs, {failed} failed.")
+    return written, failed
+
+
+# --- Readers ---
+
+def fetch(db, account_id, start_local, end_local, **filters):
+    """Rollup rows for an account between two local dates (inclusive)."""
+    query = {
+        'account_id': account_id,
+        'date': {'$gte': start_local.isoformat(), '$lte': end_local.isoformat()},
+        **filters
+    }
+    return list(db.daily_rollups.find(query, {'_id': 0, 'account_id': 0, snapshots.STAMP: 0}))
+
+
+def usd_total(row, user_rate):
+    return row.get('usd_sum', 0) + row.get('unrated_sum', 0) / user_rate
+
+
+def report_facets(rows, user_rate, financial_categories):
+    """
+    Rebuilds the build_faceted_report_pipeline facets (except top_expense,
+    which needs individual documents) from rollup rows.
+    """
+    operational = defaultdict(float)
+    financial = defaultdict(float)
+    flow = defaultdict(float)
+    daily_spend = defaultdict(float)
+
+    for row in rows:
+        usd = usd_total(row, user_rate)
+        cat = row.get('categoryId')
+        flow[row['type']] += usd
+        if cat in financial_categories:
+            financial[cat] += usd
+            continue
+        operational[(row['type'], cat)] += usd
+        if row['type'] == 'expense':
+            daily_spend[row['date']] += usd
+
+    return {
+        'operational': sorted(
+            ({'_id': {'type': t, 'category': c}, 'total': v} for (t, c), v in operational.items()),
+            key=lambda i: i['total'], reverse=True
+        ),
+        'financial': [{'_id': c, 'total': v} for c, v in financial.items()],
+        'total_flow': [{'_id': t, 'totalUSD': v} for t, v in flow.items()],
+        'spending_over_time': [{'date': d, 'total_spent_usd': v} for d, v in sorted(daily_spend.items())],
+        'daily_stats': sorted(
+            ({'_id': d, 'total_spent_usd': v} for d, v in daily_spend.items()),
+            key=lambda i: i['total_spent_usd'], reverse=True
+        )
+    }
+
+
+def period_totals(rows, periods, user_rate, excluded_categories):
+    """
+    Buckets rollup rows into named local-date periods.
+    Returns {period: [{'_id': {'type', 'currency'}, 'total', 'totalUSD'}]}, the
+    same shape as the summary $facet output.
+    """
+    buckets = {name: defaultdict(lambda: [0.0, 0.0]) for name in periods}
+    for row in rows:
+        if row.get('categoryId') in excluded_categories:
+            continue
+        usd = usd_total(row, user_rate)
+        for name, (start, end) in periods.items():
+            if start.isoformat() <= row['date'] <= end.isoformat():
+                acc = buckets[name][(row['type'], row['currency'])]
+                acc[0] += row.get('sum', 0)
+                acc[1] += usd
+
+    return {
+        name: [{'_id': {'type': t, 'currency': c}, 'total': v[0], 'totalUSD': v[1]} for (t, c), v in data.items()]
+        for name, data in buckets.items()
+    }
+
+
+def day_of_week_totals(rows, user_rate):
+    """Rebuilds the habits byDayOfWeek output (Sunday first) from expense rollups."""
+    totals = defaultdict(float)
+    for row in rows:
+        # isoweekday: Monday=1..Sunday=7 -> $dayOfWeek: Sunday=1..Saturday=7
+        day = date.fromisoformat(row['date']).isoweekday() % 7 + 1
+        totals[day] += usd_total(row, user_rate)
+    return [{'day': DAY_NAMES[d], 'total': totals[d]} for d in sorted(totals)]
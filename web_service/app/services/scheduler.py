@@ -1,12 +1,12 @@
 # web_service/app/services/scheduler.py
 
-import certifi
-from pymongo import MongoClient
 from datetime import datetime, time, timedelta
 from zoneinfo import ZoneInfo
 from ..config import Config
+from ..utils.db import get_database
 from ..utils.telegram_helpers import send_telegram_message, send_telegram_photo
 from .reporting import get_report_data, format_scheduled_report_message, create_pie_chart_from_data
+from .ledger import reconcile_balances
 
 PHNOM_PENH_TZ = ZoneInfo("Asia/Phnom_Penh")
 UTC_TZ = ZoneInfo("UTC")
@@ -31,14 +31,12 @@ def _send_report_job(period_name, start_date, end_date, db, token, chat_id):
 def run_scheduled_report(period):
     """Main function called by scheduler to run a report for a given period."""
     print(f"Running {period} scheduled report job...")
-    client = MongoClient(Config.MONGODB_URI, tls=True, tlsCAFile=certifi.where())
-    db = client[Config.DB_NAME]
+    db = get_database()
     token = Config.TELEGRAM_TOKEN
     chat_id = Config.TELEGRAM_CHAT_ID
 
     if not token or not chat_id:
         print(f"Skipping {period} report: Telegram token or chat ID not configured.")
-        client.close()
         return
 
     today = datetime.now(PHNOM_PENH_TZ).date()
@@ -65,13 +63,11 @@ def run_scheduled_report(period):
         start_date = today.replace(year=today.year - 1, month=1, day=1)
         _send_report_job('previous year', start_date, end_date, db, token, chat_id)
 
-    client.close()
     print(f"{period.capitalize()} report job finished.")
 
 
 def send_daily_reminder_job():
-    client = MongoClient(Config.MONGODB_URI, tls=True, tlsCAFile=certifi.where())
-    db = client[Config.DB_NAME]
+    db = get_database()
     now_in_phnom_penh = datetime.now(PHNOM_PENH_TZ)
     today_start_local_aware = datetime.combine(now_in_phnom_penh.date(), time.min, tzinfo=PHNOM_PENH_TZ)
     today_start_utc = today_start_local_aware.astimezone(UTC_TZ)
@@ -89,4 +85,12 @@ def send_daily_reminder_job():
     else:
         print("Skipped daily transaction reminder, transactions found or config missing.")
 
-    client.close()
\ No newline at end of file
+
+def run_balance_reconciliation():
+    """Repairs drifted balance ledger docs from raw transactions and logs the drift."""
+    print("Running balance reconciliation job...")
+    try:
+        report = reconcile_balances(get_database())
+        print(f"Balance reconciliation finished: {len(report['drifted'])} of {report['checked']} accounts drifted.")
+    except Exception as e:
+        print(f"Balance reconciliation failed: {e}")
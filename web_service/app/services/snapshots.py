@@ -0,0 +1,62 @@
+# web_service/app/services/snapshots.py
+# Rewrites a derived collection (daily_rollups, keyword_stats) from a fresh
+# aggregation while apply() keeps $inc-ing it. Rows are upserted with $set
+# instead of deleted and re-inserted, so a write landing mid-rebuild never
+# collides with the unique key and readers never see the collection half
+# empty. Docs the run did not rewrite are deleted once every row is in.
+
+import logging
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+# Set on every doc a rebuild writes; readers project it away.
+STAMP = 'rebuilt_at'
+
+
+def replace_all(collection, key_fields, rows, match):
+    """
+    Upserts each row (key fields plus values) and then deletes the docs under
+    `match` that existed before the run and were not rewritten by it.
+    Returns (written, failed); nothing is deleted when any write failed.
+    """
+    now = datetime.now(timezone.utc)
+    # Mongo keeps milliseconds; truncate so the stamp compares equal after the round trip.
+    started = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    written = failed = 0
+    ops = []
+
+    def flush():
+        nonlocal written, failed
+        try:
+            result = collection.bulk_write(ops, ordered=False)
+            written += result.upserted_count + result.matched_count
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            failed += len(errors)
+            written += len(ops) - len(errors)
+            log.error(f"{collection.name} rebuild: {len(errors)} of {len(ops)} writes failed, "
+                      f"first: {errors[0].get('errmsg') if errors else e}")
+        ops.clear()
+
+    for row in rows:
+        key = {k: row.get(k) for k in key_fields}
+        values = {k: v for k, v in row.items() if k not in key}
+        ops.append(UpdateOne(key, {'$set': {**values, STAMP: started}}, upsert=True))
+        if len(ops) >= BATCH_SIZE:
+            flush()
+    if ops:
+        flush()
+
+    if failed:
+        log.error(f"{collection.name} rebuild: kept stale docs because {failed} writes failed.")
+        return written, failed
+
+    # Keys with no transactions left. Docs apply() created during the run have
+    # newer ObjectIds and are kept.
+    collection.delete_many({**match, STAMP: {'$ne': started}, '_id': {'$lt': ObjectId.from_datetime(started)}})
+    return written, failed
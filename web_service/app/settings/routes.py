@@ -3,8 +3,9 @@ from bson import ObjectId
 
 from app.utils.db import settings_collection
 from app.utils.auth import auth_required
-from app.utils.currency import get_live_usd_to_khr_rate
+from app.utils.cache import bumps_data_version
 from app.utils.serializers import serialize_profile
+from app.utils.profile import current_profile
 
 settings_bp = Blueprint('settings', __name__, url_prefix='/settings')
 
@@ -24,19 +25,18 @@ def get_user_settings():
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
 
-    user_settings = settings_collection().find_one(
-        {'account_id': account_id},
-        {'_id': 0, 'account_id': 1, 'settings': 1, 'name_en': 1, 'name_km': 1, 'onboarding_complete': 1}
-    )
-
-    if not user_settings:
+    profile = current_profile(account_id)
+    if profile is None:
         return jsonify({'error': 'User settings not found'}), 404
 
+    fields = ('account_id', 'settings', 'name_en', 'name_km', 'onboarding_complete')
+    user_settings = {k: profile.doc[k] for k in fields if k in profile.doc}
     return jsonify({"profile": serialize_profile(user_settings)})
 
 
 @settings_bp.route('/balance', methods=['POST'])
 @auth_required(min_role="user")
+@bumps_data_version
 def update_initial_balance():
     try:
         account_id = get_account_id()
@@ -69,6 +69,7 @@ def update_initial_balance():
 
 @settings_bp.route('/category', methods=['POST'])
 @auth_required(min_role="premium_user")
+@bumps_data_version
 def add_user_category():
     try:
         account_id = get_account_id()
@@ -98,6 +99,7 @@ def add_user_category():
 
 @settings_bp.route('/category', methods=['DELETE'])
 @auth_required(min_role="premium_user")
+@bumps_data_version
 def remove_user_category():
     try:
         account_id = get_account_id()
@@ -129,6 +131,7 @@ def remove_user_category():
 
 @settings_bp.route('/rate', methods=['POST'])
 @auth_required(min_role="user")
+@bumps_data_version
 def update_khr_rate():
     try:
         account_id = get_account_id()
@@ -159,20 +162,16 @@ def get_khr_rate():
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
 
-    user_settings_doc = settings_collection().find_one({'account_id': account_id})
-    if not user_settings_doc:
+    profile = current_profile(account_id)
+    if profile is None:
         return jsonify({'error': 'User settings not found'}), 404
 
-    settings = user_settings_doc.get('settings', {})
-
-    if settings.get('rate_preference') == 'fixed':
-        return jsonify({'rate': settings.get('fixed_rate', 4100.0), 'source': 'fixed'})
-
-    return jsonify({'rate': get_live_usd_to_khr_rate(), 'source': 'live'})
+    return jsonify({'rate': profile.khr_rate, 'source': profile.rate_source})
 
 
 @settings_bp.route('/mode', methods=['POST'])
 @auth_required(min_role="user")
+@bumps_data_version
 def update_user_mode():
     try:
         account_id = get_account_id()
@@ -217,6 +216,7 @@ def update_user_mode():
 
 @settings_bp.route('/complete_onboarding', methods=['POST'])
 @auth_required(min_role="user")
+@bumps_data_version
 def complete_onboarding():
     try:
         account_id = get_account_id()
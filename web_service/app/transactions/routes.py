@@ -1,17 +1,26 @@
-from flask import Blueprint, request, jsonify, g
+from itertools import chain
+from flask import Blueprint, Response, request, jsonify, g, stream_with_context
 from datetime import datetime, time, timedelta
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
 from zoneinfo import ZoneInfo
-import re
 
-from app.utils.db import transactions_collection
+from app.utils.db import get_db, transactions_collection
 from app.utils.auth import auth_required
-from app.utils.currency import get_live_usd_to_khr_rate
+from app.utils.cache import bumps_data_version
+from app.utils.pagination import CURSOR_HEADER, fetch_page, page_size
+from app.utils.currency import get_usd_to_khr_rate_at, get_user_khr_rate, get_user_khr_rates_on
+from app.services import export, ledger
+from app.services.enrichment import DERIVED_FIELDS, category_key, enrich, to_local_date, write_time_rate
+from app.analytics.pipelines import build_keyword_filter
 
 transactions_bp = Blueprint('transactions', __name__, url_prefix='/transactions')
 
 PHNOM_PENH_TZ = ZoneInfo("Asia/Phnom_Penh")
 UTC_TZ = ZoneInfo("UTC")
+# Read-compute-write rounds update_transaction tries before reporting a conflict.
+UPDATE_ATTEMPTS = 3
 
 
 def get_account_id():
@@ -59,6 +68,7 @@ def get_date_ranges_for_search():
 
 @transactions_bp.route('/', methods=['POST'])
 @auth_required(min_role="user")
+@bumps_data_version
 def add_transaction():
     try:
         account_id = get_account_id()
@@ -89,12 +99,27 @@ def add_transaction():
         return jsonify({'error': 'Invalid data format'}), 400
 
     if tx['currency'] == 'KHR':
-        tx['exchangeRateAtTime'] = get_live_usd_to_khr_rate()
+        # Backdated entries take the rate of their own day, not today's.
+        tx['exchangeRateAtTime'] = get_usd_to_khr_rate_at(tx['timestamp'])
+
+    fallback_rate = tx.get('exchangeRateAtTime')
+    if tx['currency'] not in ('USD', 'KHR'):
+        fallback_rate = get_user_khr_rate(account_id)
+    enrich(tx, fallback_rate)
 
     result = transactions_collection().insert_one(tx)
+    ledger.record_inserted(get_db(), [tx])
     return jsonify({'message': 'Transaction added', 'id': str(result.inserted_id)}), 201
 
 
+def _page_response(txs, next_cursor):
+    """A page of transactions; the body stays a plain list and the cursor travels in a header."""
+    response = jsonify([serialize_tx(tx) for tx in txs])
+    if next_cursor:
+        response.headers[CURSOR_HEADER] = next_cursor
+    return response
+
+
 @transactions_bp.route('/recent', methods=['GET'])
 @auth_required(min_role="user")
 def get_recent_transactions():
@@ -103,13 +128,15 @@ def get_recent_transactions():
     except ValueError:
         return jsonify({'error': 'Invalid account_id format'}), 400
 
-    limit = int(request.args.get('limit', 20))
-
-    cursor = transactions_collection().find(
-        {'account_id': account_id}
-    ).sort('timestamp', -1).limit(limit)
+    try:
+        limit = page_size(request.args.get('limit'), 20)
+        txs, next_cursor = fetch_page(
+            transactions_collection(), {'account_id': account_id}, request.args.get('cursor'), limit
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    return jsonify([serialize_tx(tx) for tx in cursor])
+    return _page_response(txs, next_cursor)
 
 
 @transactions_bp.route('/search', methods=['POST'])
@@ -150,23 +177,68 @@ def search_transactions():
 
     # Category Filtering
     if params.get('categories'):
-        # Compile regex once for efficiency
-        cats = [re.compile(f'^{re.escape(c.strip())}$', re.IGNORECASE) for c in params['categories']]
-        match_stage['categoryId'] = {'$in': cats}
+        match_stage['category_key'] = {'$in': [category_key(c) for c in params['categories']]}
 
     # Keyword Filtering
     if params.get('keywords'):
-        keywords = params['keywords']
-        logic = params.get('keyword_logic', 'OR').upper()
+        match_stage.update(build_keyword_filter(
+            params['keywords'],
+            params.get('keyword_logic', 'OR'),
+            substring=params.get('keyword_match', 'substring') != 'word'
+        ))
+
+    try:
+        limit = page_size(params.get('limit'), 50)
+        results, next_cursor = fetch_page(transactions_collection(), match_stage, params.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return _page_response(results, next_cursor)
+
+
+@transactions_bp.route('/export', methods=['GET'])
+@auth_required(min_role="user")
+def export_transactions():
+    """
+    Streams the account's transactions (optionally limited to a local date
+    range) as CSV or NDJSON with chunked transfer encoding. Returns 204 when
+    there is nothing to export.
+    """
+    try:
+        account_id = get_account_id()
+    except ValueError:
+        return jsonify({'error': 'Invalid account_id format'}), 400
 
-        if logic == 'AND':
-            match_stage['$and'] = [{'description': re.compile(k, re.IGNORECASE)} for k in keywords]
-        else:
-            regex_str = '|'.join([re.escape(k) for k in keywords])
-            match_stage['description'] = re.compile(regex_str, re.IGNORECASE)
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in export.FORMATS:
+        return jsonify({'error': f"Unsupported format. Use one of: {', '.join(export.FORMATS)}"}), 400
 
-    results = list(transactions_collection().find(match_stage).sort('timestamp', -1).limit(50))
-    return jsonify([serialize_tx(tx) for tx in results])
+    query = {'account_id': account_id}
+    filename = f"transactions.{fmt}"
+    s_str, e_str = request.args.get('start_date'), request.args.get('end_date')
+    if s_str and e_str:
+        try:
+            s_local = datetime.fromisoformat(s_str).date()
+            e_local = datetime.fromisoformat(e_str).date()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format'}), 400
+        query['timestamp'] = {
+            '$gte': datetime.combine(s_local, time.min, tzinfo=PHNOM_PENH_TZ).astimezone(UTC_TZ),
+            '$lte': datetime.combine(e_local, time.max, tzinfo=PHNOM_PENH_TZ).astimezone(UTC_TZ)
+        }
+        filename = f"transactions_{s_local}_to_{e_local}.{fmt}"
+
+    cursor = export.open_cursor(transactions_collection(), query)
+    first = next(cursor, None)
+    if first is None:
+        cursor.close()
+        return '', 204
+
+    return Response(
+        stream_with_context(export.stream(chain([first], cursor), fmt)),
+        mimetype=export.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
 
 
 @transactions_bp.route('/<tx_id>', methods=['GET'])
@@ -184,6 +256,7 @@ def get_transaction(tx_id):
 
 @transactions_bp.route('/<tx_id>', methods=['PUT'])
 @auth_required(min_role="user")
+@bumps_data_version
 def update_transaction(tx_id):
     try:
         account_id = get_account_id()
@@ -195,7 +268,6 @@ def update_transaction(tx_id):
         return jsonify({'error': 'No update data provided'}), 400
 
     update_fields = {}
-    allowed = {'amount', 'categoryId', 'description', 'timestamp'}
 
     try:
         if 'amount' in data:
@@ -212,27 +284,54 @@ def update_transaction(tx_id):
     if not update_fields:
         return jsonify({'error': 'No valid fields to update'}), 400
 
-    result = transactions_collection().update_one(
-        {'_id': ObjectId(tx_id), 'account_id': account_id},
-        {'$set': update_fields}
-    )
-
-    if result.matched_count == 0:
+    try:
+        tx_filter = {'_id': ObjectId(tx_id), 'account_id': account_id}
+    except InvalidId:
         return jsonify({'error': 'Transaction not found or access denied'}), 404
 
+    # Derived fields depend on the stored document, so they are computed from a
+    # read and written only if the document is still exactly what was read.
+    # The update's pre-image is then the `before` the ledger reverses.
+    for _ in range(UPDATE_ATTEMPTS):
+        before = transactions_collection().find_one(tx_filter)
+        if before is None:
+            return jsonify({'error': 'Transaction not found or access denied'}), 404
+
+        after = {**before, **update_fields}
+        fallback_rate = write_time_rate(before)
+        if fallback_rate is None and before.get('currency') != 'USD':
+            fallback_rate = get_user_khr_rates_on(account_id, [to_local_date(after['timestamp'])])[0]
+        enrich(after, fallback_rate)
+
+        # Every field of `before` is part of the filter: any concurrent change misses and retries.
+        pre_image = transactions_collection().find_one_and_update(
+            before,
+            {'$set': {**update_fields, **{k: after[k] for k in DERIVED_FIELDS}}},
+            return_document=ReturnDocument.BEFORE
+        )
+        if pre_image is not None:
+            break
+    else:
+        return jsonify({'error': 'Transaction is being modified concurrently, please retry'}), 409
+
+    ledger.record_updated(get_db(), pre_image, after)
+
     return jsonify({'message': 'Transaction updated successfully'})
 
 
 @transactions_bp.route('/<tx_id>', methods=['DELETE'])
 @auth_required(min_role="user")
+@bumps_data_version
 def delete_transaction(tx_id):
     try:
         account_id = get_account_id()
-        result = transactions_collection().delete_one({'_id': ObjectId(tx_id), 'account_id': account_id})
+        deleted = transactions_collection().find_one_and_delete({'_id': ObjectId(tx_id), 'account_id': account_id})
 
-        if result.deleted_count == 0:
+        if deleted is None:
             return jsonify({'error': 'Transaction not found'}), 404
 
+        ledger.record_deleted(get_db(), [deleted])
+
         return jsonify({'message': 'Transaction deleted'})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
\ No newline at end of file
@@ -1,13 +1,13 @@
 from flask import Blueprint, jsonify, g, current_app, request
 from bson import ObjectId
 from requests.auth import HTTPBasicAuth
-import requests
 import jwt
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
 from app.utils.db import settings_collection, get_db
-from app.utils.auth import auth_required
+from app.utils import http_client, shared_cache
+from app.utils.auth import auth_required, invalidate_token_cache_by_account
 from app.utils.serializers import serialize_profile
 from app.models import User
 
@@ -16,6 +16,30 @@ UTC_TZ = ZoneInfo("UTC")
 BIFROST_TIMEOUT = 60
 
 
+def _purge_account_data(db, account_id_str):
+    """Deletes every local document of an account and drops it from this and other workers' auth caches."""
+    account_id_obj = ObjectId(account_id_str)
+    db.transactions.delete_many({"account_id": account_id_obj})
+    db.debts.delete_many({"account_id": account_id_obj})
+    db.balances.delete_one({"account_id": account_id_obj})
+    db.daily_rollups.delete_many({"account_id": account_id_obj})
+    db.balance_checkpoints.delete_many({"account_id": account_id_obj})
+    db.checkpoint_epochs.delete_one({"account_id": account_id_obj})
+    db.keyword_stats.delete_many({"account_id": account_id_obj})
+    db.reminders.delete_many({"account_id": account_id_obj})
+    db.pending_imports.delete_many({"account_id": account_id_str})
+    db.pending_import_rows.delete_many({"account_id": account_id_str})
+    db.settings.delete_one({"account_id": account_id_obj})
+    _invalidate_account_caches(account_id_str)
+
+
+def _invalidate_account_caches(account_id_str):
+    # Same events as a role change: cached tokens and the cached profile go on every worker.
+    invalidate_token_cache_by_account(account_id_str)
+    if shared_cache.enabled():
+        shared_cache.invalidate_profile(account_id_str)
+
+
 @users_bp.route('/me', methods=['GET'])
 @auth_required(min_role="user")
 def get_my_profile():
@@ -150,7 +174,8 @@ def update_me():
 
         try:
             auth = HTTPBasicAuth(config["BIFROST_CLIENT_ID"], config["BIFROST_CLIENT_SECRET"])
-            resp = requests.post(url, json=bifrost_updates, auth=auth, timeout=BIFROST_TIMEOUT)
+            resp = http_client.post(http_client.BIFROST, url, json=bifrost_updates, auth=auth,
+                                    endpoint='update-identity', timeout=BIFROST_TIMEOUT)
 
             if resp.status_code != 200:
                 # Bifrost rejected the update (e.g., username taken)
@@ -170,6 +195,8 @@ def update_me():
             {'account_id': account_id},
             {'$set': updates}
         )
+        if shared_cache.enabled():
+            shared_cache.invalidate_profile(account_id)
 
     return jsonify({
         "message": "Profile updated successfully",
@@ -206,7 +233,8 @@ def set_credentials():
 
     try:
         auth = HTTPBasicAuth(config["BIFROST_CLIENT_ID"], config["BIFROST_CLIENT_SECRET"])
-        response = requests.post(url, json=payload, auth=auth, timeout=BIFROST_TIMEOUT)
+        response = http_client.post(http_client.BIFROST, url, json=payload, auth=auth,
+                                    endpoint='update-credentials', timeout=BIFROST_TIMEOUT)
 
         if response.status_code == 200:
             return jsonify({"message": "Credentials updated successfully"})
@@ -271,10 +299,7 @@ def delete_account():
         db = get_db()
 
         # 1. Delete Local Data
-        db.transactions.delete_many({"account_id": account_id_obj})
-        db.debts.delete_many({"account_id": account_id_obj})
-        db.reminders.delete_many({"account_id": account_id_obj})
-        db.settings.delete_one({"account_id": account_id_obj})
+        _purge_account_data(db, account_id_str)
 
         # Legacy cleanup if exists
         if "users" in db.list_collection_names():
@@ -286,7 +311,9 @@ def delete_account():
         url = f"{bifrost_url}/internal/users/{account_id_str}"
 
         auth = HTTPBasicAuth(config["BIFROST_CLIENT_ID"], config["BIFROST_CLIENT_SECRET"])
-        requests.delete(url, auth=auth, timeout=BIFROST_TIMEOUT)
+        http_client.delete(http_client.BIFROST, url, auth=auth, endpoint='delete-user', timeout=BIFROST_TIMEOUT)
+        # Again, in case a request re-cached the token before Bifrost dropped the identity.
+        _invalidate_account_caches(account_id_str)
 
         return jsonify({"message": "Account permanently deleted."})
 
@@ -337,21 +364,18 @@ def admin_delete_user(target_id):
     Admin endpoint to delete a specific user.
     """
     try:
-        oid = ObjectId(target_id)
         db = get_db()
 
         # 1. Delete Local
-        db.transactions.delete_many({"account_id": oid})
-        db.debts.delete_many({"account_id": oid})
-        db.reminders.delete_many({"account_id": oid})
-        db.settings.delete_one({"account_id": oid})
+        _purge_account_data(db, target_id)
 
         # 2. Delete Identity (Bifrost)
         config = current_app.config
         bifrost_url = config.get("BIFROST_URL", "").rstrip('/')
         url = f"{bifrost_url}/internal/users/{target_id}"
         auth = HTTPBasicAuth(config["BIFROST_CLIENT_ID"], config["BIFROST_CLIENT_SECRET"])
-        requests.delete(url, auth=auth, timeout=BIFROST_TIMEOUT)
+        http_client.delete(http_client.BIFROST, url, auth=auth, endpoint='delete-user', timeout=BIFROST_TIMEOUT)
+        _invalidate_account_caches(target_id)
 
         return jsonify({"message": f"User {target_id} deleted."})
     except Exception as e:
@@ -1,82 +1,258 @@
 # web_service/app/utils/auth.py
 import requests
 import logging
-import time
+from datetime import datetime, timezone
 from functools import wraps
+import jwt
+from bson import ObjectId
 from flask import request, jsonify, g
 from requests.auth import HTTPBasicAuth
 from app.config import Config
+from app.utils import http_client, shared_cache
+from app.utils.profile import RequestProfile
+from app.utils.token_cache import REJECTED, TokenCache
 
 log = logging.getLogger(__name__)
 
-# In-memory token storage: { "token": {"data": user_data, "expires_at": timestamp} }
-_TOKEN_CACHE = {}
+# Validated tokens: { token: (user_data, expires_at) }, bounded and thread-safe.
 TOKEN_TTL = 24 * 60 * 60  # 24 hours in seconds
+_TOKEN_CACHE = TokenCache(
+    maxsize=Config.TOKEN_CACHE_SIZE,
+    ttl=TOKEN_TTL,
+    negative_ttl=Config.TOKEN_NEGATIVE_TTL
+)
+
 
 def get_cached_token_data(token):
-    cache_entry = _TOKEN_CACHE.get(token)
-    if cache_entry:
-        if time.time() < cache_entry["expires_at"]:
-            return cache_entry["data"]
-        else:
-            _TOKEN_CACHE.pop(token, None)
-    return None
-
-def set_cached_token_data(token, user_data):
-    # Basic cleanup to prevent memory leaks if the cache grows too large
-    if len(_TOKEN_CACHE) > 1000:
-        now = time.time()
-        expired = [k for k, v in _TOKEN_CACHE.items() if v['expires_at'] < now]
-        for k in expired:
-            _TOKEN_CACHE.pop(k, None)
-
-    _TOKEN_CACHE[token] = {
-        "data": user_data,
-        "expires_at": time.time() + TOKEN_TTL
-    }
+    data = _TOKEN_CACHE.get(token)
+    return None if data is REJECTED else data
+
+
+def set_cached_token_data(token, user_data, expires_at=None):
+    _TOKEN_CACHE.set(token, user_data, expires_at)
+
 
 def invalidate_token_cache(token):
-    """Removes a token from the cache (e.g., upon logout or webhook event)."""
-    _TOKEN_CACHE.pop(token, None)
+    """
+    Removes a token from the cache (e.g., upon logout or webhook event). With
+    local JWT verification on, the token would still verify by its signature,
+    so its account is stamped as well and every worker re-checks the account's
+    older tokens with Bifrost.
+    """
+    if local_verification_enabled():
+        account_id = _token_account(token)
+        if account_id:
+            invalidate_token_cache_by_account(account_id)
+    _forget_token(token)
+
+
+def _forget_token(token):
+    _TOKEN_CACHE.invalidate(token)
+    if shared_cache.enabled():
+        shared_cache.drop_token(token)
+
 
 def invalidate_token_cache_by_account(account_id):
-    """Removes all cached tokens for a specific account ID."""
-    to_remove = []
-    account_id_str = str(account_id)
-    for token, cache_entry in _TOKEN_CACHE.items():
-        if str(cache_entry["data"].get("id")) == account_id_str:
-            to_remove.append(token)
-    for token in to_remove:
-        _TOKEN_CACHE.pop(token, None)
-
-def validate_bifrost_token(token):
     """
-    Asks Bifrost: "Is this token valid?"
-    Uses Basic Auth to authenticate the Service (Finance Bot) itself.
+    Removes all cached tokens for a specific account ID. With local JWT
+    verification on, also stamps the account so tokens issued before now are
+    re-checked with Bifrost (the token itself still carries the old claims).
+    With the shared cache on, every other worker drops them too.
     """
-    if not Config.BIFROST_CLIENT_ID or not Config.BIFROST_CLIENT_SECRET:
-        log.error("CRITICAL: BIFROST_CLIENT_ID or BIFROST_CLIENT_SECRET missing.")
+    if local_verification_enabled():
+        _mark_tokens_stale(account_id)
+    _TOKEN_CACHE.invalidate_account(account_id)
+    if shared_cache.enabled():
+        shared_cache.drop_account(account_id)
+
+
+def _apply_shared_invalidation(event):
+    _TOKEN_CACHE.invalidate_account(event['account_id'])
+
+
+shared_cache.on_invalidate(_apply_shared_invalidation)
+
+
+def get_token_cache_stats():
+    return _TOKEN_CACHE.stats()
+
+
+def _token_exp(token):
+    """The JWT's own exp claim (unverified; only used to cap the cache TTL)."""
+    try:
+        return jwt.decode(token, options={'verify_signature': False}).get('exp')
+    except jwt.PyJWTError:
+        return None
+
+
+def _token_account(token):
+    """The JWT's account claim (unverified; only used to route an invalidation)."""
+    try:
+        claims = jwt.decode(token, options={'verify_signature': False})
+    except jwt.PyJWTError:
+        return None
+    return claims.get('account_id') or claims.get('sub')
+
+
+# --- Local JWT verification ---
+
+_JWKS_CLIENT = {'client': None}
+
+
+def local_verification_enabled():
+    return bool(Config.BIFROST_JWT_SECRET or Config.BIFROST_JWKS_URL)
+
+
+def _mark_tokens_stale(account_id):
+    from app.utils.db import settings_collection
+    try:
+        settings_collection().update_one(
+            {'account_id': ObjectId(account_id)},
+            {'$set': {'tokens_valid_after': datetime.now(timezone.utc)}}
+        )
+    except Exception as e:
+        log.error(f"Could not mark tokens stale for {account_id}: {e}")
+
+
+def _signing_key(token):
+    if Config.BIFROST_JWT_SECRET:
+        return Config.BIFROST_JWT_SECRET, ['HS256']
+    if _JWKS_CLIENT['client'] is None:
+        # PyJWKClient caches the key set and only refetches on an unknown kid.
+        _JWKS_CLIENT['client'] = jwt.PyJWKClient(Config.BIFROST_JWKS_URL, cache_keys=True)
+    return _JWKS_CLIENT['client'].get_signing_key_from_jwt(token).key, ['RS256', 'ES256']
+
+
+def _verify_locally(token):
+    """
+    Verifies the token's signature and expiry without calling Bifrost.
+    Returns (user_data, exp) or None if the token can't be verified locally.
+    """
+    try:
+        key, algorithms = _signing_key(token)
+        claims = jwt.decode(
+            token, key, algorithms=algorithms,
+            audience=Config.BIFROST_JWT_AUDIENCE or None,
+            issuer=Config.BIFROST_JWT_ISSUER or None,
+            # iat is required: revocation compares it with tokens_valid_after. Tokens
+            # without one go to Bifrost once and the answer is cached like any other.
+            options={'verify_aud': bool(Config.BIFROST_JWT_AUDIENCE), 'require': ['exp', 'iat']}
+        )
+    except jwt.PyJWTError as e:
+        log.warning(f"Local JWT verification failed: {e}")
+        return None
+
+    account_id = claims.get('account_id') or claims.get('sub')
+    if not account_id:
         return None
+    user_data = {
+        'id': account_id,
+        # Same claim the remote path reads; a generic `role` may belong to another app.
+        'role': claims.get('app_specific_role', 'user'),
+        'email': claims.get('email'),
+        'username': claims.get('username'),
+        'telegram_id': claims.get('telegram_id'),
+        'display_name': claims.get('display_name'),
+        'verified_locally': True,
+        'iat': claims.get('iat')
+    }
+    return user_data, claims['exp']
+
+
+def issued_before_revocation(user_data, user):
+    """True if a locally verified token predates the account's last webhook invalidation."""
+    valid_after = user.doc.get('tokens_valid_after') if user else None
+    if not valid_after:
+        return False
+    if valid_after.tzinfo is None:
+        valid_after = valid_after.replace(tzinfo=timezone.utc)
+    return user_data['iat'] < valid_after.timestamp()
+
 
+def validate_bifrost_token(token, remote=False):
+    """
+    Validates a Bifrost token. With BIFROST_JWT_SECRET or BIFROST_JWKS_URL set
+    the signature is checked locally; otherwise (or with remote=True, the
+    revocation slow path) Bifrost is asked directly.
+    """
     if not token:
         return None
+    if remote:
+        loaded = _validate_remotely(token)
+        if loaded is None or loaded is REJECTED:
+            return None
+        set_cached_token_data(token, *loaded)
+        if shared_cache.enabled():
+            shared_cache.store_token(token, *loaded, ttl=TOKEN_TTL)
+        return loaded[0]
+    return _TOKEN_CACHE.get_or_load(token, _load_token)
+
+
+def _load_token(token):
+    shared = shared_cache.enabled()
+    if shared:
+        cached = shared_cache.load_token(token)
+        if cached:
+            return cached
 
-    cached_data = get_cached_token_data(token)
-    if cached_data:
-        return cached_data
+    loaded = None
+    if local_verification_enabled():
+        loaded = _verify_locally(token)
+    if not loaded:
+        loaded = _validate_remotely(token)
+    if shared and loaded is not None and loaded is not REJECTED:
+        shared_cache.store_token(token, *loaded, ttl=TOKEN_TTL)
+    return loaded
+
+
+def _load_user(account_id):
+    """
+    The account's settings as a User, through the shared profile cache when it
+    is on. Sets g.profile_from_db when the doc was read from Mongo just now, so
+    the response cache can trust its data_version without another read.
+    """
+    from app.models import User
+    if not shared_cache.enabled():
+        g.profile_from_db = True
+        return User.get_by_account_id(account_id)
+
+    g.profile_from_db = False
+
+    def load():
+        g.profile_from_db = True
+        user = User.get_by_account_id(account_id)
+        return user.doc if user else None
+
+    doc = shared_cache.get_profile(account_id, load)
+    return User(doc) if doc else None
+
+
+def _validate_remotely(token):
+    """
+    Asks Bifrost: "Is this token valid?"
+    Uses Basic Auth to authenticate the Service (Finance Bot) itself.
+    Returns (user_data, exp), REJECTED, or None if Bifrost couldn't be asked.
+    """
+    if not Config.BIFROST_CLIENT_ID or not Config.BIFROST_CLIENT_SECRET:
+        log.error("CRITICAL: BIFROST_CLIENT_ID or BIFROST_CLIENT_SECRET missing.")
+        return None
 
     try:
         url = f"{Config.BIFROST_URL}/internal/validate-token"
         auth = HTTPBasicAuth(Config.BIFROST_CLIENT_ID, Config.BIFROST_CLIENT_SECRET)
         payload = {"jwt": token}
 
-        response = requests.post(url, json=payload, auth=auth, timeout=Config.BIFROST_TIMEOUT)
+        # Validation has no side effects, so it is retried like a GET.
+        response = http_client.post(
+            http_client.BIFROST, url, json=payload, auth=auth,
+            endpoint='validate-token', timeout=Config.BIFROST_VALIDATE_TIMEOUT, idempotent=True
+        )
 
         if response.status_code == 200:
             data = response.json()
             if not data.get('is_valid'):
                 log.warning(f"Bifrost rejected token. Reason: {data.get('reason', 'Unknown')}")
-                return None
+                return REJECTED
 
             user_data = {
                 'id': data.get('account_id'),
@@ -86,11 +262,10 @@ def validate_bifrost_token(token):
                 'telegram_id': data.get('telegram_id'),
                 'display_name': data.get('display_name')
             }
-            set_cached_token_data(token, user_data)
-            return user_data
+            return user_data, _token_exp(token)
 
         log.error(f"Bifrost Validation Failed. HTTP {response.status_code}: {response.text}")
-        return None
+        return REJECTED if response.status_code in (400, 401, 403) else None
 
     except requests.exceptions.ConnectionError:
         log.error(f"Could not connect to Bifrost at {Config.BIFROST_URL}. Is the service running?")
@@ -128,9 +303,17 @@ def auth_required(min_role=None):
             # 2. Lazy Provisioning (Sync Local DB)
             from app.models import User
             account_id = bifrost_user.get('id')
-            user = User.get_by_account_id(account_id)
+            user = _load_user(account_id)
+            if not user and bifrost_user.get('verified_locally'):
+                # A deleted account's settings (and tokens_valid_after with them) are
+                # gone, but its tokens still verify locally. Ask Bifrost before provisioning.
+                _forget_token(token)
+                bifrost_user = validate_bifrost_token(token, remote=True)
+                if not bifrost_user:
+                    return jsonify({'message': 'Invalid or Expired Bifrost Token'}), 401
             if not user:
                 log.info(f"Provisioning local user for Bifrost Account: {account_id}")
+                g.profile_from_db = True
                 user = User.create(
                     account_id=account_id,
                     role=bifrost_user.get('role', 'user'),
@@ -140,6 +323,14 @@ def auth_required(min_role=None):
                     display_name=bifrost_user.get('display_name')
                 )
 
+            # 2b. Revocation slow path: a webhook changed this account after the
+            # token was issued, so its claims may be stale. Ask Bifrost.
+            if bifrost_user.get('verified_locally') and issued_before_revocation(bifrost_user, user):
+                _forget_token(token)
+                bifrost_user = validate_bifrost_token(token, remote=True)
+                if not bifrost_user:
+                    return jsonify({'message': 'Invalid or Expired Bifrost Token'}), 401
+
             # 3. Role Hierarchy Check
             user_role = bifrost_user.get('role', 'user')
             if min_role:
@@ -158,6 +349,7 @@ def auth_required(min_role=None):
 
             # 4. Set Context
             g.user = user
+            g.profile = RequestProfile(user)
             g.account_id = account_id
             g.role = user_role
             g.email = bifrost_user.get('email')
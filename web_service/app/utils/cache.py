@@ -0,0 +1,121 @@
+# web_service/app/utils/cache.py
+import logging
+import threading
+from datetime import datetime
+from functools import wraps
+from zoneinfo import ZoneInfo
+from bson import ObjectId
+from cachetools import TTLCache
+from flask import request, g, make_response, current_app
+
+from app.config import Config
+from app.utils.db import settings_collection
+from app.utils import shared_cache
+from app.services import fx
+
+log = logging.getLogger(__name__)
+
+# Read-side response cache keyed by (endpoint, account_id, data_version, local
+# date, live KHR rate, params). The date resolves relative periods ("today",
+# "this_week") and the rate feeds every USD conversion, so neither a midnight
+# rollover nor a rate refresh serves an old response.
+# TTLCache evicts least-recently-used entries once full, so this is LRU + TTL.
+_RESPONSE_CACHE = TTLCache(maxsize=Config.RESPONSE_CACHE_SIZE, ttl=Config.RESPONSE_CACHE_TTL)
+_LOCK = threading.Lock()
+_STATS = {'hits': 0, 'misses': 0}
+
+
+PHNOM_PENH_TZ = ZoneInfo("Asia/Phnom_Penh")
+
+
+def get_data_version():
+    """
+    The account's current data version. Taken from g.user when auth_required
+    read the profile from Mongo during this request; a profile served by the
+    shared cache may predate another worker's write, so then settings is asked.
+    """
+    account_id = getattr(g, 'account_id', None)
+    if not account_id:
+        return 0
+    user = getattr(g, 'user', None)
+    if user is not None and g.get('profile_from_db'):
+        return user.doc.get('data_version', 0)
+    doc = settings_collection().find_one({'account_id': ObjectId(account_id)}, {'data_version': 1, '_id': 0})
+    return (doc or {}).get('data_version', 0)
+
+
+def bump_data_version(account_id):
+    """Increments the account's data version so every cached read for it goes stale."""
+    try:
+        settings_collection().update_one({'account_id': ObjectId(account_id)}, {'$inc': {'data_version': 1}})
+    except Exception as e:
+        log.error(f"Failed to bump data version for {account_id}: {e}")
+    if shared_cache.enabled():
+        shared_cache.invalidate_profile(account_id)
+
+
+def bumps_data_version(f):
+    """Marks a mutating route: bumps the account's data version after a successful response."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        if response.status_code < 400 and getattr(g, 'account_id', None):
+            bump_data_version(g.account_id)
+        return response
+    return decorated_function
+
+
+def account_cached(f):
+    """
+    Caches successful responses per (endpoint, account, data version, local
+    date, live rate, query params). Must sit below auth_required so
+    g.account_id is populated.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not Config.RESPONSE_CACHE_ENABLED:
+            return f(*args, **kwargs)
+
+        version = get_data_version()
+        key = (
+            request.endpoint,
+            str(g.account_id),
+            version,
+            datetime.now(PHNOM_PENH_TZ).date(),
+            fx.current_rate(),
+            tuple(sorted(request.args.items(multi=True))),
+            tuple(sorted(kwargs.items()))
+        )
+
+        with _LOCK:
+            cached = _RESPONSE_CACHE.get(key)
+            _STATS['hits' if cached else 'misses'] += 1
+
+        if cached:
+            body, status, mimetype = cached
+            return current_app.response_class(body, status=status, mimetype=mimetype)
+
+        response = make_response(f(*args, **kwargs))
+        # A profile loaded before the latest write may have fed this response; serve it but don't keep it.
+        user = getattr(g, 'user', None)
+        fresh_profile = user is None or user.doc.get('data_version', 0) == version
+        if response.status_code == 200 and fresh_profile:
+            with _LOCK:
+                _RESPONSE_CACHE[key] = (response.get_data(), response.status_code, response.mimetype)
+        return response
+    return decorated_function
+
+
+def get_cache_stats():
+    with _LOCK:
+        hits, misses = _STATS['hits'], _STATS['misses']
+        size = len(_RESPONSE_CACHE)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+        'size': size,
+        'max_size': _RESPONSE_CACHE.maxsize,
+        'ttl_seconds': _RESPONSE_CACHE.ttl
+    }
@@ -1,38 +1,52 @@
 import logging
-import requests
-from flask import current_app
-from cachetools import cached, TTLCache
+from app.services import fx
+from app.services.enrichment import to_local_date
+from app.utils.db import settings_collection
+from app.utils.profile import current_profile
 
 log = logging.getLogger(__name__)
 
 
-# Cache the API response for 1 hour
-@cached(cache=TTLCache(maxsize=1, ttl=3600))
 def get_live_usd_to_khr_rate():
     """
-    Fetches the live USD to KHR exchange rate from the API.
-    Defaults to 4100.0 on failure.
+    Returns the live USD to KHR exchange rate without blocking on the network
+    once any rate is known (see services/fx.py). Defaults to 4100.0 until then.
     """
-    api_key = current_app.config.get('EXCHANGERATE_API_KEY')
-    if not api_key:
-        log.warning("EXCHANGERATE_API_KEY not set. Using default rate of 4100.")
-        return 4100.0
+    return fx.current_rate()
 
-    url = f"https://v6.exchangerate-api.com/v6/{api_key}/latest/USD"
 
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
+def get_user_fixed_rate(account_id):
+    """The user's fixed KHR rate, or None if they follow the live rate."""
+    profile = current_profile(account_id)
+    if profile is not None:
+        return profile.fixed_rate
 
-        if data.get('result') == 'success':
-            rate = data.get('conversion_rates', {}).get('KHR')
-            if rate:
-                log.info(f"Live rate fetched: 1 USD = {rate} KHR")
-                return float(rate)
+    doc = settings_collection().find_one(
+        {'account_id': account_id},
+        {'settings.rate_preference': 1, 'settings.fixed_rate': 1}
+    )
+    if doc and 'settings' in doc:
+        settings = doc['settings']
+        if settings.get('rate_preference') == 'fixed':
+            rate = float(settings.get('fixed_rate', 4100.0))
+            if rate > 0:
+                return rate
+    return None
 
-    except requests.exceptions.RequestException as e:
-        log.error(f"Could not fetch exchange rate: {e}")
 
-    log.warning("Using default rate of 4100 due to API failure.")
-    return 4100.0
\ No newline at end of file
+def get_user_khr_rate(account_id):
+    """Fetches the user's preferred KHR rate (fixed or live)."""
+    return get_user_fixed_rate(account_id) or get_live_usd_to_khr_rate()
+
+
+def get_user_khr_rates_on(account_id, local_dates):
+    """The user's preferred KHR rate for each local date: fixed, or the historical rate of that day."""
+    fixed = get_user_fixed_rate(account_id)
+    if fixed:
+        return [fixed] * len(local_dates)
+    return fx.rates_on(local_dates)
+
+
+def get_usd_to_khr_rate_at(ts):
+    """Market rate for a transaction timestamp: live for today, historical for backdated ones."""
+    return fx.rate_on(to_local_date(ts))
@@ -1,26 +1,87 @@
 # web_service/app/utils/db.py
 import logging
+import threading
+import time
 import certifi
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import MongoClient
 from flask import current_app, g
 
+from app.config import Config
+from app.utils import indexes
+from app.utils.db_metrics import COMMANDS, POOL
+
 log = logging.getLogger(__name__)
 
+_CLIENT = {'client': None}
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client():
+    """
+    The process-wide MongoClient, created on first use. Routes and scheduled
+    jobs share its connection pool, so no job pays for its own TLS handshake.
+    """
+    with _CLIENT_LOCK:
+        if _CLIENT['client'] is None:
+            _CLIENT['client'] = MongoClient(
+                Config.MONGODB_URI,
+                tls=True,
+                tlsCAFile=certifi.where(),
+                maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+                minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=Config.MONGO_MAX_IDLE_TIME_MS,
+                compressors=Config.MONGO_COMPRESSORS or None,
+                serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=Config.MONGO_CONNECT_TIMEOUT_MS,
+                waitQueueTimeoutMS=Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                event_listeners=[POOL, COMMANDS]
+            )
+        return _CLIENT['client']
+
+
+def get_database():
+    """The application database, for code running outside a request (scheduled jobs, threads)."""
+    return get_client()[Config.DB_NAME]
+
+
+# Index sync retries after a failed boot connection: attempts and seconds between them.
+BOOT_RETRY_ATTEMPTS = 10
+BOOT_RETRY_DELAY = 30
+
+
 def init_db(app):
-    """Initializes the global database connection and indexes."""
+    """
+    Attaches the shared database to the app and initializes indexes. Mongo
+    being unreachable at boot does not fail app creation: the client
+    connects lazily once Mongo is back, and index sync is retried in the
+    background.
+    """
+    app.db = get_database()
+    if _connect_and_sync(app.db):
+        return
+    indexes.mark_failed("MongoDB unreachable at startup")
+    threading.Thread(target=_retry_boot_sync, args=(app.db,), name='db-boot-retry', daemon=True).start()
+
+
+def _connect_and_sync(db):
     try:
-        client = MongoClient(
-            app.config['MONGODB_URI'],
-            tls=True,
-            tlsCAFile=certifi.where(),
-            maxPoolSize=50
-        )
-        app.db = client[app.config['DB_NAME']]
-        init_db_indexes(app.db)
-        log.info("Successfully connected to MongoDB and initialized indexes.")
+        # Establishes the first connection now; the driver then fills the pool up to minPoolSize in the background.
+        db.command('ping')
     except Exception as e:
         log.error(f"Failed to connect to MongoDB: {e}")
-        raise
+        return False
+    init_db_indexes(db)
+    log.info("Successfully connected to MongoDB and initialized indexes.")
+    return True
+
+
+def _retry_boot_sync(db):
+    for attempt in range(1, BOOT_RETRY_ATTEMPTS + 1):
+        time.sleep(BOOT_RETRY_DELAY)
+        if _connect_and_sync(db):
+            return
+        log.warning(f"MongoDB still unreachable after boot (retry {attempt}/{BOOT_RETRY_ATTEMPTS}).")
+    log.error("Giving up on index sync after boot; run `flask sync-indexes` once MongoDB is reachable.")
 
 
 def get_db():
@@ -28,27 +89,13 @@ def get_db():
     return current_app.db
 
 
-def init_db_indexes(db):
-    """Creates required MongoDB indexes to ensure O(1) read performance and enforce uniqueness."""
+def init_db_indexes(db, force=False):
+    """Syncs the indexes declared in utils/indexes.py; skipped when their fingerprint is unchanged."""
     try:
-        # Core application indexes
-        db.transactions.create_index([("account_id", ASCENDING), ("timestamp", DESCENDING)])
-        db.transactions.create_index([("account_id", ASCENDING), ("status", ASCENDING)])
-
-        # UNIQUE index for bank statement imports to prevent duplicate processing.
-        # sparse=True allows manually entered transactions without a bank_reference_id to bypass the unique check.
-        db.transactions.create_index(
-            [("account_id", ASCENDING), ("bank_reference_id", ASCENDING)],
-            unique=True,
-            sparse=True
-        )
-
-        db.debts.create_index([("account_id", ASCENDING), ("status", ASCENDING)])
-        db.users.create_index([("account_id", ASCENDING)], unique=True)
-        db.settings.create_index([("account_id", ASCENDING)], unique=True)
-
-        log.info("Database indexes verified/created successfully.")
+        if indexes.ensure(db, force=force) and indexes.status()['state'] == 'synced':
+            log.info("Database indexes verified/created successfully.")
     except Exception as e:
+        indexes.mark_failed(e)
         log.error(f"Error creating database indexes: {e}")
 
 def close_db(e=None):
@@ -0,0 +1,247 @@
+# web_service/app/utils/db_metrics.py
+# pymongo event listeners behind /internal/metrics/db. The pool listener
+# measures how long threads wait to check a connection out of the shared
+# client's pool; a growing wait means MONGO_MAX_POOL_SIZE is too small for
+# the worker's concurrency.
+#
+# The command profiler tags every command with the Flask endpoint (or job
+# thread) that issued it and keeps a rolling window of durations per
+# (endpoint, command, collection). Commands slower than DB_SLOW_MS are kept
+# in a short slow log together with their query plan, fetched by a
+# background `explain` at most once per key every DB_EXPLAIN_INTERVAL seconds.
+
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timezone
+from flask import has_request_context, request
+from pymongo import monitoring
+
+from app.config import Config
+
+log = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds; the last bucket catches everything slower.
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, float('inf'))
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._wait_buckets = [0] * len(WAIT_BUCKETS_MS)
+        self._wait_total_ms = 0.0
+        self._wait_max_ms = 0.0
+        self._counts = Counter()
+        self._failures = Counter()
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    # Check-out started and finished events fire on the requesting thread,
+    # so the start time is kept thread-locally.
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, 'started', None)
+        if started is None:
+            return
+        waited = (time.perf_counter() - started) * 1000
+        self._local.started = None
+        with self._lock:
+            self._counts['checked_out'] += 1
+            self._wait_total_ms += waited
+            self._wait_max_ms = max(self._wait_max_ms, waited)
+            for i, bound in enumerate(WAIT_BUCKETS_MS):
+                if waited <= bound:
+                    self._wait_buckets[i] += 1
+                    break
+
+    def connection_check_out_failed(self, event):
+        self._local.started = None
+        with self._lock:
+            self._failures[str(event.reason)] += 1
+
+    def connection_checked_in(self, event):
+        self._count('checked_in')
+
+    def connection_created(self, event):
+        self._count('created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count('closed')
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count('pool_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            checked_out = self._counts['checked_out']
+            return {
+                'connections_open': self._counts['created'] - self._counts['closed'],
+                'connections_in_use': checked_out - self._counts['checked_in'],
+                'checkouts': checked_out,
+                'checkout_failures': dict(self._failures),
+                'pool_cleared': self._counts['pool_cleared'],
+                'wait_avg_ms': round(self._wait_total_ms / checked_out, 2) if checked_out else None,
+                'wait_max_ms': round(self._wait_max_ms, 2),
+                'wait_buckets_ms': {
+                    ('+Inf' if bound == float('inf') else str(bound)): n
+                    for bound, n in zip(WAIT_BUCKETS_MS, self._wait_buckets)
+                }
+            }
+
+
+POOL = PoolListener()
+
+
+# --- Command profiler ---
+
+EXPLAINABLE = {'find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify'}
+# Driver-added fields that `explain` rejects inside the wrapped command.
+_SESSION_FIELDS = {'lsid', 'txnNumber', '$clusterTime', '$db', '$readPreference', 'readConcern',
+                   'writeConcern', 'autocommit', 'startTransaction'}
+SLOW_LOG_SIZE = 50
+
+
+def _percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+
+def _collection(event):
+    if event.command_name == 'getMore':
+        return event.command.get('collection', '<unknown>')
+    target = event.command.get(event.command_name)
+    return target if isinstance(target, str) else '<db>'
+
+
+def _docs(event):
+    reply = event.reply or {}
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or [])
+    if 'values' in reply:
+        return len(reply['values'])
+    return reply.get('n', 0)
+
+
+def _caller():
+    if has_request_context():
+        return request.endpoint or '<unmatched>'
+    return f"thread:{threading.current_thread().name}"
+
+
+class CommandProfiler(monitoring.CommandListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # (request_id, connection_id) -> (endpoint, command, collection, database, command doc)
+        self._windows = defaultdict(lambda: deque(maxlen=Config.DB_PROFILER_WINDOW))
+        self._totals = defaultdict(Counter)
+        self._slow = deque(maxlen=SLOW_LOG_SIZE)
+        self._explained_at = {}
+
+    def started(self, event):
+        if not Config.DB_PROFILER_ENABLED or event.command_name == 'explain':
+            return
+        doc = event.command if event.command_name in EXPLAINABLE else None
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = (
+                _caller(), event.command_name, _collection(event), event.database_name, doc
+            )
+
+    def _finish(self, event, docs, failed):
+        with self._lock:
+            pending = self._pending.pop((event.request_id, event.connection_id), None)
+        if pending is None:
+            return
+        endpoint, command, collection, database, doc = pending
+        key = (endpoint, command, collection)
+        ms = event.duration_micros / 1000
+        with self._lock:
+            self._windows[key].append(ms)
+            totals = self._totals[key]
+            totals['count'] += 1
+            totals['docs'] += docs
+            totals['failures'] += failed
+        if ms >= Config.DB_SLOW_MS:
+            self._record_slow(key, ms, docs, database, doc)
+
+    def succeeded(self, event):
+        self._finish(event, _docs(event), failed=False)
+
+    def failed(self, event):
+        self._finish(event, 0, failed=True)
+
+    def _record_slow(self, key, ms, docs, database, doc):
+        entry = {
+            'endpoint': key[0], 'command': key[1], 'collection': key[2],
+            'duration_ms': round(ms, 1), 'docs': docs,
+            'at': datetime.now(timezone.utc).isoformat(), 'plan': None
+        }
+        now = time.monotonic()
+        with self._lock:
+            self._slow.append(entry)
+            due = doc is not None and now - self._explained_at.get(key, -Config.DB_EXPLAIN_INTERVAL) \
+                >= Config.DB_EXPLAIN_INTERVAL
+            if due:
+                self._explained_at[key] = now
+        if due:
+            command = {k: v for k, v in doc.items() if k not in _SESSION_FIELDS}
+            threading.Thread(target=self._explain, args=(entry, database, command),
+                             name='db-explain', daemon=True).start()
+
+    @staticmethod
+    def _explain(entry, database, command):
+        from app.utils.db import get_client
+        try:
+            result = get_client()[database].command({'explain': command, 'verbosity': 'queryPlanner'})
+        except Exception as e:
+            log.warning(f"Could not explain slow {entry['command']} on {entry['collection']}: {e}")
+            entry['plan'] = {'error': str(e)}
+            return
+        planner = result.get('queryPlanner') or next(
+            (stage.get('$cursor', {}).get('queryPlanner') for stage in result.get('stages', [])
+             if '$cursor' in stage), None) or {}
+        entry['plan'] = {
+            'namespace': planner.get('namespace'),
+            'winningPlan': planner.get('winningPlan'),
+            'rejectedPlans': len(planner.get('rejectedPlans', []))
+        }
+
+    def stats(self):
+        with self._lock:
+            snapshot = [(key, sorted(window), dict(self._totals[key])) for key, window in self._windows.items()]
+            slow = list(self._slow)
+        commands = []
+        for (endpoint, command, collection), durations, totals in snapshot:
+            if not durations:
+                continue
+            commands.append({
+                'endpoint': endpoint, 'command': command, 'collection': collection,
+                'count': totals.get('count', 0), 'failures': totals.get('failures', 0),
+                'avg_docs': round(totals.get('docs', 0) / totals['count'], 1) if totals.get('count') else 0,
+                'p50_ms': round(_percentile(durations, 50), 2),
+                'p95_ms': round(_percentile(durations, 95), 2),
+                'p99_ms': round(_percentile(durations, 99), 2),
+                'max_ms': round(durations[-1], 2)
+            })
+        commands.sort(key=lambda c: c['p95_ms'], reverse=True)
+        return {'commands': commands, 'slow': list(reversed(slow))}
+
+
+COMMANDS = CommandProfiler()
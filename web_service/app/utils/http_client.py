@@ -0,0 +1,229 @@
+# web_service/app/utils/http_client.py
+# Shared outbound HTTP client. Each upstream (Bifrost, Telegram, the exchange
+# rate API) gets one keep-alive requests.Session with a bounded connection
+# pool, so calls reuse TCP+TLS connections instead of handshaking every time.
+#
+# Every call has a total time budget. Failed attempts are retried a bounded
+# number of times with full-jitter backoff: any failure for idempotent calls,
+# and only failures where the request never left this process for the rest.
+# A per-upstream circuit breaker opens after consecutive failures and fails
+# calls immediately until a cooldown passes, then lets one trial through.
+# Latency is recorded per (upstream, endpoint) as a fixed-bucket histogram.
+
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from app.config import Config
+
+log = logging.getLogger(__name__)
+
+BIFROST = 'bifrost'
+TELEGRAM = 'telegram'
+EXCHANGE_RATE = 'exchangerate'
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'}
+RETRY_STATUSES = {502, 503, 504}
+BACKOFF_BASE = 0.2
+BACKOFF_CAP = 2.0
+
+# Upper bounds in milliseconds; the last bucket catches everything slower.
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float('inf'))
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without a network call while an upstream's breaker is open."""
+
+
+class _Breaker:
+    def __init__(self, failures, cooldown):
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True  # half-open: let one call probe the upstream
+            return True
+
+    def record(self, ok):
+        with self.lock:
+            self.trial_in_flight = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    log.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half_open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+
+class _Upstream:
+    def __init__(self, name):
+        self.name = name
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=Config.HTTP_POOL_SIZE, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.breaker = _Breaker(Config.HTTP_BREAKER_FAILURES, Config.HTTP_BREAKER_COOLDOWN)
+
+
+_UPSTREAMS = {}
+_UPSTREAMS_LOCK = threading.Lock()
+
+_HISTOGRAMS = defaultdict(lambda: {
+    'buckets': [0] * len(LATENCY_BUCKETS_MS), 'count': 0, 'sum_ms': 0.0, 'errors': 0,
+    'retries': 0, 'short_circuited': 0
+})
+_STATS_LOCK = threading.Lock()
+
+
+def _upstream(name):
+    with _UPSTREAMS_LOCK:
+        if name not in _UPSTREAMS:
+            _UPSTREAMS[name] = _Upstream(name)
+        return _UPSTREAMS[name]
+
+
+def _observe(key, elapsed_ms=None, error=False, retry=False, short_circuited=False):
+    with _STATS_LOCK:
+        h = _HISTOGRAMS[key]
+        if elapsed_ms is not None:
+            h['count'] += 1
+            h['sum_ms'] += elapsed_ms
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if elapsed_ms <= bound:
+                    h['buckets'][i] += 1
+                    break
+        h['errors'] += error
+        h['retries'] += retry
+        h['short_circuited'] += short_circuited
+
+
+def _never_sent(exc):
+    """True if the request failed before any byte reached the upstream, so retrying can't duplicate it."""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _backoff(attempt, deadline):
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    if time.monotonic() + delay >= deadline:
+        return False
+    time.sleep(delay)
+    return True
+
+
+def request(upstream, method, url, *, endpoint, timeout, retries=None, idempotent=None, **kwargs):
+    """
+    Sends one logical request through `upstream`'s pooled session.
+
+    `endpoint` is the low-cardinality name latency is recorded under (never
+    the URL, which may carry ids or the bot token). `timeout` is the total
+    budget in seconds across all attempts. `idempotent` defaults to the HTTP
+    method's semantics; pass True for POSTs that are safe to repeat. Raises
+    requests exceptions like requests.request does, and CircuitOpenError
+    while the upstream's breaker is open.
+    """
+    up = _upstream(upstream)
+    key = f"{upstream}:{endpoint}"
+    method = method.upper()
+    retries = Config.HTTP_RETRIES if retries is None else retries
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    deadline = time.monotonic() + timeout
+
+    attempt = 0
+    while True:
+        if not up.breaker.allow():
+            _observe(key, short_circuited=True)
+            raise CircuitOpenError(f"Circuit open for {upstream}; failing fast")
+
+        remaining = deadline - time.monotonic()
+        started = time.perf_counter()
+        ok, settled = False, False
+        try:
+            response = up.session.request(
+                method, url, timeout=(min(Config.HTTP_CONNECT_TIMEOUT, remaining), remaining), **kwargs
+            )
+            ok = response.status_code < 500
+        except requests.exceptions.RequestException as e:
+            _observe(key, (time.perf_counter() - started) * 1000, error=True)
+            up.breaker.record(ok=False)
+            settled = True
+            retryable = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)) \
+                and (idempotent or _never_sent(e))
+            if attempt < retries and retryable and _backoff(attempt, deadline):
+                attempt += 1
+                _observe(key, retry=True)
+                continue
+            raise
+        finally:
+            # Any other exception (a hook bug, KeyboardInterrupt) still settles the
+            # attempt, so a half-open breaker's trial can't stay in flight forever.
+            if not settled:
+                up.breaker.record(ok=ok)
+
+        _observe(key, (time.perf_counter() - started) * 1000, error=not ok)
+        if not ok and idempotent and response.status_code in RETRY_STATUSES \
+                and attempt < retries and _backoff(attempt, deadline):
+            attempt += 1
+            _observe(key, retry=True)
+            continue
+        return response
+
+
+def get(upstream, url, **kwargs):
+    return request(upstream, 'GET', url, **kwargs)
+
+
+def post(upstream, url, **kwargs):
+    return request(upstream, 'POST', url, **kwargs)
+
+
+def delete(upstream, url, **kwargs):
+    return request(upstream, 'DELETE', url, **kwargs)
+
+
+def get_http_stats():
+    """Per-endpoint latency histograms plus each upstream's breaker state."""
+    with _STATS_LOCK:
+        endpoints = {
+            key: {
+                **{k: v for k, v in h.items() if k != 'buckets'},
+                'avg_ms': round(h['sum_ms'] / h['count'], 1) if h['count'] else None,
+                'buckets_ms': {
+                    ('+Inf' if bound == float('inf') else str(bound)): n
+                    for bound, n in zip(LATENCY_BUCKETS_MS, h['buckets'])
+                }
+            }
+            for key, h in _HISTOGRAMS.items()
+        }
+    with _UPSTREAMS_LOCK:
+        upstreams = {
+            name: {'breaker': up.breaker.state(), 'consecutive_failures': up.breaker.failures}
+            for name, up in _UPSTREAMS.items()
+        }
+    return {'upstreams': upstreams, 'endpoints': endpoints}
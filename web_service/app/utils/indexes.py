@@ -0,0 +1,244 @@
+# web_service/app/utils/indexes.py
+# Declarative index spec. INDEXES is the single source of truth for every
+# index the app relies on. Boot compares a fingerprint of the spec with the
+# one stored after the last successful sync and skips index creation when
+# nothing changed; `flask diff-indexes` compares the live indexes with the
+# spec, and `flask index-usage` reports $indexStats access counts.
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.services.pending_imports import TTL_SECONDS as PENDING_IMPORT_TTL
+
+log = logging.getLogger(__name__)
+
+META_COLLECTION = 'schema_meta'
+FINGERPRINT_ID = 'indexes'
+# Options that make two indexes on the same keys different.
+COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+# createIndexes errors for an existing index on the same keys (or name) with other options.
+OPTION_CONFLICT_CODES = {85, 86}
+
+# Outcome of the last sync in this process, for /internal/metrics/db and `flask sync-indexes`.
+_STATUS = {'state': 'not_synced', 'failed': {}, 'checked_at': None}
+
+INDEXES = {
+    'transactions': [
+        # _id breaks timestamp ties so keyset pagination can walk this index without a sort stage.
+        IndexModel([("account_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("account_id", ASCENDING), ("status", ASCENDING)]),
+        # Multikey index serving whole-word keyword search on the tokens array.
+        IndexModel([("account_id", ASCENDING), ("tokens", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("account_id", ASCENDING), ("category_key", ASCENDING), ("timestamp", DESCENDING)]),
+        # UNIQUE index for bank statement imports to prevent duplicate processing.
+        # Partial, not sparse: a sparse compound index still indexes every row with an
+        # account_id (a missing reference as null), so manual entries would collide.
+        IndexModel([("account_id", ASCENDING), ("bank_reference_id", ASCENDING)], unique=True,
+                   partialFilterExpression={"bank_reference_id": {"$type": "string"}}),
+        # Duplicate pre-check for imported rows without a reference ID (services/import_duplicates.py).
+        IndexModel([("account_id", ASCENDING), ("content_hash", ASCENDING)], sparse=True),
+    ],
+    'debts': [
+        IndexModel([("account_id", ASCENDING), ("status", ASCENDING)]),
+        # Per-person lookups and lump-sum repayments filter on all of these and sort oldest first.
+        IndexModel([("account_id", ASCENDING), ("type", ASCENDING), ("person", ASCENDING),
+                    ("status", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    'balances': [
+        IndexModel([("account_id", ASCENDING)], unique=True),
+    ],
+    'daily_rollups': [
+        IndexModel([("account_id", ASCENDING), ("date", ASCENDING), ("type", ASCENDING),
+                    ("categoryId", ASCENDING), ("currency", ASCENDING)], unique=True),
+    ],
+    'balance_checkpoints': [
+        IndexModel([("account_id", ASCENDING), ("month", ASCENDING)], unique=True),
+        IndexModel([("account_id", ASCENDING), ("end_utc", DESCENDING)]),
+    ],
+    'checkpoint_epochs': [
+        IndexModel([("account_id", ASCENDING)], unique=True),
+    ],
+    'keyword_stats': [
+        IndexModel([("account_id", ASCENDING), ("month", ASCENDING), ("category", ASCENDING),
+                    ("keyword", ASCENDING)], unique=True),
+    ],
+    'fx_rates': [
+        IndexModel([("date", ASCENDING)], unique=True),
+    ],
+    # Shared auth cache (SHARED_AUTH_CACHE=mongo): TTL indexes expire entries and events.
+    'auth_cache': [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+        IndexModel([("account_id", ASCENDING)]),
+    ],
+    'auth_events': [
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=3600),
+    ],
+    # Statement imports awaiting review; both expire pending_imports.TTL_SECONDS after upload.
+    'pending_imports': [
+        IndexModel([("session_id", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=PENDING_IMPORT_TTL),
+    ],
+    'pending_import_rows': [
+        IndexModel([("session_id", ASCENDING), ("seq", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=PENDING_IMPORT_TTL),
+    ],
+    'reminders': [
+        IndexModel([("reminder_datetime", ASCENDING)]),
+    ],
+    'users': [
+        IndexModel([("account_id", ASCENDING)], unique=True),
+    ],
+    'settings': [
+        IndexModel([("account_id", ASCENDING)], unique=True),
+        # User.find_by_telegram_id / User.find_by_email
+        IndexModel([("telegram_id", ASCENDING)]),
+        IndexModel([("email", ASCENDING)]),
+    ],
+}
+
+
+def _spec(model):
+    """(key, options) of an IndexModel in the same shape as a live index."""
+    doc = model.document
+    return list(doc['key'].items()), {k: doc[k] for k in COMPARED_OPTIONS if k in doc}
+
+
+def _live(info):
+    return [tuple(k) for k in info['key']], {k: info[k] for k in COMPARED_OPTIONS if k in info}
+
+
+def fingerprint():
+    canonical = {
+        coll: sorted(json.dumps(_spec(m), sort_keys=True, default=str) for m in models)
+        for coll, models in INDEXES.items()
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+
+def ensure(db, force=False):
+    """
+    Creates the spec'd indexes unless the stored fingerprint says they already
+    exist. One createIndexes round trip per collection. Returns True if it synced.
+    """
+    current = fingerprint()
+    if not force:
+        stored = db[META_COLLECTION].find_one({'_id': FINGERPRINT_ID})
+        if stored and stored.get('fingerprint') == current:
+            log.info("Database indexes unchanged since last sync; skipping creation.")
+            _set_status('synced', {})
+            return False
+
+    failed = {}
+    for coll, models in INDEXES.items():
+        try:
+            db[coll].create_indexes(models)
+        except OperationFailure:
+            # One bad index fails the whole batch; build the rest one by one.
+            errors = _create_each(db[coll], models)
+            if errors:
+                failed[coll] = errors
+
+    if failed:
+        log.error(f"Index sync incomplete, fingerprint not stored; failed: {failed}")
+        _set_status('failed', failed)
+        return True
+
+    db[META_COLLECTION].update_one(
+        {'_id': FINGERPRINT_ID},
+        {'$set': {'fingerprint': current, 'synced_at': datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    _set_status('synced', {})
+    return True
+
+
+def _create_each(collection, models):
+    """
+    Creates `models` individually. An existing index on the same keys with
+    other options is dropped and rebuilt to match the spec. Returns
+    {index name: error} for the ones that still fail.
+    """
+    errors = {}
+    for model in models:
+        name = model.document['name']
+        try:
+            collection.create_indexes([model])
+            continue
+        except OperationFailure as e:
+            if e.code not in OPTION_CONFLICT_CODES:
+                errors[name] = str(e)
+                continue
+        key = list(model.document['key'].items())
+        stale = [n for n, info in collection.index_information().items()
+                 if n != '_id_' and ([tuple(k) for k in info['key']] == key or n == name)]
+        try:
+            for n in stale:
+                log.warning(f"Rebuilding index {collection.name}.{n} to match the spec")
+                collection.drop_index(n)
+            collection.create_indexes([model])
+        except OperationFailure as e:
+            errors[name] = str(e)
+    return errors
+
+
+def _set_status(state, failed):
+    _STATUS.update(state=state, failed=failed, checked_at=datetime.now(timezone.utc).isoformat())
+
+
+def mark_failed(error):
+    """Records a sync that raised before reaching any collection (e.g. Mongo unreachable)."""
+    _set_status('error', {'*': str(error)})
+
+
+def status():
+    return dict(_STATUS)
+
+
+def diff(db):
+    """
+    Per collection: spec'd indexes that are missing, live indexes that differ in
+    options, and live indexes not in the spec (`_id_` excluded).
+    """
+    report = {}
+    existing = {c for c in db.list_collection_names() if not c.startswith('system.') and c != META_COLLECTION}
+    for coll in sorted(set(INDEXES) | existing):
+        live = {name: _live(info) for name, info in db[coll].index_information().items() if name != '_id_'}
+        live_by_key = {json.dumps(key): (name, options) for name, (key, options) in live.items()}
+        missing, changed, seen = [], [], set()
+        for model in INDEXES.get(coll, []):
+            key, options = _spec(model)
+            match = live_by_key.get(json.dumps(key))
+            if match is None:
+                missing.append({'key': key, **options})
+                continue
+            seen.add(match[0])
+            if match[1] != options:
+                changed.append({'name': match[0], 'live': match[1], 'spec': options})
+        extra = sorted(set(live) - seen)
+        if missing or changed or extra:
+            report[coll] = {'missing': missing, 'changed': changed, 'extra': extra}
+    return report
+
+
+def usage(db):
+    """$indexStats per spec'd collection: {coll: [{name, ops, since, in_spec}]}, least used first."""
+    report = {}
+    for coll in sorted(INDEXES):
+        spec_keys = {json.dumps(_spec(m)[0]) for m in INDEXES[coll]}
+        try:
+            stats = list(db[coll].aggregate([{'$indexStats': {}}]))
+        except OperationFailure as e:
+            log.error(f"$indexStats failed on {coll}: {e}")
+            continue
+        rows = [{
+            'name': s['name'],
+            'ops': s['accesses']['ops'],
+            'since': s['accesses']['since'],
+            'in_spec': s['name'] == '_id_' or json.dumps([tuple(k) for k in s['key'].items()]) in spec_keys
+        } for s in stats]
+        report[coll] = sorted(rows, key=lambda r: r['ops'])
+    return report
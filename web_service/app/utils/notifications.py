@@ -1,7 +1,8 @@
-import requests
 import os
 import logging
 
+from app.utils import http_client
+
 log = logging.getLogger(__name__)
 
 def notify_user_of_upgrade(telegram_id):
@@ -33,7 +34,7 @@ def notify_user_of_upgrade(telegram_id):
     }
 
     try:
-        requests.post(url, json=payload, timeout=5)
+        http_client.post(http_client.TELEGRAM, url, json=payload, endpoint='sendMessage', timeout=5)
         log.info(f"✅ Notification sent to Telegram ID {telegram_id}")
     except Exception as e:
         log.error(f"Failed to send Telegram notification: {e}")
\ No newline at end of file
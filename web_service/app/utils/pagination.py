@@ -0,0 +1,66 @@
+# web_service/app/utils/pagination.py
+# Keyset pagination over (timestamp, _id), newest first. Cursors are opaque
+# to clients: base64 of the last row's timestamp and _id. Only rows with a
+# BSON date timestamp are paged; legacy string or missing timestamps can't be
+# ordered against a cursor and are skipped.
+
+import base64
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+
+MAX_PAGE_SIZE = 200
+CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def page_size(value, default):
+    """Parses a requested page size, clamped to [1, MAX_PAGE_SIZE]."""
+    try:
+        size = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        raise ValueError("Invalid limit")
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(doc):
+    raw = f"{doc['timestamp'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Returns (timestamp, _id) from a cursor; raises ValueError if it was tampered with."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        ts, oid = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(ts), ObjectId(oid)
+    except (ValueError, InvalidId, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def after_cursor(query, token):
+    """Narrows a query to rows strictly after the cursor in (timestamp desc, _id desc) order."""
+    if not token:
+        return query
+    ts, oid = decode_cursor(token)
+    keyset = {'$or': [
+        {'timestamp': {'$lt': ts}},
+        {'timestamp': ts, '_id': {'$lt': oid}}
+    ]}
+    return {**query, '$and': query.get('$and', []) + [keyset]}
+
+
+def fetch_page(collection, query, token, size):
+    """
+    Returns (docs, next_cursor) for one page. Reads one extra row to know
+    whether another page exists, so the last page has next_cursor None.
+    """
+    query = {**query, '$and': query.get('$and', []) + [{'timestamp': {'$type': 'date'}}]}
+    docs = list(
+        collection.find(after_cursor(query, token))
+        .sort([('timestamp', -1), ('_id', -1)])
+        .limit(size + 1)
+    )
+    if len(docs) <= size:
+        return docs, None
+    docs = docs[:size]
+    return docs, encode_cursor(docs[-1])
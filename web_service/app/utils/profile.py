@@ -0,0 +1,73 @@
+# web_service/app/utils/profile.py
+# The caller's settings document, as auth_required already loaded it, exposed
+# on `g.profile` so routes stop re-reading `settings` for the same request.
+
+import threading
+from collections import defaultdict
+from functools import cached_property
+from flask import g, has_request_context, request
+
+from app.services import fx
+
+_STATS = defaultdict(lambda: {'profile_reads': 0, 'settings_queries': 0})
+_LOCK = threading.Lock()
+
+
+def _record(kind):
+    endpoint = request.endpoint if has_request_context() else None
+    with _LOCK:
+        _STATS[endpoint or '<none>'][kind] += 1
+
+
+class RequestProfile:
+    """Read-only view of one request's settings document with the effective KHR rate resolved."""
+
+    def __init__(self, user):
+        self.doc = user.doc
+        self.account_id = user.account_id
+        self.settings = user.settings
+
+    @cached_property
+    def fixed_rate(self):
+        if self.settings.get('rate_preference') == 'fixed':
+            rate = float(self.settings.get('fixed_rate', 4100.0))
+            if rate > 0:
+                return rate
+        return None
+
+    @cached_property
+    def khr_rate(self):
+        """The user's preferred rate: their fixed rate, or the live rate."""
+        return self.fixed_rate or fx.current_rate()
+
+    @property
+    def rate_source(self):
+        return 'fixed' if self.fixed_rate else 'live'
+
+    @property
+    def initial_balances(self):
+        return self.settings.get('initial_balances', {})
+
+    def initial_balance_usd(self):
+        initial = self.initial_balances
+        return initial.get('USD', 0) + initial.get('KHR', 0) / self.khr_rate
+
+
+def current_profile(account_id=None):
+    """
+    The request's profile, or None outside a request or when it belongs to a
+    different account than `account_id`. Callers fall back to a settings query.
+    """
+    profile = g.get('profile') if has_request_context() else None
+    if profile is not None and (account_id is None or str(account_id) == str(profile.account_id)):
+        _record('profile_reads')
+        return profile
+    if has_request_context():
+        _record('settings_queries')
+    return None
+
+
+def get_profile_stats():
+    """Per-endpoint counts of settings lookups served by the profile vs. sent to Mongo."""
+    with _LOCK:
+        return {endpoint: dict(counts) for endpoint, counts in _STATS.items()}
@@ -0,0 +1,228 @@
+# web_service/app/utils/shared_cache.py
+# Optional cross-worker layer under the per-process auth caches, enabled with
+# SHARED_AUTH_CACHE=mongo. Validated tokens are stored by SHA-256 (never raw)
+# in auth_cache, which a TTL index empties as they expire, so a token one
+# worker validated is a hit on every worker. Invalidations are appended to
+# auth_events; each worker polls that collection and drops the affected
+# entries from its own memory, so a webhook received by one worker reaches
+# all of them within AUTH_EVENTS_POLL_SECONDS.
+#
+# Settings documents (the request profile) are cached per worker for
+# PROFILE_CACHE_TTL seconds and invalidated through the same events.
+
+import copy
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from cachetools import TTLCache
+
+from app.config import Config
+
+log = logging.getLogger(__name__)
+
+# Events older than this are ignored by poll(); wide enough to absorb a late
+# scheduler run and clock skew between the workers' ObjectIds.
+EVENT_WINDOW = max(30, 3 * Config.AUTH_EVENTS_POLL_SECONDS)
+
+# Identifies this process's own events, which it has already applied.
+_ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+_BINDING = {'db': None}
+_HANDLERS = []
+_PROFILES = TTLCache(maxsize=Config.TOKEN_CACHE_SIZE, ttl=max(Config.PROFILE_CACHE_TTL, 1))
+# Bumped on every invalidation so a load that raced one is not cached.
+_GENERATIONS = defaultdict(int)
+_SEEN = TTLCache(maxsize=10000, ttl=2 * EVENT_WINDOW)
+_LOCK = threading.Lock()
+_STATS = {'token_hits': 0, 'token_misses': 0, 'profile_hits': 0, 'profile_misses': 0,
+          'events_published': 0, 'events_applied': 0, 'errors': 0}
+
+
+def bind(db):
+    _BINDING['db'] = db
+
+
+def enabled():
+    return Config.SHARED_AUTH_CACHE == 'mongo' and _BINDING['db'] is not None
+
+
+def on_invalidate(handler):
+    """Registers `handler(event)` to run for every account invalidation another worker publishes."""
+    _HANDLERS.append(handler)
+
+
+def _count(key, n=1):
+    with _LOCK:
+        _STATS[key] += n
+
+
+def token_key(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+# --- Validated tokens ---
+
+def load_token(token):
+    """(user_data, expires_at) another worker stored for `token`, or None."""
+    try:
+        doc = _BINDING['db'].auth_cache.find_one(
+            {'_id': token_key(token), 'expires_at': {'$gt': datetime.now(timezone.utc)}}
+        )
+    except Exception as e:
+        log.error(f"Shared auth cache read failed: {e}")
+        _count('errors')
+        return None
+    if not doc:
+        _count('token_misses')
+        return None
+    _count('token_hits')
+    return doc['data'], doc['expires_at'].replace(tzinfo=timezone.utc).timestamp()
+
+
+def store_token(token, user_data, expires_at, ttl):
+    now = datetime.now(timezone.utc)
+    expiry = now + timedelta(seconds=ttl)
+    if expires_at:
+        expiry = min(expiry, datetime.fromtimestamp(expires_at, timezone.utc))
+    try:
+        _BINDING['db'].auth_cache.replace_one(
+            {'_id': token_key(token)},
+            {'account_id': str(user_data.get('id')), 'data': user_data, 'expires_at': expiry},
+            upsert=True
+        )
+    except Exception as e:
+        log.error(f"Shared auth cache write failed: {e}")
+        _count('errors')
+
+
+def drop_token(token):
+    """Removes a token everywhere; other workers drop that token's account."""
+    try:
+        doc = _BINDING['db'].auth_cache.find_one_and_delete({'_id': token_key(token)})
+    except Exception as e:
+        log.error(f"Shared auth cache delete failed: {e}")
+        _count('errors')
+        return
+    if doc:
+        publish(doc['account_id'], 'account')
+
+
+def drop_account(account_id):
+    """Removes an account's tokens and profile everywhere."""
+    try:
+        _BINDING['db'].auth_cache.delete_many({'account_id': str(account_id)})
+    except Exception as e:
+        log.error(f"Shared auth cache delete failed: {e}")
+        _count('errors')
+    _forget_profile(account_id)
+    publish(account_id, 'account')
+
+
+# --- Settings profiles ---
+
+def get_profile(account_id, loader):
+    """
+    The account's settings document, from this worker's cache or `loader()`.
+    Returns a copy, so callers may mutate it freely.
+    """
+    key = str(account_id)
+    with _LOCK:
+        doc = _PROFILES.get(key)
+        generation = _GENERATIONS[key]
+    if doc is not None:
+        _count('profile_hits')
+        return copy.deepcopy(doc)
+
+    _count('profile_misses')
+    doc = loader()
+    if doc is not None and Config.PROFILE_CACHE_TTL > 0:
+        with _LOCK:
+            if _GENERATIONS[key] == generation:
+                _PROFILES[key] = doc
+        return copy.deepcopy(doc)
+    return doc
+
+
+def _forget_profile(account_id):
+    key = str(account_id)
+    with _LOCK:
+        _PROFILES.pop(key, None)
+        _GENERATIONS[key] += 1
+
+
+def invalidate_profile(account_id):
+    """Drops the account's cached settings here and on every other worker."""
+    _forget_profile(account_id)
+    publish(account_id, 'profile')
+
+
+# --- Invalidation events ---
+
+def publish(account_id, kind):
+    """
+    Tells every other worker to forget the account's profile ('profile') or
+    its profile and validated tokens ('account').
+    """
+    db = _BINDING['db']
+    if db is None:
+        return
+    try:
+        db.auth_events.insert_one({
+            'account_id': str(account_id),
+            'kind': kind,
+            'origin': _ORIGIN,
+            'created_at': datetime.now(timezone.utc)
+        })
+        _count('events_published')
+    except Exception as e:
+        log.error(f"Could not publish auth invalidation for {account_id}: {e}")
+        _count('errors')
+
+
+def poll():
+    """Applies invalidations other workers published since the last poll. Scheduler job."""
+    if not enabled():
+        return 0
+    since = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=EVENT_WINDOW))
+    try:
+        events = list(_BINDING['db'].auth_events.find(
+            {'_id': {'$gt': since}, 'origin': {'$ne': _ORIGIN}}
+        ).sort('_id', 1))
+    except Exception as e:
+        log.error(f"Could not poll auth events: {e}")
+        _count('errors')
+        return 0
+
+    applied = 0
+    for event in events:
+        with _LOCK:
+            if event['_id'] in _SEEN:
+                continue
+            _SEEN[event['_id']] = True
+        _forget_profile(event['account_id'])
+        if event.get('kind') == 'account':
+            for handler in _HANDLERS:
+                handler(event)
+        applied += 1
+    if applied:
+        _count('events_applied', applied)
+    return applied
+
+
+def get_stats():
+    with _LOCK:
+        token_lookups = _STATS['token_hits'] + _STATS['token_misses']
+        profile_lookups = _STATS['profile_hits'] + _STATS['profile_misses']
+        return {
+            **_STATS,
+            'enabled': enabled(),
+            'token_hit_rate': _STATS['token_hits'] / token_lookups if token_lookups else 0.0,
+            'profile_hit_rate': _STATS['profile_hits'] / profile_lookups if profile_lookups else 0.0,
+            'profile_size': len(_PROFILES),
+            'origin': _ORIGIN
+        }
@@ -0,0 +1,189 @@
+# web_service/app/utils/token_cache.py
+# Validated-token cache for auth_required: LRU-bounded, per-entry expiry
+# (capped at each JWT's exp), an account_id -> tokens index for webhook
+# invalidation, a short negative cache for rejected tokens, and single-flight
+# loading so concurrent requests with the same cold token validate it once.
+# An invalidation that lands while a load is in flight keeps that load's
+# (possibly stale) result out of the cache.
+
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+# Returned by loaders for a definitive rejection (cached briefly), as opposed
+# to None for a transient failure (not cached).
+REJECTED = object()
+
+INFLIGHT_WAIT_SECONDS = 65
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'generation', 'invalidated')
+
+    def __init__(self, generation):
+        self.done = threading.Event()
+        self.result = None
+        self.generation = generation
+        self.invalidated = False
+
+
+class TokenCache:
+    def __init__(self, maxsize, ttl, negative_ttl, negative_maxsize=1000):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.negative_maxsize = negative_maxsize
+        self._entries = OrderedDict()  # token -> (data, expires_at)
+        self._by_account = defaultdict(set)
+        self._negative = OrderedDict()  # token -> expires_at
+        self._inflight = {}
+        # Bumped by invalidate_account; _account_generations[account] is its value at the account's last invalidation.
+        self._generation = 0
+        self._account_generations = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'coalesced': 0,
+                       'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    # --- internals (call with the lock held) ---
+
+    def _remove(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return False
+        account_id = str(entry[0].get('id'))
+        tokens = self._by_account.get(account_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_account[account_id]
+        return True
+
+    def _lookup(self, token, now):
+        entry = self._entries.get(token)
+        if entry is not None:
+            if entry[1] > now:
+                self._entries.move_to_end(token)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._remove(token)
+            self._stats['expirations'] += 1
+
+        rejected_until = self._negative.get(token)
+        if rejected_until is not None:
+            if rejected_until > now:
+                self._stats['negative_hits'] += 1
+                return REJECTED
+            del self._negative[token]
+        return None
+
+    def _store(self, token, data, expires_at, now):
+        self._remove(token)
+        self._negative.pop(token, None)
+        ttl_expiry = now + self.ttl
+        self._entries[token] = (data, min(expires_at, ttl_expiry) if expires_at else ttl_expiry)
+        self._by_account[str(data.get('id'))].add(token)
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats['evictions'] += 1
+
+    def _invalidated_since(self, flight, data):
+        """True if the flight's token or the loaded account was invalidated after the load started."""
+        return (flight.invalidated or
+                self._account_generations.get(str(data.get('id')), -1) >= flight.generation)
+
+    def _store_rejection(self, token, now):
+        self._negative[token] = now + self.negative_ttl
+        self._negative.move_to_end(token)
+        while len(self._negative) > self.negative_maxsize:
+            self._negative.popitem(last=False)
+
+    # --- public API ---
+
+    def get(self, token):
+        """Cached user data, REJECTED for a recently rejected token, or None on a miss."""
+        with self._lock:
+            result = self._lookup(token, time.time())
+            if result is None:
+                self._stats['misses'] += 1
+            return result
+
+    def set(self, token, data, expires_at=None):
+        with self._lock:
+            self._store(token, data, expires_at, time.time())
+
+    def get_or_load(self, token, loader):
+        """
+        Returns the cached data for `token`, or calls `loader(token)` once no
+        matter how many threads miss at the same time. The loader returns
+        (data, expires_at), REJECTED, or None (transient failure, not cached).
+        """
+        with self._lock:
+            now = time.time()
+            result = self._lookup(token, now)
+            if result is REJECTED:
+                return None
+            if result is not None:
+                return result
+
+            flight = self._inflight.get(token)
+            leader = flight is None
+            if leader:
+                self._stats['misses'] += 1
+                flight = self._inflight[token] = _Flight(self._generation)
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait(INFLIGHT_WAIT_SECONDS)
+            return flight.result
+
+        data = None
+        try:
+            loaded = loader(token)
+            with self._lock:
+                if loaded is REJECTED:
+                    self._store_rejection(token, time.time())
+                elif loaded is not None:
+                    data, expires_at = loaded
+                    if not self._invalidated_since(flight, data):
+                        self._store(token, data, expires_at, time.time())
+        finally:
+            with self._lock:
+                self._inflight.pop(token, None)
+                if not self._inflight:
+                    # Only running loads ever compare against these.
+                    self._account_generations.clear()
+            flight.result = data
+            flight.done.set()
+        return data
+
+    def invalidate(self, token):
+        with self._lock:
+            flight = self._inflight.get(token)
+            if flight is not None:
+                flight.invalidated = True
+            if self._remove(token):
+                self._stats['invalidations'] += 1
+
+    def invalidate_account(self, account_id):
+        """Drops every cached token of an account in time proportional to that account's tokens."""
+        with self._lock:
+            self._account_generations[str(account_id)] = self._generation
+            self._generation += 1
+            for token in list(self._by_account.get(str(account_id), ())):
+                self._remove(token)
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': self._stats['hits'] / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.maxsize,
+                'negative_size': len(self._negative),
+                'accounts': len(self._by_account),
+                'inflight': len(self._inflight)
+            }